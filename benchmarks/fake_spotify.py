@@ -0,0 +1,391 @@
+"""
+Local stand-in for the parts of the Spotify Web API the tools use.
+
+Objects are generated deterministically from their index so payload sizes can be dialed up
+without fixtures, playlists are kept in memory so mutations behave like the real thing.
+Every request can be slowed down and a share of them answered with 429 + Retry-After.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: float = 30.0
+    jitter_ms: float = 10.0
+    rate_limit_prob: float = 0.0
+    retry_after: int = 1
+    playlists: int = 60
+    playlist_size: int = 500
+    album_tracks: int = 12
+    followed_artists: int = 120
+    saved_tracks: int = 300
+    queue_size: int = 20
+    seed: int = 7
+
+
+def track(i: int) -> dict:
+    return {
+        "id": f"track{i}",
+        "uri": f"spotify:track:track{i}",
+        "name": f"Track {i}",
+        "popularity": i * 37 % 100,
+        "duration_ms": 180000 + i % 60000,
+        "artists": [artist_ref(i % 97), artist_ref(i % 89 + 100)] if i % 3 == 0 else [artist_ref(i % 97)],
+        "album": album_ref(i // 10),
+    }
+
+
+def artist_ref(i: int) -> dict:
+    return {"id": f"artist{i}", "uri": f"spotify:artist:artist{i}", "name": f"Artist {i}"}
+
+
+def artist(i: int) -> dict:
+    genres = ["indie", "rock", "pop", "jazz", "techno", "folk", "hip hop", "ambient"]
+    return {
+        **artist_ref(i),
+        "followers": {"total": i * 1013 % 2000000},
+        "popularity": i * 29 % 100,
+        "genres": [genres[i % len(genres)], genres[(i * 3 + 1) % len(genres)]],
+    }
+
+
+def album_ref(i: int) -> dict:
+    return {
+        "id": f"album{i}",
+        "uri": f"spotify:album:album{i}",
+        "name": f"Album {i}",
+        "album_type": "album" if i % 4 else "single",
+        "release_date": f"{1990 + i % 35}-01-01",
+        "total_tracks": 12,
+        "artists": [artist_ref(i % 97)],
+    }
+
+
+def spotify_id(value: str) -> str:
+    return value.rsplit(":", 1)[-1].rsplit("/", 1)[-1].split("?")[0]
+
+
+def parse_fields(spec: str) -> dict:
+    """spotify's fields filter, "items(track(name,uri)),total" -> {"items": {"track": {...}}, "total": None}"""
+    fields, stack, name = {}, [], ""
+    current = fields
+    for char in spec + ",":
+        if char in ",()":
+            if name.strip():
+                current[name.strip()] = {} if char == "(" else None
+            if char == "(":
+                stack.append(current)
+                current = current[name.strip()]
+            elif char == ")":
+                current = stack.pop()
+            name = ""
+        else:
+            name += char
+    return fields
+
+
+def project(obj, fields: dict):
+    if isinstance(obj, list):
+        return [project(item, fields) for item in obj]
+    if not isinstance(obj, dict):
+        return obj
+    return {key: obj[key] if sub is None else project(obj[key], sub) for key, sub in fields.items() if key in obj}
+
+
+def too_many_ids() -> JSONResponse:
+    return JSONResponse({"error": {"status": 400, "message": "Too many ids requested"}}, status_code=400)
+
+
+def page(items: list, total: int, limit: int, offset: int) -> dict:
+    return {"items": items, "total": total, "limit": limit, "offset": offset,
+            "next": "next" if offset + limit < total else None}
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(config.seed)
+    app.state.requests = Counter()
+    app.state.rate_limited = 0
+
+    user = {"id": "benchuser", "display_name": "Bench User", "email": "bench@example.com",
+            "country": "US", "uri": "spotify:user:benchuser"}
+    playlists = {
+        f"playlist{i}": {
+            "name": f"Playlist {i} {['chill', 'focus', 'party', 'workout'][i % 4]}",
+            "description": f"generated playlist {i}",
+            "tracks": [f"spotify:track:track{i * 1000 + j}" for j in range(config.playlist_size)],
+            "snapshot": 1,
+        }
+        for i in range(config.playlists)
+    }
+
+    def playlist_obj(playlist_id: str) -> dict:
+        p = playlists[playlist_id]
+        return {
+            "id": playlist_id, "uri": f"spotify:playlist:{playlist_id}", "name": p["name"],
+            "description": p["description"], "owner": {"id": user["id"], "display_name": user["display_name"]},
+            "snapshot_id": f"{playlist_id}-{p['snapshot']}", "tracks": {"total": len(p["tracks"])},
+        }
+
+    def bump(playlist_id: str) -> JSONResponse:
+        playlists[playlist_id]["snapshot"] += 1
+        return JSONResponse({"snapshot_id": playlist_obj(playlist_id)["snapshot_id"]}, status_code=201)
+
+    @app.middleware("http")
+    async def latency_and_rate_limits(request: Request, call_next):
+        app.state.requests[f"{request.method} {request.url.path}"] += 1
+        delay = config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)
+        await asyncio.sleep(max(delay, 0) / 1000)
+        if config.rate_limit_prob and rng.random() < config.rate_limit_prob:
+            app.state.rate_limited += 1
+            return JSONResponse({"error": {"status": 429, "message": "API rate limit exceeded"}},
+                                status_code=429, headers={"Retry-After": str(config.retry_after)})
+        return await call_next(request)
+
+    @app.exception_handler(ValueError)
+    async def invalid_id(request: Request, exc: ValueError):
+        return JSONResponse({"error": {"status": 400, "message": "invalid id"}}, status_code=400)
+
+    @app.exception_handler(KeyError)
+    async def unknown_id(request: Request, exc: KeyError):
+        return JSONResponse({"error": {"status": 404, "message": "Resource not found"}}, status_code=404)
+
+    # user
+    @app.get("/v1/me")
+    async def me():
+        return user
+
+    @app.get("/v1/me/tracks")
+    async def saved_tracks(limit: int = 20, offset: int = 0):
+        items = [{"added_at": f"2024-01-01T00:00:{i % 60:02d}Z", "track": track(i * 7)}
+                 for i in range(offset, min(offset + limit, config.saved_tracks))]
+        return page(items, config.saved_tracks, limit, offset)
+
+    @app.get("/v1/me/top/artists")
+    async def top_artists(limit: int = 20, offset: int = 0, time_range: str = "medium_term"):
+        shift = {"short_term": 0, "medium_term": 7, "long_term": 13}.get(time_range, 0)
+        items = [artist(shift + i) for i in range(offset, min(offset + limit, 50))]
+        return page(items, 50, limit, offset)
+
+    @app.get("/v1/me/top/tracks")
+    async def top_tracks(limit: int = 20, offset: int = 0, time_range: str = "medium_term"):
+        shift = {"short_term": 0, "medium_term": 70, "long_term": 130}.get(time_range, 0)
+        items = [track(shift + i) for i in range(offset, min(offset + limit, 50))]
+        return page(items, 50, limit, offset)
+
+    @app.get("/v1/me/following")
+    async def following(limit: int = 20, after: str = None):
+        start = int(after.removeprefix("artist")) + 1 if after else 0
+        items = [artist(i) for i in range(start, min(start + limit, config.followed_artists))]
+        more = start + limit < config.followed_artists
+        return {"artists": {"items": items, "total": config.followed_artists, "limit": limit,
+                            "next": "next" if more else None,
+                            "cursors": {"after": items[-1]["id"] if more and items else None}}}
+
+    # playlists
+    @app.get("/v1/me/playlists")
+    @app.get("/v1/users/{user_id}/playlists")
+    async def list_playlists(limit: int = 50, offset: int = 0, user_id: str = None):
+        ids = list(playlists)
+        return page([playlist_obj(pid) for pid in ids[offset:offset + limit]], len(ids), limit, offset)
+
+    @app.post("/v1/users/{user_id}/playlists")
+    async def create_playlist(user_id: str, request: Request):
+        body = await request.json()
+        playlist_id = f"playlist{len(playlists)}"
+        playlists[playlist_id] = {"name": body["name"], "description": body.get("description", ""),
+                                  "tracks": [], "snapshot": 1}
+        return JSONResponse(playlist_obj(playlist_id), status_code=201)
+
+    @app.get("/v1/playlists/{playlist_id}")
+    async def get_playlist(playlist_id: str, fields: str = None):
+        # a single playlist embeds the first page of its items, like spotify does
+        result = {**playlist_obj(playlist_id), "tracks": await playlist_tracks(playlist_id)}
+        return project(result, parse_fields(fields)) if fields else result
+
+    @app.get("/v1/playlists/{playlist_id}/tracks")
+    async def playlist_tracks(playlist_id: str, limit: int = 100, offset: int = 0, fields: str = None):
+        uris = playlists[playlist_id]["tracks"]
+        items = [{"track": track(int(spotify_id(uri).removeprefix("track")))} for uri in uris[offset:offset + limit]]
+        result = page(items, len(uris), limit, offset)
+        return project(result, parse_fields(fields)) if fields else result
+
+    @app.post("/v1/playlists/{playlist_id}/tracks")
+    async def add_tracks(playlist_id: str, request: Request, position: int = None):
+        uris = await request.json()
+        if len(uris) > 100:
+            return too_many_ids()
+        tracks = playlists[playlist_id]["tracks"]
+        at = len(tracks) if position is None else position
+        tracks[at:at] = uris
+        return bump(playlist_id)
+
+    @app.delete("/v1/playlists/{playlist_id}/tracks")
+    async def remove_tracks(playlist_id: str, request: Request):
+        body = await request.json()
+        tracks = playlists[playlist_id]["tracks"]
+        drop = set()
+        for item in body["tracks"]:
+            if "positions" in item:
+                drop.update(item["positions"])
+            else:
+                drop.update(i for i, uri in enumerate(tracks) if uri == item["uri"])
+        playlists[playlist_id]["tracks"] = [uri for i, uri in enumerate(tracks) if i not in drop]
+        return bump(playlist_id)
+
+    @app.put("/v1/playlists/{playlist_id}/tracks")
+    async def reorder_tracks(playlist_id: str, request: Request):
+        body = await request.json()
+        tracks = playlists[playlist_id]["tracks"]
+        if "uris" in body:
+            playlists[playlist_id]["tracks"] = list(body["uris"])
+            return bump(playlist_id)
+        start, length, before = body["range_start"], body.get("range_length", 1), body["insert_before"]
+        moved = tracks[start:start + length]
+        del tracks[start:start + length]
+        if before > start:
+            before -= length
+        tracks[before:before] = moved
+        return bump(playlist_id)
+
+    # catalog
+    @app.get("/v1/search")
+    async def search(q: str, type: str = "track", limit: int = 10, offset: int = 0):
+        result = {}
+        for kind in type.split(","):
+            if kind == "track":
+                items = [track(i) for i in range(offset, offset + limit)]
+            elif kind == "artist":
+                items = [artist(i) for i in range(offset, offset + limit)]
+            elif kind == "album":
+                items = [album_ref(i) for i in range(offset, offset + limit)]
+            else:
+                items = [playlist_obj(pid) for pid in list(playlists)[offset:offset + limit]]
+            result[f"{kind}s"] = page(items, 1000, limit, offset)
+        return result
+
+    @app.get("/v1/albums/{album_id}")
+    async def get_album(album_id: str):
+        i = int(album_id.removeprefix("album"))
+        tracks = [track(i * 10 + n) for n in range(config.album_tracks)]
+        return {**album_ref(i), "tracks": page(tracks, len(tracks), 50, 0)}
+
+    @app.get("/v1/albums")
+    @app.get("/v1/albums/")
+    async def get_albums(ids: str):
+        if len(ids.split(",")) > 20:
+            return too_many_ids()
+        return {"albums": [await get_album(album_id) for album_id in ids.split(",")]}
+
+    @app.get("/v1/albums/{album_id}/tracks")
+    async def get_album_tracks(album_id: str, limit: int = 50, offset: int = 0):
+        i = int(album_id.removeprefix("album"))
+        tracks = [track(i * 10 + n) for n in range(config.album_tracks)]
+        return page(tracks[offset:offset + limit], len(tracks), limit, offset)
+
+    @app.get("/v1/artists/{artist_id}")
+    async def get_artist(artist_id: str):
+        return artist(int(artist_id.removeprefix("artist")))
+
+    @app.get("/v1/artists")
+    @app.get("/v1/artists/")
+    async def get_artists(ids: str):
+        if len(ids.split(",")) > 50:
+            return too_many_ids()
+        return {"artists": [artist(int(a.removeprefix("artist"))) for a in ids.split(",")]}
+
+    @app.get("/v1/artists/{artist_id}/albums")
+    async def get_artist_albums(artist_id: str, limit: int = 20, offset: int = 0):
+        i = int(artist_id.removeprefix("artist"))
+        items = [album_ref(i * 100 + n) for n in range(offset, min(offset + limit, 120))]
+        return page(items, 120, limit, offset)
+
+    @app.get("/v1/artists/{artist_id}/top-tracks")
+    async def get_top_tracks(artist_id: str):
+        i = int(artist_id.removeprefix("artist"))
+        return {"tracks": [track(i * 10 + n) for n in range(10)]}
+
+    @app.get("/v1/tracks/{track_id}")
+    async def get_track(track_id: str):
+        return track(int(track_id.removeprefix("track")))
+
+    @app.get("/v1/tracks")
+    @app.get("/v1/tracks/")
+    async def get_tracks(ids: str):
+        if len(ids.split(",")) > 50:
+            return too_many_ids()
+        return {"tracks": [track(int(t.removeprefix("track"))) for t in ids.split(",")]}
+
+    # player
+    devices = [{"id": f"device{i}", "name": name, "type": kind, "is_active": i == 0, "volume_percent": 50}
+               for i, (name, kind) in enumerate([("Laptop", "Computer"), ("Kitchen", "Speaker"), ("Phone", "Smartphone")])]
+
+    state = {"track": 1, "is_playing": True, "queued": []}
+
+    @app.get("/v1/me/player")
+    async def player():
+        return {"device": devices[0], "is_playing": state["is_playing"], "item": track(state["track"]), "progress_ms": 1000}
+
+    @app.get("/v1/me/player/devices")
+    async def get_devices():
+        return {"devices": devices}
+
+    @app.get("/v1/me/player/queue")
+    async def get_queue():
+        first = state["track"] + 1
+        queued = [track(int(uri.rsplit(":track", 1)[1])) for uri in state["queued"]]
+        return {"currently_playing": track(state["track"]),
+                "queue": queued + [track(i) for i in range(first, first + config.queue_size)]}
+
+    @app.api_route("/v1/me/player/{action}", methods=["PUT", "POST"])
+    @app.put("/v1/me/player")
+    async def control(request: Request, action: str = None):
+        # just enough state for the player views to change
+        if action == "queue":
+            uri = request.query_params.get("uri", "")
+            if not uri.startswith("spotify:track:track"):
+                return JSONResponse({"error": {"status": 400, "message": "Invalid track uri"}}, status_code=400)
+            state["queued"].append(uri)
+        elif action == "next":
+            state["track"] += 1
+        elif action == "previous":
+            state["track"] = max(1, state["track"] - 1)
+        elif action in ("play", "pause"):
+            state["is_playing"] = action == "play"
+        return Response(status_code=204)
+
+    return app
+
+
+class FakeSpotifyServer:
+    """runs the fake api with uvicorn on a background thread, use as a context manager"""
+
+    def __init__(self, config: FakeConfig = None, host: str = "127.0.0.1", port: int = 8765):
+        self.config = config or FakeConfig()
+        self.app = create_app(self.config)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self.prefix = f"http://{host}:{port}/v1/"
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def requests(self) -> Counter:
+        return self.app.state.requests
+
+    def __enter__(self):
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join()
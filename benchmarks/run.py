@@ -0,0 +1,220 @@
+"""
+Offline benchmark for every tool the server registers.
+
+Starts the local Web API stand-in from fake_spotify.py, points the server's client at it and
+calls each tool from N concurrent callers, reporting p50/p95/p99 latency, throughput, output
+bytes and upstream requests per call. Needs no credentials and no network.
+
+    uv run python -m benchmarks.run --concurrency 8 --iterations 20
+    uv run python -m benchmarks.run --rate-limit-prob 0.05 --tools get_playlist_tracks
+    uv run python -m benchmarks.run --save bench.json             # record a baseline
+    uv run python -m benchmarks.run --compare bench.json          # exit 1 when a p95 regressed
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from .fake_spotify import FakeConfig, FakeSpotifyServer
+
+TRACK_URIS = [f"spotify:track:track{i}" for i in range(250)]
+
+# arguments each tool is benchmarked with, tools without required arguments can be left out
+SCENARIOS = {
+    "get_user_playlist": {"limit": 0},
+    "get_playlist_id_by_name": {"name": "focus"},
+    "get_playlist_tracks": {"playlist_id": "playlist1", "limit": 0},
+    "create_playlists": {"name": "bench playlist"},
+    "get_users_owned_playlist": {"user_id": "benchuser"},
+    "playlist_add_items": {"playlist_id": "playlist2", "items": TRACK_URIS},
+    "playlist_remove_items": {"playlist_id": "playlist3", "items": TRACK_URIS},
+    "start_playback": {"uris": TRACK_URIS[:5]},
+    "add_to_queue": {"uri": "spotify:track:track1"},
+    "transfer_playback": {"device_id": "device1"},
+    "set_device_volume": {"volume_percent": 40},
+    "search_spotify": {"query": "bench"},
+    "get_album": {"album_id": "album1"},
+    "get_artist": {"artist_id": "artist1"},
+    "get_artist_albums": {"artist_id": "artist1", "limit": 0},
+    "get_artist_top_tracks": {"artist_id": "artist1"},
+    "get_albums": {"album_ids": [f"spotify:album:album{i}" for i in range(45)]},
+    "get_artists": {"artist_ids": [f"artist{i}" for i in range(120)]},
+    "get_tracks": {"track_ids": TRACK_URIS[:120]},
+    "sync_playlist_items": {"playlist_id": "playlist4", "items": [f"spotify:track:track{4000 + i}" for i in range(500)]},
+    "search_library": {"query": "artist 4"},
+    "add_many_to_queue": {"context_uri": "spotify:album:album1", "limit": 30},
+    "run_playback_steps": {"steps": [{"action": "play", "query": "bench", "device": "kitchen"},
+                                     {"action": "volume", "volume_percent": 40, "device": "kitchen"}]},
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def output_bytes(result) -> int:
+    """what the call puts on the wire: its content blocks plus the structured content, if any"""
+    structured = None
+    if isinstance(result, tuple):
+        result, structured = result
+    if isinstance(result, dict):
+        result, structured = [], result
+    size = sum(len(getattr(block, "text", "").encode()) for block in result)
+    if structured is not None:
+        size += len(json.dumps(structured, separators=(",", ":")).encode())
+    return size
+
+
+def output_text(result) -> str:
+    if isinstance(result, tuple):
+        result = result[0]
+    if isinstance(result, dict):
+        return json.dumps(result)
+    return "".join(getattr(block, "text", "") for block in result)
+
+
+async def bench_tool(mcp, server, name, arguments, concurrency, iterations):
+    latencies = []
+    sizes = []
+    errors = 0
+    upstream_before = sum(server.requests.values())
+
+    async def caller():
+        nonlocal errors
+        for _ in range(iterations):
+            start = time.perf_counter()
+            try:
+                result = await mcp.call_tool(name, arguments)
+                text = output_text(result)
+                sizes.append(output_bytes(result))
+                if text.lower().startswith("error"):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    calls = concurrency * iterations
+
+    return {
+        "calls": calls,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "throughput_per_s": round(calls / elapsed, 1),
+        "output_bytes": round(sum(sizes) / len(sizes)) if sizes else 0,
+        "upstream_per_call": round((sum(server.requests.values()) - upstream_before) / calls, 2),
+    }
+
+
+async def run(args):
+    from main import mcp
+    from src.auth import create_client, spotify_auth
+
+    config = FakeConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit_prob=args.rate_limit_prob,
+        retry_after=args.retry_after,
+        playlists=args.playlists,
+        playlist_size=args.playlist_size,
+        followed_artists=args.followed_artists,
+    )
+
+    results = {}
+    with FakeSpotifyServer(config, port=args.port) as server:
+        client = create_client(auth="benchmark-token", requests_timeout=30)
+        client.prefix = server.prefix
+        if args.no_cache:
+            spotify_auth.cache = None
+        spotify_auth.set_client(client)
+
+        tools = await mcp.list_tools()
+        wanted = set(args.tools.split(",")) if args.tools else None
+        for tool in tools:
+            if wanted and tool.name not in wanted:
+                continue
+            arguments = SCENARIOS.get(tool.name)
+            if arguments is None:
+                if tool.inputSchema.get("required"):
+                    print(f"skipping {tool.name}: no scenario for its required arguments", file=sys.stderr)
+                    continue
+                arguments = {}
+            results[tool.name] = await bench_tool(mcp, server, tool.name, arguments, args.concurrency, args.iterations)
+
+        results_meta = {"rate_limited": server.app.state.rate_limited}
+    return results, results_meta
+
+
+def print_report(results, meta):
+    header = f"{'tool':<40}{'p50':>9}{'p95':>9}{'p99':>9}{'calls/s':>10}{'bytes':>9}{'upstream':>10}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in sorted(results.items()):
+        print(f"{name:<40}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['throughput_per_s']:>10}"
+              f"{r['output_bytes']:>9}{r['upstream_per_call']:>10}{r['errors']:>8}")
+    print(f"\n429 responses injected: {meta['rate_limited']}")
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, r in results.items():
+        before = baseline.get(name)
+        if before and r["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {r['p95_ms']}ms")
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the spotify MCP tools against a local fake Web API")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent callers per tool")
+    parser.add_argument("--iterations", type=int, default=10, help="calls per caller")
+    parser.add_argument("--tools", help="comma separated tool names (default: all)")
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--playlists", type=int, default=60)
+    parser.add_argument("--playlist-size", type=int, default=500)
+    parser.add_argument("--followed-artists", type=int, default=120)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=1000.0, help="client side request rate limit (req/s)")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--store", default="", help="catalog store file to use (default: none, every run starts cold)")
+    parser.add_argument("--save", help="write results as json to this file")
+    parser.add_argument("--compare", help="baseline json to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown vs baseline")
+    args = parser.parse_args()
+
+    # the scheduler reads these when the server module is imported
+    os.environ.setdefault("SPOTIFY_RATE_LIMIT", str(args.rate))
+    os.environ.setdefault("SPOTIFY_MAX_RATE_LIMIT", str(args.rate))
+    os.environ.setdefault("SPOTIFY_RATE_BURST", str(int(args.rate)))
+    os.environ["SPOTIFY_STORE_PATH"] = args.store
+
+    results, meta = asyncio.run(run(args))
+    print_report(results, meta)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,52 @@
+import os
+from contextlib import asynccontextmanager
 from mcp.server.fastmcp import FastMCP
 from src.tools.playlist_tools import add_playlist_tools
 from src.tools.playback_tools import add_playback_tools
 from src.tools.search_tools import add_search_tools
 from src.tools.album_tools import add_album_tools
 from src.tools.user_tools import add_user_tools
+from src.tools.library_tools import add_library_tools
+from src.tools.metrics_tools import add_metrics_tools
 from src.auth import spotify_auth
+from src.metrics import instrument
 
-mcp = FastMCP("spotify")
+# stdio serves the account of whoever runs the server, "http" serves every caller with their own bearer token
+TRANSPORT = os.getenv("SPOTIFY_TRANSPORT", "stdio")
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    # when started through `mcp run`/`mcp dev` main() is skipped, authenticate in the background instead
+    if TRANSPORT == "stdio":
+        spotify_auth.warm_up()
+    yield
+
+mcp = FastMCP("spotify", lifespan=lifespan)
 #add scopes
 
+# time every tool and count its upstream calls, see the metrics://spotify resource
+instrument(mcp)
+
 add_playlist_tools(mcp)
 add_playback_tools(mcp)
 add_search_tools(mcp)
 add_album_tools(mcp)
 add_user_tools(mcp)
+add_library_tools(mcp)
+add_metrics_tools(mcp)
 
 def main():
+    if TRANSPORT == "http":
+        from src.http_app import serve
+        serve(mcp)
+        return
+
     if not spotify_auth.get_client():
         print("failed to authenticate with spotify")
         return
-    
+
     print("Spotify MCP Server started with all features")
     mcp.run()
 
 if __name__ == "__main__":
     main()
-
@@ -1,46 +1,166 @@
+import asyncio
 import os
-import spotipy
 import sys
-from spotipy.oauth2 import SpotifyPKCE
+import threading
 from dotenv import load_dotenv
+from .cache import default_cache
+from .client import MAX_CONCURRENCY, AsyncSpotify
+from .follow_graph import FollowGraph
+from .library_index import LibraryIndex
+from .player_state import PlayerState
+from .playlist_index import PlaylistIndex
+from .scheduler import default_scheduler
+from .store import TieredCache, default_store
+from .transport import shared_session, timeouts
 
 load_dotenv()
 
+SCOPES = ("playlist-read-private "
+          "playlist-read-collaborative "
+          "playlist-modify-private "
+          "playlist-modify-public "
+          "user-read-playback-state "
+          "user-modify-playback-state "
+          "user-library-read "
+          "user-library-modify "
+          "user-top-read "
+          "user-follow-read "
+          "user-read-email "
+          "user-read-private "
+          "streaming")
+
+def create_client(**kwargs):
+    """builds a spotipy client the way the server expects it, kwargs go to spotipy.Spotify"""
+    import spotipy
+
+    kwargs.setdefault("requests_session", shared_session())
+    kwargs.setdefault("requests_timeout", timeouts())
+    return spotipy.Spotify(**kwargs)
+
 class SpotifyAuth:
-    def __init__(self):
+    """
+    Lazy spotify client factory.
+
+    Nothing is loaded and no request is made until the client is first needed
+    (or warm_up() is called), so importing the package stays cheap and offline.
+    """
+    def __init__(self, cache=None, scheduler=None):
         self.client = None
-        self._initialize()
+        self.async_client = None
+        # albums, artists, tracks and playlist snapshots also live on disk, so restarts come up
+        # warm, the file is opened on first use
+        self.cache = TieredCache(cache if cache is not None else default_cache(), default_store)
+        self.playlist_index = PlaylistIndex()
+        self.library_index = LibraryIndex(self.playlist_index)
+        self.player = PlayerState()
+        self.follow_graph = FollowGraph()
+        self.scheduler = scheduler or default_scheduler(MAX_CONCURRENCY)
+        self.user = None
+        self._user_token = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        """the catalog store playlist snapshots are kept in, None when there is none"""
+        return default_store()
 
     def _initialize(self):
+        # spotipy pulls in requests/urllib3, only pay for it when we actually authenticate
+        from .tokens import TokenManager
+
         try:
-            auth_manager = SpotifyPKCE(
+            auth_manager = TokenManager(
                 client_id=os.getenv("SPOTIFY_CLIENT_ID"),
                 redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI"),
-                scope="playlist-read-private "          
-                  "playlist-read-collaborative "      
-                  "playlist-modify-private "         
-                  "playlist-modify-public "          
-                  "user-read-playback-state "        
-                  "user-modify-playback-state "     
-                  "user-library-read "              
-                  "user-library-modify "           
-                  "user-top-read "                   
-                  "user-follow-read "                
-                  "user-read-email "                 
-                  "user-read-private "              
-                  "streaming"      
+                scope=SCOPES
             )
-            self.client = spotipy.Spotify(auth_manager=auth_manager)
+            self.client = create_client(auth_manager=auth_manager)
 
-            #testing connection
+            #testing connection, and remember who we are so tools dont have to ask again
             user = self.client.current_user()
+            self._user_token = self._access_token()
+            self.user = user
+            # from now on the token is refreshed ahead of expiry, never inside a tool call
+            auth_manager.start_refresher()
             print(f"Authenticated currently as {user['display_name']}", file=sys.stderr)
         except Exception as e:
             print(f"Authentication failed: {e}", file=sys.stderr)
             self.client = None
 
     def get_client(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._initialize()
+                    self._initialized = True
         return self.client
-    
-spotify_auth = SpotifyAuth()
 
+    def set_client(self, client):
+        """use an already built client (another account, a local api stand-in) instead of the PKCE flow"""
+        with self._lock:
+            self.client = client
+            self.async_client = None
+            self.invalidate_user()
+            self.player.invalidate()
+            self._initialized = True
+
+    def set_token(self, access_token):
+        """act with a token someone else obtained (an http caller's bearer token)"""
+        self.set_client(create_client(auth=access_token))
+
+    async def get_async_client(self):
+        """
+        returns the client wrapped so every call can be awaited without blocking the event loop,
+        the first one authenticates on a worker thread (it may even wait for the PKCE login)
+        """
+        if self._initialized:
+            client = self.client
+        else:
+            client = await asyncio.get_running_loop().run_in_executor(None, self.get_client)
+        if not client:
+            return None
+        if self.async_client is None or self.async_client.sync is not client:
+            self.async_client = AsyncSpotify(
+                client,
+                cache=self.cache,
+                identity=self.get_current_user,
+                scheduler=self.scheduler
+            )
+        return self.async_client
+
+    def get_current_user(self):
+        """
+        returns the current user's profile, it is fetched once per access token
+        and dropped again as soon as the token changes
+        """
+        client = self.get_client()
+        if not client:
+            return None
+
+        token = self._access_token()
+        if self.user is None or token != self._user_token:
+            self.user = client.current_user()
+            self._user_token = token
+        return self.user
+
+    def invalidate_user(self):
+        self.user = None
+        self._user_token = None
+
+    def _access_token(self):
+        try:
+            auth_manager = self.client.auth_manager
+            # the token manager keeps the token in memory, other auth managers only have their cache
+            token_info = getattr(auth_manager, "token_info", None) or auth_manager.cache_handler.get_cached_token()
+        except AttributeError:
+            return None
+        return token_info["access_token"] if token_info else None
+
+    def warm_up(self):
+        """authenticate on a background thread so the first tool call doesnt pay for it"""
+        if self._initialized:
+            return
+        threading.Thread(target=self.get_client, name="spotify-warm-up", daemon=True).start()
+
+spotify_auth = SpotifyAuth()
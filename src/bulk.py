@@ -0,0 +1,185 @@
+import asyncio
+import os
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+from .scheduler import BULK, request_lane
+
+# spotify accepts at most this many uris per playlist mutation request
+PLAYLIST_BATCH_SIZE = 100
+MAX_BATCH_RETRIES = 3
+RETRY_BACKOFF = 0.5
+# request tokens a bulk queue load leaves in the rate limit bucket for everything else
+QUEUE_HEADROOM = float(os.getenv("SPOTIFY_QUEUE_HEADROOM", "5"))
+# queue errors after which every following item would fail the same way (auth, no active device)
+QUEUE_FATAL_STATUSES = {401, 403, 404}
+
+# progress(done, total) is awaited after every batch
+Progress = Optional[Callable[[int, int], Awaitable[None]]]
+
+
+def progress_reporter(ctx) -> Progress:
+    """ctx.report_progress, or None when the tool runs outside of an MCP request (scripts, benchmarks)"""
+    try:
+        ctx.request_context
+    except (AttributeError, ValueError):
+        return None
+    return ctx.report_progress
+
+
+def chunk(items: List[str], size: int = PLAYLIST_BATCH_SIZE) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    server errors and dropped connections are worth another try for removes and reorders,
+    which name the snapshot they were planned against. 429s are already retried by the
+    scheduler. Adds use never_sent, a resent add that had been applied inserts its items twice
+    """
+    import requests
+
+    status = getattr(error, "http_status", None)
+    if status is not None:
+        return status >= 500
+    return isinstance(error, requests.ConnectionError)
+
+
+def never_sent(error: Exception) -> bool:
+    """
+    only a connection that never opened proves spotify didnt get the request, anything after
+    that may have been applied (a resent queue add plays the track twice)
+    """
+    import requests
+    from urllib3.exceptions import ConnectTimeoutError
+
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError) or not error.args:
+        return False
+    # refused, unresolvable and timed out connects, NewConnectionError is a ConnectTimeoutError
+    return isinstance(getattr(error.args[0], "reason", None), ConnectTimeoutError)
+
+
+async def send_batch(send: Callable[[], Awaitable[dict]], retries: int = MAX_BATCH_RETRIES,
+                     retryable: Callable[[Exception], bool] = is_retryable) -> dict:
+    for attempt in range(retries + 1):
+        try:
+            with request_lane(BULK):
+                return await send()
+        except Exception as e:
+            if attempt == retries or not retryable(e):
+                raise
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+
+async def add_items(client, playlist_id: str, items: List[str], position: int = None,
+                    progress: Progress = None) -> dict:
+    """
+    Add any number of items to a playlist in API sized batches.
+
+    Batches are sent in order, each one inserted right after the previous when position
+    is given, and the snapshot_id of the last applied batch is returned. A batch that
+    keeps failing stops the run so the playlist never ends up out of order; the result
+    tells how many items made it in.
+    """
+    snapshot_id = None
+    added = 0
+    for batch in chunk(items):
+        batch_position = None if position is None else position + added
+        try:
+            # an add that may have been applied is not sent again, it would insert the batch twice
+            response = await send_batch(
+                lambda: client.playlist_add_items(playlist_id, batch, batch_position), retryable=never_sent
+            )
+        except Exception as e:
+            return {"snapshot_id": snapshot_id, "done": added, "total": len(items), "error": e}
+
+        snapshot_id = response["snapshot_id"]
+        added += len(batch)
+        if progress:
+            await progress(added, len(items))
+
+    return {"snapshot_id": snapshot_id, "done": added, "total": len(items), "error": None}
+
+
+async def remove_items(client, playlist_id: str, items: List[str], snapshot_id: str = None,
+                       progress: Progress = None) -> dict:
+    """
+    Remove all occurrences of any number of items from a playlist in API sized batches.
+
+    Every batch is sent against the snapshot produced by the batch before it. Batches that
+    keep failing are skipped and reported, the rest are still removed.
+    """
+    removed = 0
+    failed = []
+    for batch in chunk(items):
+        try:
+            response = await send_batch(
+                lambda: client.playlist_remove_all_occurrences_of_items(playlist_id, batch, snapshot_id)
+            )
+        except Exception as e:
+            failed.append((batch, e))
+            continue
+
+        snapshot_id = response["snapshot_id"]
+        removed += len(batch)
+        if progress:
+            await progress(removed, len(items))
+
+    return {"snapshot_id": snapshot_id, "done": removed, "total": len(items), "failed": failed}
+
+
+async def wait_for_headroom(scheduler, tokens: float = QUEUE_HEADROOM) -> None:
+    """hold a long run of requests back until the bucket has more than tokens to spare"""
+    if scheduler is None:
+        return
+    # the bucket never holds more than burst, a bigger reserve would be waited for forever
+    needed = min(tokens, scheduler.burst - 1) + 1
+    while scheduler.headroom() < needed:
+        await asyncio.sleep(max((needed - scheduler.headroom()) / scheduler.rate, 0.01))
+
+
+async def queue_items(client, batches: AsyncIterator[List[str]], device_id: str = None,
+                      progress: Progress = None) -> List[dict]:
+    """
+    Add items to the playback queue in order, one outcome dict (uri, status, error) per item.
+
+    Spotify queues items in the order the requests arrive, so they are sent one at a time.
+    Expanding the batches (album/playlist pages) runs concurrently with sending, and every
+    send waits until the rate limit bucket has QUEUE_HEADROOM to spare, so playback controls
+    and other tools dont queue up behind the load. A failure that would repeat for every item
+    (auth, no active device) stops the run and the rest is reported as skipped.
+    """
+    pending: asyncio.Queue = asyncio.Queue()
+
+    async def expand():
+        try:
+            async for batch in batches:
+                for uri in batch:
+                    pending.put_nowait(uri)
+        finally:
+            pending.put_nowait(None)
+
+    producer = asyncio.ensure_future(expand())
+    outcomes = []
+    stopped = None
+    try:
+        while (uri := await pending.get()) is not None:
+            if stopped is not None:
+                outcomes.append({"uri": uri, "status": "skipped", "error": f"not sent after: {stopped}"})
+                continue
+            await wait_for_headroom(client.scheduler)
+            try:
+                # a queue add is not idempotent, 429s are retried by the scheduler already
+                await send_batch(lambda: client.add_to_queue(uri=uri, device_id=device_id), retryable=never_sent)
+                outcomes.append({"uri": uri, "status": "queued", "error": None})
+            except Exception as e:
+                outcomes.append({"uri": uri, "status": "failed", "error": str(e)})
+                if getattr(e, "http_status", None) in QUEUE_FATAL_STATUSES:
+                    stopped = e
+            if progress:
+                await progress(len(outcomes), len(outcomes) + pending.qsize())
+        # surfaces an error from expanding the context, after what did get queued
+        await producer
+    finally:
+        producer.cancel()
+    return outcomes
@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Protocol, Tuple
+
+# seconds to keep responses of read-only catalog endpoints, keyed by spotipy method name
+CATALOG_TTLS = {
+    "album": 24 * 3600,
+    "track": 24 * 3600,
+    "artist": 3600,
+    "artist_albums": 3600,
+    "artist_top_tracks": 3600,
+    "search": 300,
+}
+
+MISSING = object()
+
+
+def cache_key(method: str, args: tuple, kwargs: dict) -> str:
+    return method + ":" + json.dumps([args, kwargs], sort_keys=True, default=str)
+
+
+async def cache_get(cache: "CacheBackend", key: str) -> Any:
+    """cache.get from the event loop, through the backend's aget when reading it may block (disk)"""
+    aget = getattr(cache, "aget", None)
+    return await aget(key) if aget is not None else cache.get(key)
+
+
+class CacheBackend(Protocol):
+    """anything with this shape can be handed to AsyncSpotify as its response cache"""
+
+    def get(self, key: str) -> Any: ...
+
+    def set(self, key: str, value: Any, ttl: float) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def stats(self) -> dict: ...
+
+
+class ResponseCache:
+    """
+    In-memory TTL cache with LRU eviction bounded by entry count and total bytes.
+
+    Values are stored json encoded, which gives us the byte size for free and hands every
+    caller its own copy on a hit. get() returns MISSING when the key is absent or expired.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            expires_at, payload = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(payload)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        payload = json.dumps(value, separators=(",", ":")).encode()
+        if len(payload) > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, payload)
+            self._bytes += len(payload)
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, prefix: str = "") -> None:
+        """drop every entry whose key starts with prefix (a method name, or everything)"""
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: str) -> None:
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+
+def default_cache() -> ResponseCache:
+    return ResponseCache(
+        max_entries=int(os.getenv("SPOTIFY_CACHE_MAX_ENTRIES", "2048")),
+        max_bytes=int(os.getenv("SPOTIFY_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    )
@@ -0,0 +1,181 @@
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from . import metrics
+from .cache import MISSING, cache_get, cache_key
+from .fanout import fan_out
+from .pagination import fetch_all, iter_pages
+
+# what is kept of every playlist item in a stored snapshot, enough for every reader of it
+SNAPSHOT_FIELDS = "items(track(id,name,uri,artists(name,uri),album(name))),total"
+
+# spotify's several-items endpoints: spotipy method and how many ids one request may carry
+SEVERAL = {
+    "album": ("albums", 20),
+    "artist": ("artists", 50),
+    "track": ("tracks", 50),
+}
+
+
+def spotify_id(kind: str, value: str) -> str:
+    """bare id out of an id, `spotify:<kind>:<id>` URI or open.spotify.com URL"""
+    value = value.strip()
+    if value.startswith("spotify:"):
+        parts = value.split(":")
+        if len(parts) != 3 or parts[1] != kind:
+            raise ValueError(f"'{value}' is not a {kind} URI")
+        return parts[2]
+    if value.startswith(("http://", "https://")):
+        path = urlparse(value).path.strip("/").split("/")
+        if kind not in path or path.index(kind) + 1 >= len(path):
+            raise ValueError(f"'{value}' is not a {kind} URL")
+        return path[path.index(kind) + 1]
+    return value
+
+
+def item_key(kind: str, item_id: str) -> str:
+    """the cache key of a single item, the same one AsyncSpotify uses for client.<kind>(item_id)"""
+    return cache_key(kind, (item_id,), {})
+
+
+async def fetch_several(client, kind: str, ids: List[str]) -> List[Optional[dict]]:
+    """
+    Full objects for ids (bare ids, URIs or URLs) in the given order, None for ids spotify
+    doesnt know. Items already in the response cache are served from it, the rest are fetched
+    through the several-items endpoint in as few requests as it allows, all at once.
+    """
+    method, chunk_size = SEVERAL[kind]
+    ids = [spotify_id(kind, value) for value in ids]
+    ttl = client.ttls.get(kind) if client.cache is not None else None
+
+    found: Dict[str, Optional[dict]] = {}
+    missing = []
+    for item_id in dict.fromkeys(ids):
+        cached = await cache_get(client.cache, item_key(kind, item_id)) if ttl else MISSING
+        if cached is MISSING:
+            missing.append(item_id)
+        else:
+            metrics.record_cache_hit()
+            found[item_id] = cached
+
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+    pages = await fan_out(*(getattr(client, method)(chunk) for chunk in chunks)) if chunks else []
+    for chunk, page in zip(chunks, pages):
+        for item_id, item in zip(chunk, page[method]):
+            found[item_id] = item
+            if ttl and item is not None:
+                client.cache.set(item_key(kind, item_id), item, ttl)
+
+    return [found.get(item_id) for item_id in ids]
+
+
+def snapshot_item(track: dict) -> dict:
+    """a full track object cut down to a playlist item as SNAPSHOT_FIELDS asks spotify for it"""
+    return {"track": {
+        "id": track["id"],
+        "name": track["name"],
+        "uri": track["uri"],
+        "artists": [{"name": a["name"], "uri": a["uri"]} for a in track.get("artists") or []],
+        "album": {"name": (track.get("album") or {}).get("name")},
+    }}
+
+
+async def playlist_items(client, playlist_id: str, snapshot_id: str = None, store=None,
+                         limit: Optional[int] = None) -> List[dict]:
+    """
+    The items of a playlist, at most limit of them. With a store and the playlist's current
+    snapshot_id they are served from the stored snapshot when there is one, a complete listing
+    is stored for the next time.
+    """
+    if store is not None and snapshot_id:
+        items = await asyncio.to_thread(store.get_snapshot, playlist_id, snapshot_id)
+        if items is not None:
+            return items[:limit] if limit else items
+
+    items, total = await fetch_all(
+        lambda size, offset: client.playlist_items(playlist_id, fields=SNAPSHOT_FIELDS, limit=size, offset=offset),
+        page_size=100,
+        limit=limit
+    )
+    if store is not None and snapshot_id and len(items) == total:
+        store.put_snapshot(playlist_id, snapshot_id, items)
+    return items
+
+
+async def playlist_with_items(client, playlist_id: str, fields: str, store=None,
+                              limit: Optional[int] = None) -> Tuple[dict, List[dict]]:
+    """
+    The playlist (the given fields and its snapshot_id) and its items, at most limit of them.
+
+    The playlist comes with its first 100 items in the same request, which is all most calls
+    need. Only the items past those are served from the stored snapshot when there is one,
+    or fetched and then stored once the listing is complete.
+    """
+    response = await client.playlist(playlist_id, fields=f"{fields},snapshot_id,tracks({SNAPSHOT_FIELDS})")
+    # coalesced callers share the response, it is read, never changed
+    playlist = {key: value for key, value in response.items() if key != "tracks"}
+    page = response["tracks"]
+    items, total = page["items"], page["total"]
+    wanted = total if limit is None else min(limit, total)
+    snapshot_id = playlist.get("snapshot_id")
+    if len(items) < wanted:
+        stored = None
+        if store is not None and snapshot_id:
+            stored = await asyncio.to_thread(store.get_snapshot, playlist_id, snapshot_id)
+        if stored is not None:
+            items = stored
+        else:
+            rest, _ = await fetch_all(
+                lambda size, offset: client.playlist_items(playlist_id, fields=SNAPSHOT_FIELDS, limit=size, offset=offset),
+                page_size=100,
+                offset=len(items),
+                limit=wanted - len(items)
+            )
+            items = items + rest
+            if store is not None and snapshot_id and len(items) == total:
+                store.put_snapshot(playlist_id, snapshot_id, items)
+    return playlist, items[:wanted]
+
+
+def playable_uris(tracks: List[Optional[dict]]) -> List[str]:
+    """the uris that can be queued, local files are left out (the snapshot fields have no is_local)"""
+    return [track["uri"] for track in tracks
+            if track and track.get("uri") and not track.get("is_local") and not track["uri"].startswith("spotify:local:")]
+
+
+async def context_uris(client, context_uri: str, store=None, limit: Optional[int] = None) -> AsyncIterator[List[str]]:
+    """
+    The track uris of an album, playlist or artist (their top tracks) in playing order, at
+    most limit of them, yielded page by page so the first ones can be used while the rest loads.
+    Albums and playlists come through the response cache and catalog store when they are there.
+    """
+    kind = next((k for k in ("album", "playlist", "artist", "track") if f"{k}:" in context_uri or f"/{k}/" in context_uri), None)
+    if kind is None:
+        raise ValueError(f"'{context_uri}' is not an album, playlist, artist or track URI")
+    context_id = spotify_id(kind, context_uri)
+
+    if kind == "track":
+        yield [f"spotify:track:{context_id}"]
+    elif kind == "artist":
+        # same arguments as the follow graph and ranking, so they share the cache entry
+        top = await client.artist_top_tracks(context_id, None)
+        yield playable_uris(top["tracks"])[:limit]
+    elif kind == "playlist":
+        playlist = await client.playlist(context_id, fields="snapshot_id")
+        items = await playlist_items(client, context_id, playlist.get("snapshot_id"), store, limit)
+        yield playable_uris([item.get("track") for item in items])
+    else:
+        album = await client.album(context_id)
+        first = album["tracks"]["items"][:limit]
+        yield playable_uris(first)
+        remaining = album["tracks"]["total"] - len(album["tracks"]["items"])
+        if limit is not None:
+            remaining = min(remaining, limit - len(first))
+        if remaining > 0:
+            async for page in iter_pages(
+                lambda size, offset: client.album_tracks(context_id, limit=size, offset=offset),
+                page_size=50,
+                offset=len(album["tracks"]["items"]),
+                limit=remaining
+            ):
+                yield playable_uris(page["items"])
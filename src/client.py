@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from . import metrics
+from .cache import CATALOG_TTLS, MISSING, CacheBackend, cache_get, cache_key
+from .scheduler import RequestScheduler, lane_for
+from .singleflight import COALESCED_METHODS, SingleFlight
+
+# upper bound on spotify http calls running at the same time
+MAX_CONCURRENCY = int(os.getenv("SPOTIFY_MAX_CONCURRENCY", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="spotify")
+
+
+class AsyncSpotify:
+    """
+    Async facade over a spotipy.Spotify client.
+
+    Every spotipy method is exposed as a coroutine which runs the blocking http call
+    on a bounded thread pool, so a slow request no longer freezes the MCP event loop.
+
+    When a cache is given, methods listed in ttls are answered from it while fresh.
+    When identity is given, current_user()/me() are served by it instead of hitting /me.
+    When a scheduler is given, every request waits for its turn there (rate limit, priority, 429 back-off).
+    Identical read calls that overlap in time share a single http request.
+    """
+
+    def __init__(self, client, cache: CacheBackend = None, ttls: dict = None, identity=None,
+                 scheduler: RequestScheduler = None):
+        self._client = client
+        self.identity = identity
+        self.scheduler = scheduler
+        self.flights = SingleFlight()
+        self.cache = cache
+        self.ttls = CATALOG_TTLS if ttls is None else ttls
+
+    @property
+    def sync(self):
+        return self._client
+
+    async def call(self, method: str, *args, **kwargs):
+        ttl = self.ttls.get(method) if self.cache is not None else None
+        coalesce = method in COALESCED_METHODS
+        if not ttl and not coalesce:
+            return await self._run(method, *args, **kwargs)
+
+        key = cache_key(method, args, kwargs)
+        if ttl:
+            cached = await cache_get(self.cache, key)
+            if cached is not MISSING:
+                metrics.record_cache_hit()
+                return cached
+
+        async def fetch():
+            result = await self._run(method, *args, **kwargs)
+            if ttl and result is not None:
+                self.cache.set(key, result, ttl)
+            return result
+
+        if coalesce:
+            return await self.flights.do(key, fetch)
+        return await fetch()
+
+    async def current_user(self):
+        if self.identity is None:
+            return await self.call("current_user")
+        return await self._offload(self.identity)
+
+    me = current_user
+
+    async def _run(self, method: str, *args, **kwargs):
+        func = partial(getattr(self._client, method), *args, **kwargs)
+
+        async def attempt():
+            start = time.perf_counter()
+            status = 200
+            try:
+                return await self._offload(func)
+            except Exception as e:
+                status = getattr(e, "http_status", None)
+                raise
+            finally:
+                metrics.record_upstream(method, time.perf_counter() - start, status)
+
+        if self.scheduler is None:
+            return await attempt()
+        return await self.scheduler.run(attempt, lane_for(method))
+
+    async def _offload(self, func):
+        # copy the context so contextvars set by the tool are visible inside the worker thread
+        ctx = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, ctx.run, func)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await self.call(name, *args, **kwargs)
+
+        method.__name__ = name
+        return method
@@ -0,0 +1,17 @@
+import asyncio
+from typing import Any, Awaitable, List
+
+
+async def fan_out(*calls: Awaitable) -> List[Any]:
+    """
+    Run independent spotify calls at the same time and return their results in order.
+
+    If any call fails the others are cancelled and the first error is raised as is,
+    so tools can keep reporting it with their usual `f"Error ...: {e}"` message.
+    """
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(call) for call in calls]
+    except ExceptionGroup as eg:
+        raise eg.exceptions[0] from None
+    return [task.result() for task in tasks]
@@ -0,0 +1,227 @@
+import asyncio
+import bisect
+import os
+import time
+from collections import Counter
+from typing import AsyncIterator, Dict, List, Literal, Optional, TypedDict
+from . import views
+from .pagination import iter_cursor_pages
+from .playlist_index import normalize
+from .scheduler import BULK, request_lane
+
+# how long a crawled follow graph answers queries before the next one walks the cursor again
+FOLLOW_GRAPH_TTL = float(os.getenv("SPOTIFY_FOLLOW_GRAPH_TTL", "600"))
+# artists being enriched (top tracks) at the same time while the crawl goes on
+ENRICH_CONCURRENCY = int(os.getenv("SPOTIFY_ENRICH_CONCURRENCY", "4"))
+
+FOLLOWER_BUCKETS = [(0, "under 1K"), (1_000, "1K-10K"), (10_000, "10K-100K"), (100_000, "100K-1M"), (1_000_000, "1M+")]
+
+SortBy = Literal["followers", "popularity", "name"]
+
+
+class GenreCount(TypedDict):
+    genre: str
+    count: int
+
+
+class BucketCount(TypedDict):
+    bucket: str
+    count: int
+
+
+class FollowedArtist(TypedDict):
+    name: str
+    id: str
+    uri: str
+    followers: int
+    popularity: int
+    genres: List[str]
+    top_tracks: List[views.Track]
+
+
+class FollowedOverview(TypedDict):
+    total: int
+    matched: int
+    genres: List[GenreCount]
+    followers: List[BucketCount]
+    artists: List[FollowedArtist]
+
+
+async def followed_page(client, size: int, after: Optional[str]) -> dict:
+    return (await client.current_user_followed_artists(limit=size, after=after))["artists"]
+
+
+def follower_bucket(followers: int) -> str:
+    label = FOLLOWER_BUCKETS[0][1]
+    for floor, name in FOLLOWER_BUCKETS:
+        if followers >= floor:
+            label = name
+    return label
+
+
+class FollowGraph:
+    """
+    Every artist the user follows, kept as a compact column table (one list per field, genres
+    as indices into a shared vocabulary) so thousands of artists can be filtered and counted
+    without building a dict per artist.
+
+    walk() streams the rows page by page while the cursor is being followed, or all at once
+    while the last crawl is younger than the ttl.
+    """
+
+    def __init__(self, ttl: float = FOLLOW_GRAPH_TTL):
+        self.ttl = ttl
+        self.crawled_at = 0.0
+        self._lock = asyncio.Lock()
+        self._reset()
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.crawled_at > self.ttl
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    async def walk(self, client) -> AsyncIterator[range]:
+        async with self._lock:
+            if not self.is_stale:
+                yield range(len(self))
+                return
+
+            self._reset()
+            async for page in iter_cursor_pages(lambda size, after: followed_page(client, size, after), page_size=50):
+                start = len(self)
+                for artist in page["items"]:
+                    self._add(artist)
+                yield range(start, len(self))
+            self.crawled_at = time.monotonic()
+
+    def matches(self, row: int, genre: str = None, name: str = None, min_followers: int = 0,
+                max_followers: int = None, min_popularity: int = 0) -> bool:
+        if self.followers[row] < min_followers or self.popularity[row] < min_popularity:
+            return False
+        if max_followers is not None and self.followers[row] > max_followers:
+            return False
+        if name and normalize(name) not in normalize(self.names[row]):
+            return False
+        if genre:
+            wanted = normalize(genre)
+            return any(wanted in self._genre_keys[g] for g in self.genres[row])
+        return True
+
+    def sort_key(self, sort: SortBy):
+        if sort == "name":
+            return lambda row: normalize(self.names[row])
+        # looked up on every call, a crawl replaces the columns
+        if sort == "followers":
+            return lambda row: -self.followers[row]
+        return lambda row: -self.popularity[row]
+
+    def genre_histogram(self, rows: List[int], top: int = 15) -> List[GenreCount]:
+        counts = Counter(g for row in rows for g in self.genres[row])
+        return [{"genre": self.vocabulary[g], "count": n} for g, n in counts.most_common(top)]
+
+    def follower_histogram(self, rows: List[int]) -> List[BucketCount]:
+        counts = Counter(follower_bucket(self.followers[row]) for row in rows)
+        return [{"bucket": name, "count": counts[name]} for _, name in FOLLOWER_BUCKETS if counts[name]]
+
+    def artist(self, row: int, top_tracks: List[dict] = ()) -> FollowedArtist:
+        return {
+            "name": self.names[row],
+            "id": self.ids[row],
+            "uri": f"spotify:artist:{self.ids[row]}",
+            "followers": self.followers[row],
+            "popularity": self.popularity[row],
+            "genres": [self.vocabulary[g] for g in self.genres[row]],
+            "top_tracks": [views.track(track) for track in top_tracks],
+        }
+
+    def _reset(self) -> None:
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.followers: List[int] = []
+        self.popularity: List[int] = []
+        self.genres: List[tuple] = []
+        self.vocabulary: List[str] = []
+        self._genre_index: Dict[str, int] = {}
+        self._genre_keys: List[str] = []
+
+    def _add(self, artist: dict) -> None:
+        self.ids.append(artist["id"])
+        self.names.append(artist["name"])
+        self.followers.append((artist.get("followers") or {}).get("total") or 0)
+        self.popularity.append(artist.get("popularity") or 0)
+        genres = []
+        for genre in artist.get("genres") or []:
+            if genre not in self._genre_index:
+                self._genre_index[genre] = len(self.vocabulary)
+                self.vocabulary.append(genre)
+                self._genre_keys.append(normalize(genre))
+            genres.append(self._genre_index[genre])
+        self.genres.append(tuple(genres))
+
+
+async def explore(client, graph: FollowGraph, sort: SortBy = "followers", limit: int = 50,
+                  top_tracks: int = 0, **filters) -> FollowedOverview:
+    """
+    Crawl (or reuse) the follow graph, filter it, and aggregate the matching artists.
+
+    With top_tracks, artists are enriched with their top tracks while the cursor walk is still
+    going: the best `limit` matches so far are kept sorted as pages arrive, an artist entering
+    them is sent off right away and one pushed out is cancelled, mostly before its request
+    got a turn. Selected artists that missed out are fetched after the crawl.
+    """
+    semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+    enriching: Dict[int, asyncio.Task] = {}
+
+    async def enrich(artist_id: str) -> List[dict]:
+        async with semaphore:
+            try:
+                # background work behind the crawl, interactive requests go first
+                with request_lane(BULK):
+                    page = await client.artist_top_tracks(artist_id, None)
+            except Exception:
+                return []
+        return page["tracks"][:top_tracks]
+
+    key = graph.sort_key(sort)
+    matched = []
+    best = []
+    # when the crawl keeps pushing artists out (pages sorted the other way round) stop guessing
+    # early and fetch whats missing after the crawl, at most 3 * limit requests in the worst case
+    budget = 2 * limit
+    started = 0
+    try:
+        async for rows in graph.walk(client):
+            for row in rows:
+                if not graph.matches(row, **filters):
+                    continue
+                matched.append(row)
+                if limit <= 0:
+                    continue
+                bisect.insort(best, (key(row), row))
+                if top_tracks and started < budget:
+                    enriching[row] = asyncio.ensure_future(enrich(graph.ids[row]))
+                    started += 1
+                if len(best) > limit:
+                    _, dropped = best.pop()
+                    if dropped in enriching:
+                        enriching.pop(dropped).cancel()
+
+        selected = [row for _, row in best]
+        if top_tracks:
+            for row in selected:
+                if row not in enriching:
+                    enriching[row] = asyncio.ensure_future(enrich(graph.ids[row]))
+            await asyncio.gather(*(enriching[row] for row in selected))
+    finally:
+        for task in enriching.values():
+            task.cancel()
+
+    return {
+        "total": len(graph),
+        "matched": len(matched),
+        "genres": graph.genre_histogram(matched),
+        "followers": graph.follower_histogram(matched),
+        "artists": [graph.artist(row, enriching[row].result() if row in enriching else ()) for row in selected],
+    }
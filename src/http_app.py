@@ -0,0 +1,65 @@
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from .sessions import bearer_token, session_pool
+
+# where the multi user http server listens
+HTTP_HOST = os.getenv("SPOTIFY_HTTP_HOST", "127.0.0.1")
+HTTP_PORT = int(os.getenv("SPOTIFY_HTTP_PORT", "8000"))
+
+
+class RequireBearer:
+    """
+    asgi middleware turning away mcp requests without a bearer token, over http every
+    caller acts with their own spotify account and never with the server's
+    """
+
+    def __init__(self, app, open_paths=("/health",)):
+        self.app = app
+        self.open_paths = open_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.open_paths:
+            return await self.app(scope, receive, send)
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        if bearer_token(headers) is None:
+            await send({
+                "type": "http.response.start",
+                "status": 401,
+                "headers": [(b"content-type", b"text/plain"), (b"www-authenticate", b"Bearer")],
+            })
+            await send({"type": "http.response.body", "body": b"a spotify access token is required as bearer token"})
+            return
+        await self.app(scope, receive, send)
+
+
+def create_app(mcp) -> FastAPI:
+    """
+    fastapi app serving mcp over streamable http (/mcp) and sse (/sse + /messages/),
+    every bearer token gets its own session from the pool
+    """
+    streamable = mcp.streamable_http_app()
+    sse = mcp.sse_app()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # the streamable http transport needs its session manager running
+        async with mcp.session_manager.run():
+            yield
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", **session_pool.stats()}
+
+    app.router.routes.extend(streamable.routes + sse.routes)
+    app.add_middleware(RequireBearer)
+    return app
+
+
+def serve(mcp, host: str = HTTP_HOST, port: int = HTTP_PORT) -> None:
+    import uvicorn
+
+    uvicorn.run(create_app(mcp), host=host, port=port)
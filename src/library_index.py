@@ -0,0 +1,273 @@
+import asyncio
+import bisect
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+from .catalog import playlist_items, snapshot_item
+from .pagination import fetch_all
+from .playlist_index import PlaylistIndex, normalize
+from .scheduler import BULK, request_lane
+
+# how long a synced library is trusted before the next search checks for changed playlists
+LIBRARY_INDEX_TTL = float(os.getenv("SPOTIFY_LIBRARY_INDEX_TTL", "300"))
+# playlists whose tracks are being downloaded at the same time during a sync
+SYNC_CONCURRENCY = int(os.getenv("SPOTIFY_LIBRARY_SYNC_CONCURRENCY", "4"))
+
+# saved tracks are indexed as if they were one more playlist
+SAVED = "saved"
+SAVED_PAGE_SIZE = 50
+
+
+def exact(words: List[str], names: List[str]) -> int:
+    """how many of the query words appear as whole words in names"""
+    found = set(normalize(" ".join(names)).split())
+    return sum(word in found for word in words)
+
+
+def saved_key(item: dict) -> Tuple[Optional[str], Optional[str]]:
+    return item.get("added_at"), (item.get("track") or {}).get("uri")
+
+
+def saved_item(item: dict) -> dict:
+    """a saved track cut down to what the index and the next sync look at"""
+    track = item.get("track")
+    return {"added_at": item.get("added_at"), "track": snapshot_item(track)["track"] if track else None}
+
+
+class LibraryIndex:
+    """
+    In-memory inverted index over every track and artist in the user's playlists and saved tracks.
+
+    sync() lists the library through the PlaylistIndex and only downloads playlists whose
+    snapshot_id changed since the last sync (from the catalog store when it has that snapshot).
+    Words of track, artist, album and playlist names point to the tracks/playlists they occur
+    in, so search() never touches the network.
+    """
+
+    def __init__(self, playlists: PlaylistIndex, ttl: float = LIBRARY_INDEX_TTL):
+        self.playlist_index = playlists
+        self.ttl = ttl
+        self.synced_at = 0.0
+        self.snapshots: Dict[str, Optional[str]] = {}
+        self.contents: Dict[str, List[str]] = {}
+        self.tracks: Dict[str, dict] = {}
+        self.artists: Dict[str, str] = {}
+        self.track_playlists: Dict[str, Set[str]] = defaultdict(set)
+        self.artist_tracks: Dict[str, Set[str]] = defaultdict(set)
+        self._track_artists: Dict[str, List[str]] = {}
+        self._words: Dict[str, Set[str]] = defaultdict(set)
+        # the saved tracks as last synced, newest first
+        self._saved: List[dict] = []
+        self._sorted_words: Optional[List[str]] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.synced_at > self.ttl
+
+    async def ensure_fresh(self, client, store=None) -> None:
+        if self.is_stale:
+            await self.sync(client, store)
+
+    async def sync(self, client, store=None) -> None:
+        async with self._lock:
+            # everything here is background work, live playback requests go first
+            with request_lane(BULK):
+                await self.playlist_index.refresh(client)
+                playlists = self.playlist_index.playlists
+                changed = [p for p in playlists.values() if self.snapshots.get(p["id"]) != p.get("snapshot_id")]
+
+                semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+                async def download(playlist):
+                    async with semaphore:
+                        items = await playlist_items(client, playlist["id"], playlist.get("snapshot_id"), store)
+                    self._index_playlist(playlist["id"], playlist.get("snapshot_id"), items)
+
+                await asyncio.gather(self._sync_saved(client), *(download(p) for p in changed))
+
+                for playlist_id in set(self.contents) - set(playlists) - {SAVED}:
+                    self._drop_playlist(playlist_id)
+            self.synced_at = time.monotonic()
+
+    async def search(self, client, query: str, store=None) -> dict:
+        await self.ensure_fresh(client, store)
+        return self.find(query)
+
+    def find(self, query: str) -> dict:
+        """
+        tracks with every query word in their name, artists or album, artists with every word
+        in their name and the playlists containing them, and playlists named like the query
+        """
+        words = normalize(query).split()
+        if not words:
+            return {"tracks": [], "artists": [], "playlists": []}
+
+        track_hits = self._match(words, lambda key: key.startswith("track:"))
+        artist_hits = self._match(words, lambda key: key.startswith("artist:"))
+        tracks = [self._track_result(key[len("track:"):]) for key in track_hits]
+        # whole word matches before prefix matches, then the tracks in the most playlists
+        tracks.sort(key=lambda t: (-exact(words, [t["name"], t["album"]] + t["artists"]), -len(t["playlists"])))
+
+        artists = []
+        for key in artist_hits:
+            artist_uri = key[len("artist:"):]
+            in_tracks = self.artist_tracks.get(artist_uri, set())
+            playlist_ids = set().union(*(self.track_playlists[uri] for uri in in_tracks)) if in_tracks else set()
+            artists.append({
+                "name": self.artists[artist_uri],
+                "uri": artist_uri,
+                "tracks": len(in_tracks),
+                "playlists": self._playlist_refs(playlist_ids),
+            })
+        artists.sort(key=lambda a: (-exact(words, [a["name"]]), -a["tracks"]))
+
+        playlists = self.playlist_index.find(query)
+        return {
+            "tracks": tracks,
+            "artists": artists,
+            "playlists": [{"name": p["name"], "id": p["id"]} for p in playlists],
+        }
+
+    def stats(self) -> dict:
+        return {"playlists": len(self.contents), "tracks": len(self.tracks), "artists": len(self.artists),
+                "words": len(self._words)}
+
+    async def _sync_saved(self, client) -> None:
+        """
+        Saved tracks have no snapshot_id but are listed newest first: pages are read from the top
+        until one holds a track the index already has (same added_at and uri), everything below
+        it is taken as it was. Only when the count then doesnt add up, a track further down was
+        removed, the whole list is walked again.
+        """
+        known = {saved_key(item): i for i, item in enumerate(self._saved)}
+        fresh = []
+        offset = 0
+        while True:
+            page = await client.current_user_saved_tracks(limit=SAVED_PAGE_SIZE, offset=offset)
+            total = page["total"]
+            matched = next((i for i, item in enumerate(page["items"]) if saved_key(item) in known), None)
+            if matched is not None:
+                fresh.extend(saved_item(item) for item in page["items"][:matched])
+                if not fresh and known[saved_key(page["items"][matched])] == 0 and total == len(self._saved):
+                    return
+                items = fresh + self._saved[known[saved_key(page["items"][matched])]:]
+                break
+            fresh.extend(saved_item(item) for item in page["items"])
+            offset += len(page["items"])
+            if not page["items"] or offset >= total:
+                items = fresh
+                break
+
+        if len(items) != total:
+            walked, _ = await fetch_all(
+                lambda size, offset: client.current_user_saved_tracks(limit=size, offset=offset),
+                page_size=SAVED_PAGE_SIZE
+            )
+            items = [saved_item(item) for item in walked]
+        self._saved = items
+        self._index_playlist(SAVED, None, items)
+
+    def _index_playlist(self, playlist_id: str, snapshot_id: Optional[str], items: List[dict]) -> None:
+        self._drop_playlist(playlist_id)
+        uris = []
+        for item in items:
+            track = item.get("track")
+            if not track or not track.get("uri"):
+                continue
+            uri = track["uri"]
+            uris.append(uri)
+            if uri not in self.tracks:
+                self._add_track(track)
+            self.track_playlists[uri].add(playlist_id)
+        self.contents[playlist_id] = uris
+        self.snapshots[playlist_id] = snapshot_id
+
+    def _drop_playlist(self, playlist_id: str) -> None:
+        self.snapshots.pop(playlist_id, None)
+        for uri in self.contents.pop(playlist_id, []):
+            in_playlists = self.track_playlists.get(uri)
+            if in_playlists is None:
+                continue
+            in_playlists.discard(playlist_id)
+            if not in_playlists:
+                del self.track_playlists[uri]
+                self._remove_track(uri)
+
+    def _add_track(self, track: dict) -> None:
+        uri = track["uri"]
+        artists = [a for a in track.get("artists") or [] if a.get("name")]
+        album = (track.get("album") or {}).get("name") or ""
+        self.tracks[uri] = {"name": track["name"], "artists": [a["name"] for a in artists], "album": album}
+        for word in normalize(" ".join([track["name"], album] + [a["name"] for a in artists])).split():
+            self._add_word(word, "track:" + uri)
+        self._track_artists[uri] = []
+        for a in artists:
+            artist_uri = a.get("uri") or "name:" + a["name"]
+            self._track_artists[uri].append(artist_uri)
+            if artist_uri not in self.artists:
+                self.artists[artist_uri] = a["name"]
+                for word in normalize(a["name"]).split():
+                    self._add_word(word, "artist:" + artist_uri)
+            self.artist_tracks[artist_uri].add(uri)
+
+    def _remove_track(self, uri: str) -> None:
+        track = self.tracks.pop(uri)
+        for word in normalize(" ".join([track["name"], track["album"]] + track["artists"])).split():
+            self._remove_word(word, "track:" + uri)
+        for artist_uri in self._track_artists.pop(uri):
+            uris = self.artist_tracks.get(artist_uri)
+            if uris is None:
+                continue
+            uris.discard(uri)
+            if not uris:
+                del self.artist_tracks[artist_uri]
+                for word in normalize(self.artists.pop(artist_uri)).split():
+                    self._remove_word(word, "artist:" + artist_uri)
+
+    def _add_word(self, word: str, key: str) -> None:
+        if word not in self._words:
+            self._sorted_words = None
+        self._words[word].add(key)
+
+    def _remove_word(self, word: str, key: str) -> None:
+        keys = self._words.get(word)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._words[word]
+            self._sorted_words = None
+
+    def _keys_for(self, prefix: str) -> Set[str]:
+        """everything indexed under a word starting with prefix, so 'radio' finds 'radiohead'"""
+        if self._sorted_words is None:
+            self._sorted_words = sorted(self._words)
+        keys = set()
+        i = bisect.bisect_left(self._sorted_words, prefix)
+        while i < len(self._sorted_words) and self._sorted_words[i].startswith(prefix):
+            keys |= self._words[self._sorted_words[i]]
+            i += 1
+        return keys
+
+    def _match(self, words: List[str], wanted) -> Set[str]:
+        hits = None
+        for word in words:
+            keys = {key for key in self._keys_for(word) if wanted(key)}
+            hits = keys if hits is None else hits & keys
+            if not hits:
+                return set()
+        return hits
+
+    def _track_result(self, uri: str) -> dict:
+        return {**self.tracks[uri], "uri": uri, "playlists": self._playlist_refs(self.track_playlists[uri])}
+
+    def _playlist_refs(self, playlist_ids: Set[str]) -> List[dict]:
+        refs = []
+        for playlist_id in sorted(playlist_ids):
+            if playlist_id == SAVED:
+                refs.append({"name": "Liked Songs", "id": SAVED})
+            elif playlist_id in self.playlist_index.playlists:
+                refs.append({"name": self.playlist_index.playlists[playlist_id]["name"], "id": playlist_id})
+        return refs
@@ -0,0 +1,282 @@
+import asyncio
+from typing import Dict, List, Literal, Optional, TypedDict
+from .catalog import spotify_id
+from .playlist_index import normalize
+
+PlaybackAction = Literal["play", "resume", "pause", "next", "previous", "queue", "transfer", "volume", "shuffle", "repeat"]
+
+
+class PlaybackStep(TypedDict, total=False):
+    action: PlaybackAction
+    query: str
+    search_type: Literal["track", "album", "artist", "playlist"]
+    uri: str
+    device: str
+    volume_percent: int
+    force_play: bool
+    shuffle: bool
+    repeat: Literal["track", "context", "off"]
+
+
+class StepResult(TypedDict):
+    step: int
+    action: str
+    status: Literal["ok", "failed", "skipped"]
+    detail: str
+
+
+# steps of the same group change the same part of the player and run in the given order,
+# steps of different groups only wait for each other when one of them activates a device
+GROUPS = {
+    "play": "playback", "resume": "playback", "pause": "playback", "next": "playback",
+    "previous": "playback", "queue": "playback", "transfer": "playback",
+    "volume": "volume", "shuffle": "shuffle", "repeat": "repeat",
+}
+
+# player state each action makes stale
+INVALIDATES = {
+    "play": ("playback", "queue"), "resume": ("playback",), "pause": ("playback",),
+    "next": ("playback", "queue"), "previous": ("playback", "queue"), "queue": ("queue",),
+    "transfer": ("playback", "devices"), "volume": ("playback", "devices"),
+    "shuffle": ("playback",), "repeat": ("playback",),
+}
+
+# a macro acts on the device list, so it reads one at most this old
+DEVICES_MAX_AGE = 1.0
+
+
+class StepFailed(Exception):
+    pass
+
+
+def find_device(devices: List[dict], wanted: str) -> dict:
+    """a device by id, by name, or by a word of its name ('kitchen' finds 'Kitchen Speaker')"""
+    for device in devices:
+        if device["id"] == wanted:
+            return device
+    name = normalize(wanted)
+    for matches in (lambda d: normalize(d["name"]) == name, lambda d: name in normalize(d["name"])):
+        found = [device for device in devices if matches(device)]
+        if found:
+            return found[0]
+    available = ", ".join(f"'{device["name"]}'" for device in devices) or "none"
+    raise StepFailed(f"no device matches '{wanted}' (available: {available})")
+
+
+def uri_kind(value: str) -> str:
+    """track, album, artist or playlist for a URI or open.spotify.com URL, bare ids are tracks"""
+    value = value.strip()
+    if value.startswith("spotify:"):
+        return value.split(":")[1]
+    if value.startswith(("http://", "https://")):
+        for kind in ("track", "album", "artist", "playlist"):
+            if f"/{kind}/" in value:
+                return kind
+    return "track"
+
+
+def fold_transfers(steps: List[PlaybackStep]) -> Dict[int, int]:
+    """
+    a transfer right before a play/resume becomes that step's device (starting playback on a
+    device moves playback there anyway), returns folded step index -> the step it went into.
+    A transfer without a device is left alone so it fails as a step of its own.
+    """
+    folded = {}
+    for i, step in enumerate(steps[:-1]):
+        following = steps[i + 1]
+        if (step["action"] == "transfer" and step.get("device")
+                and following["action"] in ("play", "resume")
+                and following.get("device") in (None, step["device"])):
+            following["device"] = step["device"]
+            folded[i] = i + 1
+    return folded
+
+
+class PlaybackMacro:
+    """
+    Runs an ordered list of playback steps in as few upstream round trips as their
+    dependencies allow.
+
+    Everything the steps need looked up (search queries, device names) is resolved up front
+    and at the same time, the device list through the player state cache (read again once when
+    a device name is missing from it). Then every step waits only for the earlier steps it
+    depends on: the previous step of its group, and any earlier step that wakes up the device
+    it targets. A step whose dependency failed is skipped.
+    """
+
+    def __init__(self, client, player, steps: List[PlaybackStep]):
+        self.client = client
+        self.player = player
+        self.steps = [dict(step) for step in steps]
+        for i, step in enumerate(self.steps, 1):
+            if step.get("action") not in GROUPS:
+                raise ValueError(f"step {i} has an unknown action '{step.get("action")}'")
+        self.folded = fold_transfers(self.steps)
+        self.devices: Optional[List[dict]] = None
+        self.found: Dict[tuple, dict] = {}
+        self.errors: Dict[tuple, str] = {}
+        self.tasks: List[asyncio.Task] = []
+
+    async def run(self) -> List[StepResult]:
+        await self._resolve()
+        self.tasks = [asyncio.create_task(self._run_step(i)) for i in range(len(self.steps))]
+        return list(await asyncio.gather(*self.tasks))
+
+    async def _resolve(self) -> None:
+        lookups = []
+        if any(step.get("device") for step in self.steps):
+            lookups.append(self._load_devices())
+        queries = {(step["query"], step.get("search_type", "track")) for step in self.steps
+                   if step.get("query") and not step.get("uri")}
+        lookups.extend(self._search(query, search_type) for query, search_type in queries)
+        await asyncio.gather(*lookups)
+
+    async def _load_devices(self) -> None:
+        try:
+            self.devices = (await self.player.get(self.client, "devices", DEVICES_MAX_AGE)).get("devices") or []
+            if not all(self._matches(step["device"]) for step in self.steps if step.get("device")):
+                # a device that was just switched on may be missing from the snapshot, ask once more
+                self.devices = (await self.player.fetch(self.client, "devices")).get("devices") or []
+        except Exception as e:
+            self.errors[("devices",)] = f"could not list devices: {e}"
+
+    async def _search(self, query: str, search_type: str) -> None:
+        try:
+            results = await self.client.search(q=query, type=search_type, limit=1)
+            items = [item for item in (results.get(f"{search_type}s") or {}).get("items") or [] if item]
+            if items:
+                item = items[0]
+                self.found[(query, search_type)] = {
+                    "uri": item["uri"],
+                    "type": search_type,
+                    "name": item["name"] + (f" by {", ".join(a["name"] for a in item["artists"])}" if item.get("artists") else ""),
+                }
+            else:
+                self.errors[(query, search_type)] = f"nothing found for '{query}'"
+        except Exception as e:
+            self.errors[(query, search_type)] = f"search for '{query}' failed: {e}"
+
+    def _matches(self, wanted: str) -> bool:
+        try:
+            find_device(self.devices, wanted)
+            return True
+        except StepFailed:
+            return False
+
+    def _device(self, step: PlaybackStep) -> Optional[dict]:
+        if not step.get("device"):
+            return None
+        if self.devices is None:
+            raise StepFailed(self.errors.get(("devices",), "could not list devices"))
+        return find_device(self.devices, step["device"])
+
+    def _target(self, step: PlaybackStep) -> Optional[dict]:
+        """what a play/queue step plays: a search result, or just the uri it was given"""
+        if step.get("uri"):
+            kind = uri_kind(step["uri"])
+            uri = f"spotify:{kind}:{spotify_id(kind, step["uri"])}"
+            return {"uri": uri, "type": kind, "name": uri}
+        if step.get("query"):
+            key = (step["query"], step.get("search_type", "track"))
+            if key not in self.found:
+                raise StepFailed(self.errors[key])
+            return self.found[key]
+        return None
+
+    def _activates(self, step: PlaybackStep) -> Optional[str]:
+        """the device id a step moves playback to when that device isnt the active one yet"""
+        if step["action"] not in ("transfer", "play", "resume"):
+            return None
+        try:
+            device = self._device(step)
+        except StepFailed:
+            return None
+        return device["id"] if device and not device.get("is_active") else None
+
+    def _dependencies(self, index: int) -> List[int]:
+        step = self.steps[index]
+        group = GROUPS[step["action"]]
+        deps = []
+        for i in range(index - 1, -1, -1):
+            if GROUPS[self.steps[i]["action"]] == group:
+                deps.append(i)
+                break
+        for i in range(index):
+            if i not in deps and GROUPS[self.steps[i]["action"]] != group and self._activates(self.steps[i]):
+                deps.append(i)
+        return deps
+
+    async def _run_step(self, index: int) -> StepResult:
+        step = self.steps[index]
+        result = {"step": index + 1, "action": step["action"], "status": "ok", "detail": ""}
+        if index in self.folded:
+            result["detail"] = f"done by step {self.folded[index] + 1}"
+            return result
+
+        for dep in self._dependencies(index):
+            done = await self.tasks[dep]
+            if done["status"] != "ok":
+                result.update(status="skipped", detail=f"step {dep + 1} did not succeed")
+                return result
+        try:
+            result["detail"] = await self._execute(step)
+            self.player.invalidate(*INVALIDATES[step["action"]])
+        except StepFailed as e:
+            result.update(status="failed", detail=str(e))
+        except Exception as e:
+            self.player.invalidate(*INVALIDATES[step["action"]])
+            result.update(status="failed", detail=f"Error: {e}")
+        return result
+
+    async def _execute(self, step: PlaybackStep) -> str:
+        action = step["action"]
+        device = self._device(step)
+        device_id = device["id"] if device else None
+        on = f" on {device["name"]}" if device else ""
+        client = self.client
+
+        if action in ("play", "queue"):
+            target = self._target(step)
+            if target is None:
+                if action == "queue":
+                    raise StepFailed("queue needs a uri or a query")
+                await client.start_playback(device_id=device_id)
+                return f"resumed playback{on}"
+            name = target["name"]
+            if action == "queue":
+                if target["type"] != "track":
+                    raise StepFailed(f"only tracks can be queued, '{name}' is not a track")
+                await client.add_to_queue(uri=target["uri"], device_id=device_id)
+                return f"queued {name}"
+            if target["type"] == "track":
+                await client.start_playback(device_id=device_id, uris=[target["uri"]])
+            else:
+                await client.start_playback(device_id=device_id, context_uri=target["uri"])
+            return f"playing {name}{on}"
+        if action == "resume":
+            await client.start_playback(device_id=device_id)
+            return f"resumed playback{on}"
+        if action == "pause":
+            await client.pause_playback(device_id)
+            return f"paused playback{on}"
+        if action == "next":
+            await client.next_track(device_id)
+            return "skipped to next track"
+        if action == "previous":
+            await client.previous_track(device_id)
+            return "moved to previous track"
+        if action == "transfer":
+            if device is None:
+                raise StepFailed("transfer needs a device")
+            await client.transfer_playback(device_id=device_id, force_play=step.get("force_play", True))
+            return f"moved playback to {device["name"]}"
+        if action == "volume":
+            if step.get("volume_percent") is None:
+                raise StepFailed("volume needs volume_percent")
+            await client.volume(volume_percent=step["volume_percent"], device_id=device_id)
+            return f"volume set to {step["volume_percent"]}%{on}"
+        if action == "shuffle":
+            await client.shuffle(step.get("shuffle", True), device_id=device_id)
+            return f"shuffle {"on" if step.get("shuffle", True) else "off"}"
+        await client.repeat(step.get("repeat", "context"), device_id=device_id)
+        return f"repeat set to {step.get("repeat", "context")}"
@@ -0,0 +1,178 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from .views import STRUCTURED_OUTPUT
+
+# latency histogram buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# optional json-lines file getting one record per tool call
+TRACE_LOG = os.getenv("SPOTIFY_TRACE_LOG")
+
+COUNTERS = ("calls", "errors", "upstream_calls", "retries", "rate_limited", "cache_hits",
+            "coalesced", "upstream_bytes", "output_bytes")
+
+# the tool call currently running, upstream hooks add to it
+_span = contextvars.ContextVar("spotify_tool_span", default=None)
+# spans are written from the executor threads a tool's requests run on, fan_out runs several at once
+_span_lock = threading.Lock()
+
+
+class Registry:
+    """per tool counters and latency histograms, exported in prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        self.seconds = defaultdict(float)
+        self.buckets = defaultdict(lambda: [0] * len(BUCKETS))
+        self.upstream_seconds = defaultdict(float)
+        self.upstream_calls = defaultdict(int)
+
+    def observe_tool(self, span: dict) -> None:
+        with self._lock:
+            counters = self.counters[span["tool"]]
+            for name in COUNTERS:
+                counters[name] += span.get(name, 0)
+            self.seconds[span["tool"]] += span["seconds"]
+            buckets = self.buckets[span["tool"]]
+            for i, bound in enumerate(BUCKETS):
+                if span["seconds"] <= bound:
+                    buckets[i] += 1
+
+    def observe_upstream(self, method: str, seconds: float) -> None:
+        with self._lock:
+            self.upstream_calls[method] += 1
+            self.upstream_seconds[method] += seconds
+
+    def prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name in COUNTERS:
+                lines.append(f"# TYPE spotify_tool_{name}_total counter")
+                for tool, counters in sorted(self.counters.items()):
+                    lines.append(f'spotify_tool_{name}_total{{tool="{tool}"}} {counters[name]}')
+
+            lines.append("# TYPE spotify_tool_duration_seconds histogram")
+            for tool, buckets in sorted(self.buckets.items()):
+                for bound, count in zip(BUCKETS, buckets):
+                    lines.append(f'spotify_tool_duration_seconds_bucket{{tool="{tool}",le="{bound}"}} {count}')
+                calls = self.counters[tool]["calls"]
+                lines.append(f'spotify_tool_duration_seconds_bucket{{tool="{tool}",le="+Inf"}} {calls}')
+                lines.append(f'spotify_tool_duration_seconds_sum{{tool="{tool}"}} {self.seconds[tool]:.6f}')
+                lines.append(f'spotify_tool_duration_seconds_count{{tool="{tool}"}} {calls}')
+
+            lines.append("# TYPE spotify_upstream_calls_total counter")
+            for method, count in sorted(self.upstream_calls.items()):
+                lines.append(f'spotify_upstream_calls_total{{method="{method}"}} {count}')
+            lines.append("# TYPE spotify_upstream_seconds_total counter")
+            for method, seconds in sorted(self.upstream_seconds.items()):
+                lines.append(f'spotify_upstream_seconds_total{{method="{method}"}} {seconds:.6f}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _add(name: str, value: int = 1) -> None:
+    span = _span.get()
+    if span is not None:
+        with _span_lock:
+            span[name] = span.get(name, 0) + value
+
+
+def record_upstream(method: str, seconds: float, status=None) -> None:
+    registry.observe_upstream(method, seconds)
+    span = _span.get()
+    if span is not None:
+        with _span_lock:
+            span["upstream_calls"] = span.get("upstream_calls", 0) + 1
+            span["trace"].append({"method": method, "ms": round(seconds * 1000, 2), "status": status})
+
+
+def record_cache_hit() -> None:
+    _add("cache_hits")
+
+
+def record_coalesced() -> None:
+    _add("coalesced")
+
+
+def record_rate_limited() -> None:
+    _add("rate_limited")
+
+
+def record_retry() -> None:
+    _add("retries")
+
+
+def record_transport_retry() -> None:
+    """a request the transport sent again, the response hook never sees the attempt before it"""
+    _add("retries")
+    _add("upstream_calls")
+
+
+def on_response(response, *args, **kwargs):
+    """requests response hook, counts the bytes spotify sent back"""
+    _add("upstream_bytes", len(response.content or b""))
+    return response
+
+
+def timed(fn):
+    """wraps a tool coroutine so every call is recorded in the registry (and the trace log)"""
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        span = {"tool": fn.__name__, "trace": []}
+        token = _span.set(span)
+        start = time.perf_counter()
+        result = None
+        try:
+            result = await fn(*args, **kwargs)
+            return result
+        finally:
+            _span.reset(token)
+            span["seconds"] = time.perf_counter() - start
+            span["calls"] = 1
+            if isinstance(result, str):
+                text = result
+            elif result is None:
+                text = ""
+            else:
+                text = json.dumps(result, default=str, separators=(",", ":"))
+            # tools report failures as strings starting with "error"
+            span["errors"] = int(result is None or text[:5].lower() == "error")
+            span["output_bytes"] = len(text.encode())
+            registry.observe_tool(span)
+            if TRACE_LOG:
+                # file writes stay off the event loop, one writer keeps the lines in order
+                _trace_writer.submit(_trace, span)
+
+    return wrapper
+
+
+def instrument(mcp) -> None:
+    """make every tool registered on mcp from now on go through timed()"""
+    register = mcp.tool
+
+    def tool(*args, **kwargs):
+        # text mode sends the rendered string only, not a second copy as structured content
+        kwargs.setdefault("structured_output", STRUCTURED_OUTPUT)
+        decorator = register(*args, **kwargs)
+        return lambda fn: decorator(timed(fn))
+
+    mcp.tool = tool
+
+
+_trace_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spotify-trace")
+
+
+def _trace(span: dict) -> None:
+    record = {"ts": time.time(), **span, "seconds": round(span["seconds"], 6)}
+    with open(TRACE_LOG, "a") as f:
+        f.write(json.dumps(record) + "\n")
@@ -0,0 +1,85 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from .scheduler import BULK, request_lane
+
+# how many pages may be in flight at once after the first one told us the total
+PREFETCH_WINDOW = int(os.getenv("SPOTIFY_PREFETCH_WINDOW", "4"))
+
+# fetch(limit, offset) -> a spotify paging object ({"items": [...], "total": n, ...})
+PageFetcher = Callable[[int, int], Awaitable[dict]]
+
+
+async def iter_pages(fetch: PageFetcher, page_size: int, offset: int = 0, limit: Optional[int] = None,
+                     window: int = PREFETCH_WINDOW) -> AsyncIterator[dict]:
+    """
+    Stream the pages of an offset paginated endpoint in order.
+
+    The first page is fetched alone to learn `total`, after that up to `window` of the
+    remaining pages are requested concurrently while earlier ones are being consumed.
+    limit=None walks to the end of the collection.
+    """
+    first_size = page_size if limit is None else min(page_size, limit)
+    first = await fetch(first_size, offset)
+    yield first
+
+    end = first["total"] if limit is None else min(first["total"], offset + limit)
+    offsets = iter(range(offset + page_size, end, page_size))
+    pending = deque()
+
+    async def prefetch(size, page_offset):
+        # the caller is waiting on the first page only, the rest can yield to interactive requests
+        with request_lane(BULK):
+            return await fetch(size, page_offset)
+
+    def schedule():
+        page_offset = next(offsets, None)
+        if page_offset is not None:
+            pending.append(asyncio.ensure_future(prefetch(min(page_size, end - page_offset), page_offset)))
+
+    try:
+        for _ in range(max(window, 1)):
+            schedule()
+        while pending:
+            page = await pending.popleft()
+            schedule()
+            yield page
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def fetch_all(fetch: PageFetcher, page_size: int, offset: int = 0, limit: Optional[int] = None,
+                    window: int = PREFETCH_WINDOW) -> Tuple[List[Any], int]:
+    """collects every item of iter_pages() in order, returns (items, total)"""
+    items = []
+    total = 0
+    async for page in iter_pages(fetch, page_size, offset, limit, window):
+        total = page["total"]
+        items.extend(page["items"])
+    if limit is not None:
+        items = items[:limit]
+    return items, total
+
+
+# fetch(limit, after) -> a spotify cursor paging object ({"items": [...], "next": ..., "cursors": {"after": ...}})
+CursorFetcher = Callable[[int, Optional[str]], Awaitable[dict]]
+
+
+async def iter_cursor_pages(fetch: CursorFetcher, page_size: int, limit: Optional[int] = None) -> AsyncIterator[dict]:
+    """
+    Stream the pages of a cursor paginated endpoint in order.
+
+    Every request needs the cursor of the page before it, so unlike iter_pages nothing can be
+    prefetched: the caller overlaps its own work with the walk by consuming pages as they come.
+    """
+    after = None
+    seen = 0
+    while limit is None or seen < limit:
+        page = await fetch(page_size if limit is None else min(page_size, limit - seen), after)
+        seen += len(page["items"])
+        yield page
+        after = (page.get("cursors") or {}).get("after") if page.get("next") else None
+        if not after or not page["items"]:
+            return
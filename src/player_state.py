@@ -0,0 +1,161 @@
+import asyncio
+import os
+import sys
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+from . import metrics
+from .scheduler import BULK, request_lane
+
+# how long a player/queue snapshot answers status reads, spotify itself lags about a second behind
+PLAYER_STATE_TTL = float(os.getenv("SPOTIFY_PLAYER_STATE_TTL", "3"))
+# devices change less often than tracks, but one just switched on should show up in the next listing
+DEVICES_TTL = float(os.getenv("SPOTIFY_DEVICES_TTL", "5"))
+# "0" disables the background poller behind the spotify://player/* resource subscriptions
+PLAYER_POLL = os.getenv("SPOTIFY_PLAYER_POLL", "1") != "0"
+POLL_MIN = float(os.getenv("SPOTIFY_PLAYER_POLL_MIN", "2"))
+POLL_MAX = float(os.getenv("SPOTIFY_PLAYER_POLL_MAX", "15"))
+# spotify needs a moment before a command shows up in the player state
+SETTLE_DELAY = 0.75
+
+# state kind -> spotipy method it is read with
+STATE_METHODS = {
+    "playback": "current_playback",
+    "queue": "queue",
+    "devices": "devices",
+}
+
+
+def resource_uri(kind: str) -> str:
+    return f"spotify://player/{kind}"
+
+
+def fingerprint(playback: Optional[dict]) -> Tuple:
+    """the parts of the player state whose change is worth telling subscribers about"""
+    if not playback:
+        return (None, False, None, None)
+    device = playback.get("device") or {}
+    item = playback.get("item") or {}
+    return (item.get("uri"), playback.get("is_playing"), device.get("id"), device.get("volume_percent"))
+
+
+class PlayerState:
+    """
+    Short lived snapshots of the player, queue and devices of one account.
+
+    Status reads within the TTL are answered from the snapshot, identical reads already share
+    one request in AsyncSpotify. Control tools call invalidate() for the state they changed,
+    which also drops whatever a read started before the command brings back.
+
+    While something is subscribed to a spotify://player/* resource a poller keeps the
+    snapshots current and calls the listener with the kinds that changed. It polls around
+    the end of the playing track and backs off while nothing happens.
+    """
+
+    def __init__(self, ttl: float = PLAYER_STATE_TTL, devices_ttl: float = DEVICES_TTL):
+        self.ttls = {"playback": ttl, "queue": ttl, "devices": devices_ttl}
+        self.polls = 0
+        self._snapshots: Dict[str, Tuple[float, Optional[dict]]] = {}
+        self._generation = 0
+        self._poller: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.subscribers: Dict[str, Set] = {kind: set() for kind in STATE_METHODS}
+
+    async def get(self, client, kind: str, max_age: float = None) -> Optional[dict]:
+        """the snapshot while younger than the kind's TTL (or max_age when that is shorter)"""
+        ttl = self.ttls[kind] if max_age is None else min(max_age, self.ttls[kind])
+        snapshot = self._snapshots.get(kind)
+        if snapshot is not None and time.monotonic() - snapshot[0] < ttl:
+            metrics.record_cache_hit()
+            return snapshot[1]
+        return await self.fetch(client, kind)
+
+    async def fetch(self, client, kind: str) -> Optional[dict]:
+        generation = self._generation
+        value = await getattr(client, STATE_METHODS[kind])()
+        # a command went out while we were waiting, this answer may predate it
+        if generation == self._generation:
+            self._snapshots[kind] = (time.monotonic(), value)
+        return value
+
+    def invalidate(self, *kinds: str) -> None:
+        self._generation += 1
+        for kind in kinds or STATE_METHODS:
+            self._snapshots.pop(kind, None)
+        if self._wake is not None:
+            self._wake.set()
+
+    def stats(self) -> dict:
+        return {"player_snapshots": len(self._snapshots), "player_polls": self.polls,
+                "player_subscribers": sum(len(s) for s in self.subscribers.values())}
+
+    def subscribe(self, kind: str, subscriber, client_getter: Callable[[], Awaitable], notify: Callable[..., Awaitable]) -> None:
+        self.subscribers[kind].add(subscriber)
+        if PLAYER_POLL and (self._poller is None or self._poller.done()):
+            self._wake = asyncio.Event()
+            self._poller = asyncio.create_task(self._poll_loop(client_getter, notify))
+
+    def unsubscribe(self, subscriber, kinds: Iterable[str] = STATE_METHODS) -> None:
+        for kind in kinds:
+            self.subscribers[kind].discard(subscriber)
+        if not any(self.subscribers.values()) and self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    def stop(self) -> None:
+        """forget every subscriber and stop polling, the session this state belongs to is gone"""
+        for subscribers in self.subscribers.values():
+            subscribers.clear()
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    def next_poll(self, playback: Optional[dict], idle_interval: float) -> float:
+        """seconds until the next poll: right after the playing track ends, else the idle back-off"""
+        if playback and playback.get("is_playing") and playback.get("item"):
+            remaining = (playback["item"].get("duration_ms", 0) - (playback.get("progress_ms") or 0)) / 1000
+            return min(POLL_MAX, max(POLL_MIN, remaining + SETTLE_DELAY))
+        return idle_interval
+
+    async def _poll_loop(self, client_getter: Callable[[], Awaitable], notify: Callable[..., Awaitable]) -> None:
+        last = None
+        idle_interval = POLL_MIN
+        while True:
+            changed = set()
+            try:
+                client = await client_getter()
+                if client is not None:
+                    # polling is background work, live requests go first
+                    with request_lane(BULK):
+                        playback = await self.fetch(client, "playback")
+                    self.polls += 1
+                    current = fingerprint(playback)
+                    if last is not None and current != last:
+                        changed.add("playback")
+                        if current[0] != last[0]:
+                            changed.add("queue")
+                            self._snapshots.pop("queue", None)
+                        if current[2:] != last[2:]:
+                            changed.add("devices")
+                            self._snapshots.pop("devices", None)
+                    last = current
+                    idle_interval = POLL_MIN if changed else min(POLL_MAX, idle_interval * 2)
+                    delay = self.next_poll(playback, idle_interval)
+                else:
+                    delay = POLL_MAX
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Player poll failed: {e}", file=sys.stderr)
+                delay = POLL_MAX
+
+            if changed:
+                await notify(changed)
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+                # a control tool changed something, look once spotify had time to apply it
+                await asyncio.sleep(SETTLE_DELAY)
+                idle_interval = POLL_MIN
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,126 @@
+import asyncio
+import difflib
+import os
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Set
+from .pagination import fetch_all
+
+# how long the local mirror of the user's playlists is trusted before it is re-listed
+PLAYLIST_INDEX_TTL = float(os.getenv("SPOTIFY_PLAYLIST_INDEX_TTL", "300"))
+# on a miss, re-list the library if the mirror is older than this, the playlist may be brand new
+MISS_REFRESH_AGE = 5.0
+
+
+def normalize(text: str) -> str:
+    """casefold, strip accents and collapse punctuation so 'Café  Vibes!' matches 'cafe vibes'"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.split(r"[\W_]+", text.casefold())).strip()
+
+
+class PlaylistIndex:
+    """
+    Local mirror of every playlist in the current user's library, indexed by name.
+
+    The full list is paginated once, after that refresh() re-lists the library and only
+    re-indexes playlists whose snapshot_id changed. Lookups never touch the network.
+    """
+
+    def __init__(self, ttl: float = PLAYLIST_INDEX_TTL):
+        self.ttl = ttl
+        self.playlists: Dict[str, dict] = {}
+        self.refreshed_at = 0.0
+        self._names: Dict[str, str] = {}
+        self._tokens: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.refreshed_at > self.ttl
+
+    async def ensure_fresh(self, client) -> None:
+        if self.is_stale:
+            await self.refresh(client)
+
+    async def refresh(self, client) -> None:
+        async with self._lock:
+            playlists, _ = await fetch_all(
+                lambda size, offset: client.current_user_playlists(limit=size, offset=offset),
+                page_size=50
+            )
+
+            seen = set()
+            for playlist in playlists:
+                seen.add(playlist["id"])
+                known = self.playlists.get(playlist["id"])
+                if not known or known.get("snapshot_id") != playlist.get("snapshot_id"):
+                    self.add(playlist)
+
+            for playlist_id in set(self.playlists) - seen:
+                self.remove(playlist_id)
+
+            self.refreshed_at = time.monotonic()
+
+    async def lookup(self, client, name: str, limit: int = 50) -> List[dict]:
+        await self.ensure_fresh(client)
+        matches = self.find(name, limit)
+        if not matches and time.monotonic() - self.refreshed_at > MISS_REFRESH_AGE:
+            await self.refresh(client)
+            matches = self.find(name, limit)
+        return matches
+
+    def add(self, playlist: dict) -> None:
+        playlist_id = playlist["id"]
+        if playlist_id in self.playlists:
+            self.remove(playlist_id)
+
+        name = normalize(playlist["name"])
+        self.playlists[playlist_id] = playlist
+        self._names[playlist_id] = name
+        for token in name.split():
+            self._tokens[token].add(playlist_id)
+
+    def remove(self, playlist_id: str) -> None:
+        self.playlists.pop(playlist_id, None)
+        name = self._names.pop(playlist_id, "")
+        for token in name.split():
+            ids = self._tokens.get(token)
+            if ids:
+                ids.discard(playlist_id)
+                if not ids:
+                    del self._tokens[token]
+
+    def find(self, name: str, limit: int = 50) -> List[dict]:
+        """
+        playlists whose name contains the query, best matches first;
+        falls back to fuzzy matching when nothing contains it
+        """
+        query = normalize(name)
+        if not query:
+            return []
+
+        # narrow down with the token index, every query token has to appear inside some name token
+        candidates = self._candidates(query, lambda part: [t for t in self._tokens if part in t])
+        matches = [pid for pid in candidates if query in self._names[pid]]
+        if matches:
+            matches.sort(key=lambda pid: (self._names[pid] != query, len(self._names[pid])))
+            return [self.playlists[pid] for pid in matches[:limit]]
+
+        # nothing contains the query, retry with every token swapped for its closest spellings
+        candidates = self._candidates(
+            query, lambda part: difflib.get_close_matches(part, self._tokens.keys(), n=5, cutoff=0.75)
+        )
+        ratio = lambda pid: difflib.SequenceMatcher(None, query, self._names[pid]).ratio()
+        return [self.playlists[pid] for pid in sorted(candidates, key=ratio, reverse=True)[:limit]]
+
+    def _candidates(self, query: str, tokens_for) -> Set[str]:
+        candidates = None
+        for part in query.split():
+            ids = set()
+            for token in tokens_for(part):
+                ids |= self._tokens[token]
+            candidates = ids if candidates is None else candidates & ids
+        return candidates or set()
@@ -0,0 +1,262 @@
+import asyncio
+import bisect
+import math
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from .bulk import PLAYLIST_BATCH_SIZE, add_items, chunk, never_sent, send_batch
+from .catalog import fetch_several, playlist_items, snapshot_item, spotify_id
+from .scheduler import BULK, request_lane
+
+
+def to_uri(value: str) -> str:
+    """spotify URIs are kept as they are, track ids and URLs become track URIs"""
+    value = value.strip()
+    if value.startswith("spotify:"):
+        return value
+    if "/episode/" in value:
+        return f"spotify:episode:{spotify_id("episode", value)}"
+    return f"spotify:track:{spotify_id("track", value)}"
+
+
+def longest_increasing(values: List[int]) -> set:
+    """indices of one longest strictly increasing subsequence of values"""
+    tails: List[int] = []
+    tail_at: List[int] = []
+    previous = [-1] * len(values)
+    for i, value in enumerate(values):
+        k = bisect.bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_at.append(i)
+        else:
+            tails[k] = value
+            tail_at[k] = i
+        previous[i] = tail_at[k - 1] if k else -1
+    keep = set()
+    i = tail_at[-1] if tail_at else -1
+    while i != -1:
+        keep.add(i)
+        i = previous[i]
+    return keep
+
+
+def replace_requests(count: int) -> int:
+    """requests it takes to rewrite a playlist with count items, one replace and adds for the rest"""
+    return max(1, math.ceil(count / PLAYLIST_BATCH_SIZE))
+
+
+class SyncPlan:
+    """
+    The changes turning the current track list of a playlist into the desired one.
+
+    - removes: (uri, position) of every surplus occurrence, positions in the current list
+    - moves: (range_start, range_length, insert_before) reorder calls, in the order to send them
+    - adds: (position, uris) insert calls, in the order to send them
+
+    Tracks in both lists stay put unless they are out of order, and of those only the ones
+    outside the longest run already in the right order are moved, neighbours moving together
+    in one call. Adds go straight to their final position.
+
+    With max_requests given, planning stops as soon as the changes would take more requests
+    than that and replace is set instead: the caller rewrites the whole list.
+    """
+
+    def __init__(self, current: List[str], desired: List[str], max_requests: Optional[int] = None):
+        self.current = current
+        self.desired = desired
+        self.removes: List[Tuple[str, int]] = []
+        self.moves: List[Tuple[int, int, int]] = []
+        self.adds: List[Tuple[int, List[str]]] = []
+        self.replace = False
+
+        # keep the first occurrences of every track up to as many as are wanted
+        wanted = Counter(desired)
+        seen = Counter()
+        kept = []
+        for position, uri in enumerate(current):
+            seen[uri] += 1
+            if seen[uri] > wanted[uri]:
+                self.removes.append((uri, position))
+            else:
+                kept.append(uri)
+
+        # where every kept track has to end up, the n-th occurrence goes to the n-th place it is wanted at
+        places = defaultdict(list)
+        for index, uri in enumerate(desired):
+            places[uri].append(index)
+        used = Counter()
+        order = []
+        for uri in kept:
+            order.append(places[uri][used[uri]])
+            used[uri] += 1
+        present = set(order)
+
+        run_start = None
+        for index in range(len(desired) + 1):
+            missing = index < len(desired) and index not in present
+            if missing and run_start is None:
+                run_start = index
+            elif not missing and run_start is not None:
+                for offset in range(run_start, index, PLAYLIST_BATCH_SIZE):
+                    self.adds.append((offset, desired[offset:min(index, offset + PLAYLIST_BATCH_SIZE)]))
+                run_start = None
+
+        # every planned move costs a request and a scan of order, so stop once the budget is gone
+        max_moves = None if max_requests is None else max_requests - len(chunk(self.removes)) - len(self.adds)
+        self._plan_moves(order, max_moves)
+        self.replace = max_moves is not None and (max_moves < 0 or len(self.moves) > max_moves)
+
+    @property
+    def unchanged(self) -> bool:
+        return not (self.removes or self.moves or self.adds)
+
+    @property
+    def requests(self) -> int:
+        if self.replace:
+            return replace_requests(len(self.desired))
+        return len(chunk(self.removes)) + len(self.moves) + len(self.adds)
+
+    def _plan_moves(self, order: List[int], max_moves: Optional[int] = None) -> None:
+        # `order` holds target indices in their current arrangement, placed ones are sorted among themselves
+        if max_moves is not None and max_moves < 0:
+            return
+        stable = longest_increasing(order)
+        placed = sorted(order[i] for i in stable)
+        movers = sorted(order[i] for i in range(len(order)) if i not in stable)
+        successor = {a: b for a, b in zip(sorted(order), sorted(order)[1:])}
+
+        i = 0
+        while i < len(movers):
+            start = order.index(movers[i])
+            group = [movers[i]]
+            # a neighbour that is also next in the target order moves in the same call
+            while (i + len(group) < len(movers) and successor.get(group[-1]) == movers[i + len(group)]
+                   and start + len(group) < len(order) and order[start + len(group)] == movers[i + len(group)]):
+                group.append(movers[i + len(group)])
+
+            following = bisect.bisect_right(placed, group[-1])
+            before = order.index(placed[following]) if following < len(placed) else len(order)
+            if before != start and before != start + len(group):
+                self.moves.append((start, len(group), before))
+                if max_moves is not None and len(self.moves) > max_moves:
+                    return
+                del order[start:start + len(group)]
+                if before > start:
+                    before -= len(group)
+                order[before:before] = group
+            for target in group:
+                bisect.insort(placed, target)
+            i += len(group)
+
+
+async def sync_playlist(client, playlist_id: str, items: List[str], store=None, dry_run: bool = False) -> dict:
+    """
+    Make a playlist hold exactly items, in that order, with as few changes as possible.
+
+    Unavailable (null) and local tracks cant be removed by uri, they are kept and moved
+    behind the synced items instead, reorders only need their positions.
+
+    When the changes would take more requests than writing the playlist anew, and it has no
+    such tracks to keep, it is replaced with the first 100 items and the rest are added.
+
+    The current contents are read through the catalog store, so an unchanged snapshot_id
+    costs a single small request. Removes are sent highest position first against the
+    snapshot they were planned on, reorders and adds each against the result of the last
+    change. When everything went through, the new contents are stored under the new
+    snapshot_id so the next sync doesnt read the playlist again.
+    """
+    desired = [to_uri(item) for item in items]
+    playlist = await client.playlist(playlist_id, fields="snapshot_id")
+    snapshot_id = playlist.get("snapshot_id")
+    current_items = await playlist_items(client, playlist_id, snapshot_id, store)
+    current = []
+    kept = []
+    for position, item in enumerate(current_items):
+        uri = (item.get("track") or {}).get("uri")
+        if uri is None or uri.startswith("spotify:local:"):
+            # a key no other entry has, so the plan moves it but never removes it
+            uri = f"kept:{position}"
+            kept.append(uri)
+        current.append(uri)
+
+    # kept items cant be written back, so only playlists without them may be rewritten
+    max_requests = None if kept else replace_requests(len(desired))
+    # a big reshuffle takes a while to plan, the event loop keeps serving other tools meanwhile
+    plan = await asyncio.to_thread(SyncPlan, current, desired + kept, max_requests)
+    result = {
+        "snapshot_id": snapshot_id,
+        "unchanged": plan.unchanged,
+        "removed": len(plan.removes),
+        "moved": 0 if plan.replace else sum(length for _, length, _ in plan.moves),
+        "added": sum(len(uris) for _, uris in plan.adds),
+        "requests": plan.requests,
+        "kept": len(kept),
+        "replaced": plan.replace,
+        "error": None,
+    }
+    if plan.unchanged or dry_run:
+        return result
+
+    if plan.replace:
+        step = "replacing"
+        try:
+            response = await send_batch(lambda: client.playlist_replace_items(playlist_id, desired[:PLAYLIST_BATCH_SIZE]))
+            result["snapshot_id"] = response["snapshot_id"]
+            step = "adding"
+            added = await add_items(client, playlist_id, desired[PLAYLIST_BATCH_SIZE:])
+            result["snapshot_id"] = added["snapshot_id"] or result["snapshot_id"]
+            if added["error"]:
+                raise added["error"]
+        except Exception as e:
+            result["error"] = f"{step} failed: {e}"
+            return result
+        if store is not None:
+            await store_contents(client, store, playlist_id, result["snapshot_id"], current_items, desired, [])
+        return result
+
+    step = "removing"
+    try:
+        removes = sorted(plan.removes, key=lambda remove: -remove[1])
+        for batch in chunk(removes):
+            response = await send_batch(lambda: client.playlist_remove_specific_occurrences_of_items(
+                playlist_id, [{"uri": uri, "positions": [position]} for uri, position in batch], snapshot_id))
+            result["snapshot_id"] = response["snapshot_id"]
+
+        step = "reordering"
+        for start, length, before in plan.moves:
+            response = await send_batch(lambda: client.playlist_reorder_items(
+                playlist_id, start, before, range_length=length, snapshot_id=result["snapshot_id"]))
+            result["snapshot_id"] = response["snapshot_id"]
+
+        step = "adding"
+        for position, uris in plan.adds:
+            response = await send_batch(lambda: client.playlist_add_items(playlist_id, uris, position),
+                                        retryable=never_sent)
+            result["snapshot_id"] = response["snapshot_id"]
+    except Exception as e:
+        result["error"] = f"{step} failed: {e}"
+        return result
+
+    if store is not None:
+        kept_items = [current_items[int(key.split(":")[1])] for key in kept]
+        await store_contents(client, store, playlist_id, result["snapshot_id"], current_items, desired, kept_items)
+    return result
+
+
+async def store_contents(client, store, playlist_id: str, snapshot_id: str, current_items: List[dict],
+                         desired: List[str], kept_items: List[dict]) -> None:
+    """store what the playlist holds after a sync, tracks it didnt have yet come from the catalog"""
+    known: Dict[str, dict] = {}
+    for item in current_items:
+        if item.get("track") and item["track"].get("uri"):
+            known.setdefault(item["track"]["uri"], item)
+    missing = [uri for uri in dict.fromkeys(desired) if uri not in known]
+    if any(not uri.startswith("spotify:track:") for uri in missing):
+        return
+    with request_lane(BULK):
+        tracks = await fetch_several(client, "track", missing)
+    for uri, track in zip(missing, tracks):
+        if track is None:
+            return
+        known[uri] = snapshot_item(track)
+    store.put_snapshot(playlist_id, snapshot_id, [known[uri] for uri in desired] + kept_items)
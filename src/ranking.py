@@ -0,0 +1,184 @@
+import math
+import os
+from collections import defaultdict
+from typing import Dict, List, Literal, TypedDict
+from .fanout import fan_out
+from .follow_graph import followed_page
+from .pagination import iter_cursor_pages
+from .playlist_index import normalize
+from .scheduler import BULK, request_lane
+
+# how much each time range counts, the last 4 weeks say the most about what to play now
+RANGE_WEIGHTS = {"short_term": 1.0, "medium_term": 0.6, "long_term": 0.3}
+RANGE_NAMES = {"short_term": "last 4 weeks", "medium_term": "last 6 months", "long_term": "all time"}
+# followed artists whose top tracks become candidates, the ones the user listens to most first
+SEED_ARTISTS = int(os.getenv("SPOTIFY_RANKING_SEED_ARTISTS", "10"))
+MAX_FOLLOWED = 200
+
+Mode = Literal["favorites", "mix", "discover"]
+
+# feature weights per mode: popularity, track affinity, artist affinity, genre match, followed
+WEIGHTS: Dict[str, tuple] = {
+    "favorites": (0.10, 0.55, 0.20, 0.10, 0.05),
+    "mix": (0.15, 0.30, 0.25, 0.20, 0.10),
+    # tracks the user already plays a lot count against them
+    "discover": (0.15, -0.40, 0.30, 0.35, 0.20),
+}
+
+
+class RankedTrack(TypedDict):
+    name: str
+    artists: List[str]
+    uri: str
+    score: float
+    reasons: List[str]
+
+
+class Signals:
+    """everything the ranking looks at, fetched in as few round trips as possible"""
+
+    def __init__(self, top_tracks: Dict[str, List[dict]], top_artists: Dict[str, List[dict]],
+                 followed: List[dict], seed_tracks: List[dict]):
+        self.top_tracks = top_tracks
+        self.top_artists = top_artists
+        self.followed = followed
+        self.seed_tracks = seed_tracks
+
+
+async def followed_artists(client, limit: int = MAX_FOLLOWED) -> List[dict]:
+    artists = []
+    async for page in iter_cursor_pages(
+        lambda size, after: followed_page(client, size, after),
+        page_size=50,
+        limit=limit
+    ):
+        artists.extend(page["items"])
+    return artists
+
+
+async def gather_signals(client) -> Signals:
+    """
+    top tracks and top artists of all three time ranges and the followed artists at the same
+    time, then the top tracks of the followed artists the user listens to most
+    """
+    ranges = list(RANGE_WEIGHTS)
+    results = await fan_out(
+        *(client.current_user_top_tracks(limit=50, time_range=r) for r in ranges),
+        *(client.current_user_top_artists(limit=50, time_range=r) for r in ranges),
+        followed_artists(client),
+    )
+    top_tracks = {r: page["items"] for r, page in zip(ranges, results[:3])}
+    top_artists = {r: page["items"] for r, page in zip(ranges, results[3:6])}
+    followed = results[6]
+
+    affinity = artist_affinity(top_artists)
+    seeds = sorted(followed, key=lambda a: (-affinity.get(a["id"], 0.0), -a.get("popularity", 0)))[:SEED_ARTISTS]
+    with request_lane(BULK):
+        pages = await fan_out(*(client.artist_top_tracks(artist["id"], None) for artist in seeds))
+    seed_tracks = [track for page in pages for track in page["tracks"]]
+    return Signals(top_tracks, top_artists, followed, seed_tracks)
+
+
+def rank_weight(position: int, size: int) -> float:
+    """1 for the first item of a top list, falling towards 0 for the last"""
+    return 1.0 - position / max(size, 1)
+
+
+def artist_affinity(top_artists: Dict[str, List[dict]]) -> Dict[str, float]:
+    affinity: Dict[str, float] = defaultdict(float)
+    for time_range, artists in top_artists.items():
+        for position, artist in enumerate(artists):
+            affinity[artist["id"]] += RANGE_WEIGHTS[time_range] * rank_weight(position, len(artists))
+    return affinity
+
+
+def rank(signals: Signals, mode: Mode = "mix", limit: int = 20, max_per_artist: int = 2) -> List[RankedTrack]:
+    """
+    Score every candidate track on a handful of features and return the best, one entry per
+    song and at most max_per_artist per lead artist.
+
+    The features are built as columns (one list per feature, one row per candidate) and
+    scored in a single pass, genres as one-hot rows over every genre the user's artists have,
+    matched against the user's recency weighted genre profile by cosine similarity.
+    """
+    weights = WEIGHTS[mode]
+    artist_scores = artist_affinity(signals.top_artists)
+    norm = max(artist_scores.values(), default=0.0) or 1.0
+    followed_ids = {artist["id"] for artist in signals.followed}
+
+    # genres are only known for artists in the top and followed lists
+    genres_of: Dict[str, List[str]] = {}
+    for artist in [a for artists in signals.top_artists.values() for a in artists] + signals.followed:
+        genres_of.setdefault(artist["id"], artist.get("genres") or [])
+    vocabulary = {genre: i for i, genre in enumerate(sorted({g for gs in genres_of.values() for g in gs}))}
+    profile = [0.0] * len(vocabulary)
+    for artist_id, score in artist_scores.items():
+        for genre in genres_of.get(artist_id, []):
+            profile[vocabulary[genre]] += score
+    profile_norm = math.sqrt(sum(v * v for v in profile)) or 1.0
+
+    # one row per song, the same song on another album or in several top lists is one candidate
+    candidates: Dict[tuple, dict] = {}
+    affinity: Dict[tuple, float] = defaultdict(float)
+    reasons: Dict[tuple, List[str]] = defaultdict(list)
+    for time_range, tracks in signals.top_tracks.items():
+        for position, track in enumerate(tracks):
+            key = song_key(track)
+            candidates.setdefault(key, track)
+            affinity[key] += RANGE_WEIGHTS[time_range] * rank_weight(position, len(tracks))
+            reasons[key].append(f"top track ({RANGE_NAMES[time_range]})")
+    for track in signals.seed_tracks:
+        key = song_key(track)
+        if key not in candidates:
+            candidates[key] = track
+            reasons[key].append("top track of an artist you follow")
+
+    keys = list(candidates)
+    artist_ids = [[a["id"] for a in candidates[key].get("artists") or [] if a.get("id")] for key in keys]
+    popularity = [candidates[key].get("popularity", 0) / 100 for key in keys]
+    track_affinity = [affinity[key] / sum(RANGE_WEIGHTS.values()) for key in keys]
+    artist_column = [max((artist_scores.get(a, 0.0) for a in ids), default=0.0) / norm for ids in artist_ids]
+    followed_column = [1.0 if followed_ids.intersection(ids) else 0.0 for ids in artist_ids]
+    genre_rows = [{vocabulary[g] for a in ids for g in genres_of.get(a, [])} for ids in artist_ids]
+    genre_column = [
+        sum(profile[i] for i in row) / (math.sqrt(len(row)) * profile_norm) if row else 0.0
+        for row in genre_rows
+    ]
+
+    w_pop, w_track, w_artist, w_genre, w_followed = weights
+    scores = [
+        w_pop * p + w_track * t + w_artist * a + w_genre * g + w_followed * f
+        for p, t, a, g, f in zip(popularity, track_affinity, artist_column, genre_column, followed_column)
+    ]
+
+    genre_names = {index: genre for genre, index in vocabulary.items()}
+    ranked = []
+    per_artist: Dict[str, int] = defaultdict(int)
+    for i in sorted(range(len(keys)), key=lambda i: -scores[i]):
+        track = candidates[keys[i]]
+        lead = artist_ids[i][0] if artist_ids[i] else track["uri"]
+        if per_artist[lead] >= max_per_artist:
+            continue
+        per_artist[lead] += 1
+        why = list(reasons[keys[i]])
+        if artist_column[i] > 0:
+            why.append("by one of your top artists")
+        if genre_rows[i]:
+            top_genres = sorted(genre_rows[i], key=lambda g: -profile[g])[:2]
+            why.append("genres: " + ", ".join(genre_names[g] for g in top_genres))
+        ranked.append({
+            "name": track["name"],
+            "artists": [a["name"] for a in track.get("artists") or []],
+            "uri": track["uri"],
+            "score": round(scores[i], 3),
+            "reasons": why,
+        })
+        if len(ranked) >= limit:
+            break
+    return ranked
+
+
+def song_key(track: dict) -> tuple:
+    """the same recording released on several albums has different ids but the same name and lead artist"""
+    artists = track.get("artists") or [{}]
+    return normalize(track["name"]), artists[0].get("id") or normalize(artists[0].get("name", ""))
@@ -0,0 +1,228 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from . import metrics
+
+# priority lanes, lower goes first
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+
+# playback controls the user is waiting on, they jump ahead of everything else
+INTERACTIVE_METHODS = {
+    "pause_playback", "start_playback", "next_track", "previous_track", "seek_track",
+    "transfer_playback", "volume", "repeat", "shuffle", "add_to_queue",
+}
+
+# per success while the rate is below where it was before the last cut, about 15 to double
+RECOVERY_FACTOR = 1.05
+
+# set by code issuing background work (prefetched pages, bulk mutations) to drop it to a lower lane
+_lane = contextvars.ContextVar("spotify_request_lane", default=None)
+
+
+@contextmanager
+def request_lane(lane: int):
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def lane_for(method: str) -> int:
+    lane = _lane.get()
+    if lane is not None:
+        return lane
+    return INTERACTIVE if method in INTERACTIVE_METHODS else NORMAL
+
+
+def is_throttled(error: Exception) -> bool:
+    """
+    a 429 spotify actually sent. spotipy also raises 429 (with empty headers) when the
+    transport ran out of retries on 5xx, an outage must not slow the whole process down
+    """
+    return getattr(error, "http_status", None) == 429 and bool(getattr(error, "headers", None))
+
+
+def retry_after(error: Exception, default: float = 1.0) -> float:
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return max(float(headers.get("Retry-After", default)), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+class RequestScheduler:
+    """
+    Central gate every spotify request goes through.
+
+    - an adaptive token bucket: the rate halves once per throttling event (429s of requests
+      already in flight when it began dont count again) and climbs back quickly to where it
+      was, beyond that it only creeps up
+    - a global pause honoring Retry-After, so one 429 holds back every caller instead of
+      each of them finding out on its own. This is the only place 429s are waited out, the
+      transport (see transport.create_session) never sleeps on Retry-After itself
+    - priority lanes: waiting requests are released interactive first, bulk last, and one
+      connection slot is always kept free for interactive requests
+    """
+
+    def __init__(self, rate: float = 10.0, burst: int = 20, min_rate: float = 1.0, max_rate: float = 30.0,
+                 max_in_flight: int = 8, reserved: int = 1, max_retries: int = 3):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_in_flight = max_in_flight
+        self.reserved = reserved
+        self.max_retries = max_retries
+
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self.retries = 0
+        # when the rate was last cut and what it was before, success climbs back to it quickly
+        self.limited_at = float("-inf")
+        self.recover_to = rate
+
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wake = None
+        self._pump_task = None
+
+    async def run(self, call, lane: int = NORMAL):
+        """await call() once a slot is granted, retrying it after the back-off when spotify answers 429"""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(lane)
+            started = time.monotonic()
+            try:
+                result = await call()
+            except Exception as e:
+                if not is_throttled(e) or attempt == self.max_retries:
+                    raise
+                self.on_rate_limited(retry_after(e), started)
+                self.retries += 1
+                metrics.record_rate_limited()
+                metrics.record_retry()
+                continue
+            finally:
+                self.release()
+
+            self.on_success()
+            return result
+
+    async def acquire(self, lane: int = NORMAL) -> None:
+        self._refill()
+        if not self._waiters and self._can_start(lane) and self.tokens >= 1:
+            self.tokens -= 1
+            self.in_flight += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        heapq.heappush(self._waiters, (lane, next(self._seq), waiter))
+        if self._pump_task is None or self._pump_task.done():
+            self._wake = asyncio.Event()
+            self._pump_task = loop.create_task(self._pump())
+        self._wake.set()
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # we got the slot but nobody is going to use it
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        if self._wake is not None:
+            self._wake.set()
+
+    def on_success(self) -> None:
+        if self.rate < self.recover_to:
+            self.rate = min(self.recover_to, self.rate * RECOVERY_FACTOR)
+        else:
+            self.rate = min(self.max_rate, self.rate + 0.05)
+
+    def on_rate_limited(self, delay: float, started: float = None) -> None:
+        """started: when the limited request was sent, its 429 may belong to a cut already made"""
+        self.rate_limited += 1
+        if started is None or started >= self.limited_at:
+            self.recover_to = max(self.rate, self.recover_to)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.limited_at = time.monotonic()
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    def headroom(self) -> float:
+        """requests that could start right now without waiting for the bucket"""
+        self._refill()
+        return 0.0 if time.monotonic() < self.paused_until else self.tokens
+
+    def stats(self) -> dict:
+        return {
+            "rate": round(self.rate, 2),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+        }
+
+    def _can_start(self, lane: int) -> bool:
+        if time.monotonic() < self.paused_until:
+            return False
+        limit = self.max_in_flight if lane == INTERACTIVE else max(self.max_in_flight - self.reserved, 1)
+        return self.in_flight < limit
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def _pump(self) -> None:
+        while self._waiters:
+            lane, _, waiter = self._waiters[0]
+            if waiter.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            now = time.monotonic()
+            if now < self.paused_until:
+                await self._sleep(self.paused_until - now)
+                continue
+            if not self._can_start(lane):
+                await self._sleep(None)
+                continue
+            self._refill()
+            if self.tokens < 1:
+                await self._sleep((1 - self.tokens) / self.rate)
+                continue
+
+            heapq.heappop(self._waiters)
+            self.tokens -= 1
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    async def _sleep(self, timeout) -> None:
+        """sleep until timeout or until something changes (new waiter, finished request)"""
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except TimeoutError:
+            pass
+
+
+def default_scheduler(max_in_flight: int) -> RequestScheduler:
+    return RequestScheduler(
+        rate=float(os.getenv("SPOTIFY_RATE_LIMIT", "10")),
+        burst=int(os.getenv("SPOTIFY_RATE_BURST", "20")),
+        max_rate=float(os.getenv("SPOTIFY_MAX_RATE_LIMIT", "30")),
+        max_in_flight=max_in_flight,
+    )
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+from mcp.server.lowlevel.server import request_ctx
+from .auth import SpotifyAuth, spotify_auth
+from .cache import ResponseCache
+
+# http deployments: how many callers are kept around and for how long they may sit idle
+MAX_SESSIONS = int(os.getenv("SPOTIFY_MAX_SESSIONS", "256"))
+SESSION_IDLE_TTL = float(os.getenv("SPOTIFY_SESSION_IDLE_TTL", "1800"))
+# every session has its own response cache, keep them small so hundreds fit
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SPOTIFY_SESSION_CACHE_MAX_ENTRIES", "512"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SPOTIFY_SESSION_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+
+def bearer_token(headers) -> Optional[str]:
+    """the spotify access token from an `Authorization: Bearer ...` header, if there is one"""
+    scheme, _, token = (headers.get("authorization") or "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+class SessionPool:
+    """
+    One SpotifyAuth per http caller, keyed on their bearer token.
+
+    Each session has its own client, response cache, player state and playlist index. They
+    all share the process wide catalog store: albums, artists and tracks, and playlist
+    snapshots keyed by playlist and snapshot id. A snapshot is only read under a snapshot_id
+    the session's own token just got from spotify, so nobody is served a playlist they
+    cant read themselves, but the stored rows are not per user. The process wide scheduler
+    is shared too, since spotify rate limits the app, not the user. Sessions idle for
+    longer than idle_ttl are dropped, and past max_sessions the least recently used one goes.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_ttl: float = SESSION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions: "OrderedDict[str, tuple[float, SpotifyAuth]]" = OrderedDict()
+        self.created = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> SpotifyAuth:
+        # the token itself never sits in the pool's keys
+        key = hashlib.sha256(token.encode()).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            entry = self.sessions.pop(key, None)
+            auth = entry[1] if entry else self._create(token)
+            self.sessions[key] = (now, auth)
+            self._evict(now)
+            return auth
+
+    def remove(self, token: str) -> None:
+        with self._lock:
+            entry = self.sessions.pop(hashlib.sha256(token.encode()).hexdigest(), None)
+        if entry:
+            entry[1].player.stop()
+
+    def auths(self) -> List[SpotifyAuth]:
+        with self._lock:
+            return [auth for _, auth in self.sessions.values()]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self.sessions), "created": self.created, "evicted": self.evicted}
+
+    def _create(self, token: str) -> SpotifyAuth:
+        auth = SpotifyAuth(
+            cache=ResponseCache(max_entries=SESSION_CACHE_MAX_ENTRIES, max_bytes=SESSION_CACHE_MAX_BYTES),
+            scheduler=spotify_auth.scheduler,
+        )
+        auth.set_token(token)
+        self.created += 1
+        return auth
+
+    def _evict(self, now: float) -> None:
+        # oldest first, so we can stop at the first session that is still in use
+        while self.sessions:
+            last_used, _ = next(iter(self.sessions.values()))
+            if now - last_used <= self.idle_ttl and len(self.sessions) <= self.max_sessions:
+                break
+            _, (_, auth) = self.sessions.popitem(last=False)
+            # its player poller would otherwise go on polling with a token nobody refreshes
+            auth.player.stop()
+            self.evicted += 1
+
+
+session_pool = SessionPool()
+
+
+def current_auth() -> SpotifyAuth:
+    """
+    the SpotifyAuth the running tool call should use: over http that is the caller's
+    own session, otherwise (stdio, no bearer token) the process wide spotify_auth
+    """
+    context = request_ctx.get(None)
+    request = getattr(context, "request", None)
+    token = bearer_token(request.headers) if request is not None else None
+    if token is None:
+        return spotify_auth
+    return session_pool.get(token)
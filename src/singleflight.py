@@ -0,0 +1,38 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict
+from . import metrics
+
+# read only spotipy methods, identical concurrent calls to these share one http request
+COALESCED_METHODS = frozenset({
+    "album", "albums", "album_tracks", "artist", "artists", "artist_albums", "artist_top_tracks",
+    "track", "tracks", "search", "playlist", "playlist_items", "playlist_tracks",
+    "current_playback", "currently_playing", "devices", "queue",
+    "current_user_playlists", "user_playlists", "current_user_top_artists",
+    "current_user_top_tracks", "current_user_followed_artists", "current_user_saved_tracks",
+})
+
+
+class SingleFlight:
+    """
+    Deduplicates identical in-flight calls: the first caller for a key starts the call,
+    everyone arriving before it finishes awaits the same result. The first caller gets
+    the response object, the others get their own copy of it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(call())
+            self._calls[key] = flight
+            flight.add_done_callback(lambda _: self._calls.pop(key, None))
+            # shield it, one caller giving up must not cancel the request for everyone else
+            return await asyncio.shield(flight)
+
+        self.shared += 1
+        metrics.record_coalesced()
+        return copy.deepcopy(await asyncio.shield(flight))
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+from .cache import MISSING, CacheBackend
+
+# sqlite file the catalog survives restarts in, set it to "" to keep everything in memory only
+STORE_PATH = os.getenv("SPOTIFY_STORE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "spotify-mcp", "catalog.sqlite3"))
+STORE_MAX_BYTES = int(os.getenv("SPOTIFY_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+# albums, artists and tracks barely change, but popularity and follower counts do drift
+STORE_MAX_AGE = float(os.getenv("SPOTIFY_STORE_MAX_AGE", str(7 * 24 * 3600)))
+# bump whenever the table layout or what gets stored in it changes, older files are wiped
+SCHEMA_VERSION = 1
+
+# response cache keys whose method is listed here are persisted, see cache_key()
+PERSISTED_METHODS = frozenset({"album", "artist", "track"})
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def snapshot_key(playlist_id: str, snapshot_id: str) -> str:
+    return f"snapshot:{playlist_id}:{snapshot_id}"
+
+
+class CatalogStore:
+    """
+    SQLite backed store for catalog objects and playlist snapshots.
+
+    Rows are json payloads keyed like the response cache, with an optional expiry (playlist
+    snapshots never change, so they have none). The total payload size is kept under
+    max_bytes by dropping the least recently used rows. Reads run on the caller's thread,
+    every write (including the last-used bookkeeping) goes through one writer thread so
+    the event loop never waits on a commit.
+    """
+
+    def __init__(self, path: str, max_bytes: int = STORE_MAX_BYTES, max_age: float = STORE_MAX_AGE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        writer = self._connect()
+        if writer.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            writer.execute("DROP TABLE IF EXISTS entries")
+            writer.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        writer.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, payload BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        writer.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        writer.commit()
+        self.bytes = writer.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+        self._reader = self._connect()
+        self._reader_lock = threading.Lock()
+        self._writes = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, args=(writer,), name="spotify-store", daemon=True)
+        self._writer.start()
+
+    def get(self, key: str) -> Any:
+        return self.lookup(key)[0]
+
+    def lookup(self, key: str) -> Tuple[Any, Optional[float]]:
+        """(value or MISSING, seconds until it expires or None for never) in one query"""
+        with self._reader_lock:
+            row = self._reader.execute("SELECT payload, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (row[1] is not None and row[1] < now):
+            self.misses += 1
+            return MISSING, None
+        self.hits += 1
+        self._writes.put(("touch", key, None, None))
+        return json.loads(row[0]), None if row[1] is None else row[1] - now
+
+    def set(self, key: str, value: Any, max_age: Optional[float] = None) -> None:
+        """max_age=None stores the value for good (until evicted)"""
+        payload = json.dumps(value, separators=(",", ":")).encode()
+        if len(payload) <= self.max_bytes:
+            self._writes.put(("set", key, payload, None if max_age is None else time.time() + max_age))
+
+    def get_snapshot(self, playlist_id: str, snapshot_id: str) -> Optional[List[dict]]:
+        items = self.get(snapshot_key(playlist_id, snapshot_id))
+        return None if items is MISSING else items
+
+    def put_snapshot(self, playlist_id: str, snapshot_id: str, items: List[dict]) -> None:
+        self.set(snapshot_key(playlist_id, snapshot_id), items)
+
+    def flush(self) -> None:
+        """wait for every queued write to be committed"""
+        done = threading.Event()
+        self._writes.put(("flush", None, None, done))
+        done.wait()
+
+    def clear(self) -> None:
+        self._writes.put(("clear", None, None, None))
+
+    def stats(self) -> dict:
+        return {"store_bytes": self.bytes, "store_hits": self.hits, "store_misses": self.misses,
+                "store_evictions": self.evictions}
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        # readers dont block the writer and vice versa, a crash can lose the last commits but never corrupts
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _write_loop(self, db: sqlite3.Connection) -> None:
+        while True:
+            ops = [self._writes.get()]
+            # commit whatever piled up in one transaction
+            while not self._writes.empty() and len(ops) < 512:
+                ops.append(self._writes.get_nowait())
+            flushed = []
+            try:
+                for op, key, payload, extra in ops:
+                    if op == "set":
+                        self._write(db, key, payload, extra)
+                    elif op == "touch":
+                        db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                    elif op == "clear":
+                        db.execute("DELETE FROM entries")
+                        self.bytes = 0
+                    elif op == "flush":
+                        flushed.append(extra)
+                self._evict(db)
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"Catalog store write failed: {e}", file=sys.stderr)
+                db.rollback()
+                self.bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            for done in flushed:
+                done.set()
+
+    def _write(self, db: sqlite3.Connection, key: str, payload: bytes, expires_at: Optional[float]) -> None:
+        old = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        db.execute(
+            "INSERT OR REPLACE INTO entries (key, payload, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, payload, len(payload), expires_at, time.time()),
+        )
+        self.bytes += len(payload) - (old[0] if old else 0)
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        while self.bytes > self.max_bytes:
+            rows = db.execute("SELECT key, size FROM entries ORDER BY accessed_at LIMIT 64").fetchall()
+            if not rows:
+                self.bytes = 0
+                return
+            db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+            self.bytes -= sum(size for _, size in rows)
+            self.evictions += len(rows)
+
+
+class TieredCache:
+    """
+    CacheBackend putting the CatalogStore behind an in-memory cache: misses for persisted
+    methods fall through to disk and are promoted back into memory, catalog writes go to both.
+
+    The store is only opened by the first persisted miss or write, so building one stays
+    cheap, and without a store it is just the memory cache.
+    """
+
+    def __init__(self, memory: CacheBackend, open_store: Callable[[], Optional[CatalogStore]]):
+        self.memory = memory
+        self._open_store = open_store
+        self._store = None
+
+    @property
+    def store(self) -> Optional[CatalogStore]:
+        if self._store is None:
+            self._store = self._open_store() or False
+        return self._store or None
+
+    def get(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is not MISSING or not self._persisted(key):
+            return value
+        return self._load(key)
+
+    async def aget(self, key: str) -> Any:
+        """get() for the event loop, opening the store and reading from disk run on a worker thread"""
+        value = self.memory.get(key)
+        if value is not MISSING or not self._persisted(key):
+            return value
+        return await asyncio.to_thread(self._load, key)
+
+    def _load(self, key: str) -> Any:
+        if self.store is None:
+            return MISSING
+        value, expires_in = self.store.lookup(key)
+        if value is not MISSING:
+            self.memory.set(key, value, expires_in or self.store.max_age)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.memory.set(key, value, ttl)
+        if self._persisted(key) and self.store is not None:
+            self.store.set(key, value, self.store.max_age)
+
+    def invalidate(self, prefix: str = "") -> None:
+        self.memory.invalidate(prefix)
+
+    def clear(self) -> None:
+        self.memory.clear()
+
+    def stats(self) -> dict:
+        # reporting shouldnt be what opens the store
+        store = self._store or None
+        return {**self.memory.stats(), **(store.stats() if store is not None else {})}
+
+    def _persisted(self, key: str) -> bool:
+        return key.split(":", 1)[0] in PERSISTED_METHODS
+
+
+def opened_store() -> Optional[CatalogStore]:
+    """the process wide store when something already opened it, for reporting"""
+    return _store or None
+
+
+def default_store() -> Optional[CatalogStore]:
+    """the process wide store, None when SPOTIFY_STORE_PATH is empty or the file cant be opened"""
+    global _store
+    with _store_lock:
+        if _store is None and STORE_PATH:
+            try:
+                _store = CatalogStore(STORE_PATH)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Catalog store disabled, cant open {STORE_PATH}: {e}", file=sys.stderr)
+                # dont try again for every new session
+                _store = False
+        return _store or None
@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from spotipy.cache_handler import CacheFileHandler
+from spotipy.oauth2 import SpotifyPKCE
+
+# where the token survives restarts, spotipy's default location
+TOKEN_CACHE_PATH = os.getenv("SPOTIFY_TOKEN_CACHE", ".cache")
+# refresh this many seconds before the token expires, spotify tokens live for an hour
+REFRESH_AHEAD = int(os.getenv("SPOTIFY_TOKEN_REFRESH_AHEAD", "300"))
+# how long the refresher waits before trying again after a failed refresh
+REFRESH_RETRY = 30
+
+
+class AtomicCacheFileHandler(CacheFileHandler):
+    """
+    CacheFileHandler that never leaves a half written token behind: the token goes
+    to a temp file next to the cache which then replaces it in one step
+    """
+
+    def save_token_to_cache(self, token_info):
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".token-", dir=directory)
+        except OSError as e:
+            print(f"Couldn't write token to cache at {self.cache_path}: {e}", file=sys.stderr)
+            return
+        try:
+            # mkstemp already creates the file readable by us only
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(token_info, f, cls=self.encoder_cls)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Couldn't write token to cache at {self.cache_path}: {e}", file=sys.stderr)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+class TokenManager(SpotifyPKCE):
+    """
+    SpotifyPKCE that keeps the token in memory and refreshes it before it expires.
+
+    Requests read the in-memory token without touching disk or taking a lock. Refreshes
+    go through one lock so concurrent callers never refresh twice, and start_refresher()
+    runs them on a background thread ahead of expiry, so tool calls don't wait on OAuth.
+    """
+
+    def __init__(self, *args, refresh_ahead=REFRESH_AHEAD, **kwargs):
+        kwargs.setdefault("cache_handler", AtomicCacheFileHandler(cache_path=TOKEN_CACHE_PATH))
+        super().__init__(*args, **kwargs)
+        self.refresh_ahead = refresh_ahead
+        self.refreshes = 0
+        self._token = None
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._refresher = None
+
+    def get_cached_token(self):
+        """the current token, loaded from the cache file the first time (so restarts reuse it)"""
+        if self._token is None:
+            token_info = self.cache_handler.get_cached_token()
+            # a token granted for fewer scopes than we ask for now is no good
+            if token_info and self._is_scope_subset(self.scope, token_info.get("scope")):
+                self._token = token_info
+        return self._token
+
+    @property
+    def token_info(self):
+        return self.get_cached_token()
+
+    def get_access_token(self, code=None, check_cache=True):
+        token_info = self._token
+        if check_cache and token_info and not self.is_token_expired(token_info):
+            return token_info["access_token"]
+
+        with self._refresh_lock:
+            # someone else may have refreshed while we were waiting for the lock
+            token_info = self.get_cached_token() if check_cache else None
+            if token_info and not self.is_token_expired(token_info):
+                return token_info["access_token"]
+            if token_info and token_info.get("refresh_token"):
+                return self._refresh(token_info)["access_token"]
+
+            # nothing usable cached, this is the interactive browser flow
+            access_token = super().get_access_token(code=code, check_cache=False)
+            self._token = self.cache_handler.get_cached_token()
+            return access_token
+
+    def refresh_access_token(self, refresh_token):
+        token_info = super().refresh_access_token(refresh_token)
+        self._token = token_info
+        self.refreshes += 1
+        return token_info
+
+    def refresh_if_expiring(self):
+        """refresh now if the token expires within refresh_ahead seconds"""
+        with self._refresh_lock:
+            token_info = self.get_cached_token()
+            if token_info and token_info.get("refresh_token") and self._expires_in(token_info) < self.refresh_ahead:
+                self._refresh(token_info)
+
+    def start_refresher(self):
+        """keep the token fresh from a daemon thread, safe to call more than once"""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._stopped.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="spotify-token-refresh", daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self):
+        self._stopped.set()
+
+    def _refresh(self, token_info):
+        return self.refresh_access_token(token_info["refresh_token"])
+
+    def _expires_in(self, token_info):
+        return token_info["expires_at"] - time.time()
+
+    def _refresh_loop(self):
+        while not self._stopped.is_set():
+            token_info = self.get_cached_token()
+            if token_info:
+                wait = max(self._expires_in(token_info) - self.refresh_ahead, 1)
+            else:
+                wait = REFRESH_RETRY
+            if self._stopped.wait(wait):
+                return
+            try:
+                self.refresh_if_expiring()
+            except Exception as e:
+                # a request finding the token expired will still refresh it itself
+                print(f"Background token refresh failed: {e}", file=sys.stderr)
+                self._stopped.wait(REFRESH_RETRY)
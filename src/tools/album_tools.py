@@ -1,10 +1,114 @@
 from mcp.server.fastmcp import FastMCP
-from ..auth import spotify_auth
+from ..sessions import current_auth
+from ..catalog import fetch_several, spotify_id
+from ..fanout import fan_out
+from ..pagination import fetch_all
+from .. import views
+from typing import List, TypedDict, Union
+
+
+class ArtistAlbums(TypedDict):
+    artist: str
+    total: int
+    offset: int
+    albums: List[views.Album]
+
+
+def render_album(album: views.AlbumDetails) -> str:
+    lines = [
+        "Spotify album: ",
+        f"Album Name: {album["name"]}, Release Date: {album["release_date"]}",
+        f"Album URI: {album["uri"]}, Album ID: {album["id"]}",
+        f"Artists: {", ".join(album["artists"])}",
+        "",
+        "Tracks: ",
+    ]
+    for i, track in enumerate(album["tracks"], 1):
+        lines.append(f"{i}. Track: {track["name"]}, Artists: {", ".join(track["artists"])}, ID: '{track["id"]}', URI: '{track["uri"]}'.")
+    return "\n".join(lines) + "\n"
+
+
+def render_artist(artist: views.Artist) -> str:
+    return (f"Artist Name: {artist["name"]}, Followers: {artist["followers"]:,}.\n"
+            f"Popularity: {artist["popularity"]}\n"
+            f"URI: {artist["uri"]}")
+
+
+def render_artist_albums(data: ArtistAlbums) -> str:
+    albums = data["albums"]
+    artist_name = data["artist"]
+    parts = [f"Albums by {artist_name} (showing {len(albums)} of {data["total"]} total):\n\n"]
+    for i, album in enumerate(albums, 1):
+        other_artists = [name for name in album["artists"] if name != artist_name]
+        collab_text = f" (with {', '.join(other_artists)})" if other_artists else ""
+        parts.append(f"{i}. {album['name']}, {collab_text}\n"
+                     f"Type: {album['album_type'].capitalize()} | Release: {album['release_date']} | Tracks: {album['total_tracks']}\n"
+                     f"URI: '{album['uri']}' | ID: '{album['id']}'\n\n")
+    remaining = data["total"] - len(albums) - data["offset"]
+    if remaining > 0:
+        parts.append(f"... and {remaining} more albums (use offset parameter to see more)")
+    return "".join(parts)
+
+
+class Albums(TypedDict):
+    albums: List[views.Album]
+    not_found: List[str]
+
+
+class Artists(TypedDict):
+    artists: List[views.Artist]
+    not_found: List[str]
+
+
+class Tracks(TypedDict):
+    tracks: List[views.TopTrack]
+    not_found: List[str]
+
+
+def render_not_found(parts: List[str], not_found: List[str]) -> str:
+    if not_found:
+        parts.append(f"Not found: {", ".join(not_found)}\n")
+    return "".join(parts)
+
+
+def render_albums(data: Albums) -> str:
+    parts = [f"{i}. {album["name"]} by {", ".join(album["artists"])}, Type: {album["album_type"]}, "
+             f"Release: {album["release_date"]}, Tracks: {album["total_tracks"]}, URI: '{album["uri"]}'\n"
+             for i, album in enumerate(data["albums"], 1)]
+    return render_not_found(parts, data["not_found"])
+
+
+def render_artists(data: Artists) -> str:
+    parts = [f"{i}. {artist["name"]}, Followers: {artist["followers"]:,}, Popularity: {artist["popularity"]}, "
+             f"Genres: {", ".join(artist["genres"][:3]) or "No genres"}, URI: '{artist["uri"]}'\n"
+             for i, artist in enumerate(data["artists"], 1)]
+    return render_not_found(parts, data["not_found"])
+
+
+def render_tracks(data: Tracks) -> str:
+    parts = [f"{i}. Track: {track["name"]}, Artists: {", ".join(track["artists"])}, Album: {track["album"]}, "
+             f"Popularity: {track["popularity"]}, URI: '{track["uri"]}'\n"
+             for i, track in enumerate(data["tracks"], 1)]
+    return render_not_found(parts, data["not_found"])
+
+
+async def several(client, kind: str, ids: List[str], view) -> dict:
+    items = await fetch_several(client, kind, ids)
+    return {
+        f"{kind}s": [view(item) for item in items if item],
+        "not_found": [value for value, item in zip(ids, items) if not item],
+    }
+
+
+def render_top_tracks(tracks: List[views.Track]) -> str:
+    return "".join(f"{i}. Track: {track["name"]}, Artist: {", ".join(track["artists"])}, URI: '{track["uri"]}'.\n"
+                   for i, track in enumerate(tracks, 1))
+
 
 def add_album_tools(mcp: FastMCP):
 
     @mcp.tool()
-    async def get_album(album_id: str, market: str = None) -> str:
+    async def get_album(album_id: str, market: str = None) -> Union[str, views.AlbumDetails]:
         """
         Gets album details (Name, Tracks(name, URI and ID), Artists and Release date) by album ID
 
@@ -12,58 +116,46 @@ def add_album_tools(mcp: FastMCP):
             album_id: the album ID, URI or URL
             market: an ISO 3166-1 alpha-2 country code (default: None)
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try: 
-            album = client.album(album_id, market)
-            result = "Spotify album: \n"
-            if album:
-                result += f"Album Name: {album["name"]}, Release Date: {album["release_date"]}\n"
-                artists = ", ".join([artist["name"] for artist in album["artists"]])
-                result += f"Album URI: {album["uri"]}, Album ID: {album["id"]}\n"
-                result += f"Artists: {artists}\n\n"
-                tracks = album["tracks"]
-                result += "Tracks: \n"
-                for i, track in enumerate(tracks["items"], 1):
-                    artists = ", ".join([artist["name"] for artist in track["artists"]])
-                    result += f"{i}. Track: {track["name"]}, Artists: {artists}, ID: '{track["id"]}', URI: '{track["uri"]}'.\n"
+            if market:
+                album = await client.album(album_id, market)
             else:
-                result += "No album with given ID exists."
-            
-            return result
+                # bare id, so get_album and get_albums share their cache entries
+                album = await client.album(spotify_id("album", album_id))
+            if not album:
+                return "Spotify album: \nNo album with given ID exists."
+
+            data = {**views.album(album), "tracks": [views.album_track(track) for track in album["tracks"]["items"]]}
+            return views.respond(data, render_album)
         except Exception as e:
             return f"Error fetching album: {e}"
         
     @mcp.tool()
-    async def get_artist(artist_id: str) -> str:
+    async def get_artist(artist_id: str) -> Union[str, views.Artist]:
         """
         returns a single artist details given the artist's ID, URI or URL
 
         Args:
             artist_id: an artist ID, URI or URL
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            artist = client.artist(artist_id)
-            result = "" 
-            if artist:
-                result += f"Artist Name: {artist["name"]}, Followers: {artist["followers"]["total"]:,}.\n"
-                result += f"Popularity: {artist["popularity"]}\n"
-                result += f"URI: {artist["uri"]}"
-            else:
-                result += "No artist found for this ID"
-
-            return result
+            artist = await client.artist(spotify_id("artist", artist_id))
+            if not artist:
+                return "No artist found for this ID"
+            return views.respond(views.artist(artist), render_artist)
         except Exception as e:
             return f"Error getting artist: {e}"
         
     @mcp.tool()
-    async def get_artist_albums(artist_id: str, include_groups: str = "album", country: str = None, limit: int = 20, offset: int = 0) -> str:
+    async def get_artist_albums(artist_id: str, include_groups: str = "album", country: str = None, limit: int = 20, offset: int = 0) -> Union[str, ArtistAlbums]:
         """
         Get an artist's albums
 
@@ -71,53 +163,44 @@ def add_album_tools(mcp: FastMCP):
             artist_id: the artist ID, URI or URL
             include_groups: types of items to return - 'album', 'single', 'appears_on', 'compilation' or combinations like 'album,single' (default: 'album')
             country: limit response to one particular country (ISO 3166-1 alpha-2 code) (default: None)
-            limit: number of albums to return (default: 20, max: 50)
+            limit: number of albums to return (default: 20), use 0 to get all of them
             offset: index of the first album to return (default: 0)
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            artist = client.artist(artist_id)
-            artist_name = artist['name']
-            
-            albums = client.artist_albums(
-                artist_id, 
-                album_type=None,  # deprecated
-                include_groups=include_groups,
-                country=country,
-                limit=limit,
-                offset=offset
+            # one id for both calls, so they share cache and in-flight entries with get_artist
+            artist_id = spotify_id("artist", artist_id)
+            artist, (albums, total) = await fan_out(
+                client.artist(artist_id),
+                fetch_all(
+                    lambda size, page_offset: client.artist_albums(
+                        artist_id, 
+                        album_type=None,  # deprecated
+                        include_groups=include_groups,
+                        country=country,
+                        limit=size,
+                        offset=page_offset
+                    ),
+                    page_size=50,
+                    offset=offset,
+                    limit=limit or None
+                )
             )
+            artist_name = artist['name']
             
-            if not albums['items']:
+            if not albums:
                 return f"No albums found for artist '{artist_name}' with the specified criteria."
             
-            result = f"Albums by {artist_name} (showing {len(albums['items'])} of {albums['total']} total):\n\n"
-            
-            for i, album in enumerate(albums['items'], 1):
-                album_type = album['album_type'].capitalize()
-                release_date = album.get('release_date', 'Unknown')
-                total_tracks = album.get('total_tracks', 0)
-                
-                other_artists = [artist['name'] for artist in album['artists'] if artist['name'] != artist_name]
-                collab_text = f" (with {', '.join(other_artists)})" if other_artists else ""
-                
-                result += f"{i}. {album['name']}, {collab_text}\n"
-                result += f"Type: {album_type} | Release: {release_date} | Tracks: {total_tracks}\n"
-                result += f"URI: '{album['uri']}' | ID: '{album['id']}'\n\n"
-            
-            if albums['total'] > len(albums['items']) + offset:
-                remaining = albums['total'] - len(albums['items']) - offset
-                result += f"... and {remaining} more albums (use offset parameter to see more)"
-            
-            return result    
+            data = {"artist": artist_name, "total": total, "offset": offset, "albums": [views.album(album) for album in albums]}
+            return views.respond(data, render_artist_albums)
         except Exception as e:
             return f"Error getting artist albums: {e}"
         
     @mcp.tool()
-    async def get_artist_top_tracks(artist_id: str, country: str = None) -> str:
+    async def get_artist_top_tracks(artist_id: str, country: str = None) -> Union[str, List[views.Track]]:
         """
         Get the top tracks of a artist.
 
@@ -125,23 +208,69 @@ def add_album_tools(mcp: FastMCP):
             artist_id: the artist ID, URI or URL
             country: limit the response to one particular country (Default = None) (ISO 3166-1 alpha-2 code)
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            tracks = client.artist_top_tracks(artist_id, country)
-            result = ""
+            # the same id as get_artist and the follow graph use, so they share cache entries
+            tracks = await client.artist_top_tracks(spotify_id("artist", artist_id), country)
             if not tracks["tracks"]:
                 return "Artist does not have any tracks"
-            
-            for i, track in enumerate(tracks["tracks"][:20], 1):
-                artists = ", ".join([artist["name"] for artist in track["artists"]])
-                result += f"{i}. Track: {track["name"]}, Artist: {artists}, URI: '{track["uri"]}'.\n"
-
-            return result
+            return views.respond([views.track(track) for track in tracks["tracks"][:20]], render_top_tracks)
         except Exception as e:
             return f"Error getting artist's top tracks: {e}"
+
+    @mcp.tool()
+    async def get_albums(album_ids: List[str]) -> Union[str, Albums]:
+        """
+        Gets several albums (name, artists, type, release date, track count and URI) in one call
+
+        Args:
+            album_ids: list of album IDs, URIs or URLs, any number of them
+        """
+        client = await current_auth().get_async_client()
+        if not client:
+            return "error with user authentication"
+
+        try:
+            return views.respond(await several(client, "album", album_ids, views.album), render_albums)
+        except Exception as e:
+            return f"Error getting albums: {e}"
+
+    @mcp.tool()
+    async def get_artists(artist_ids: List[str]) -> Union[str, Artists]:
+        """
+        Gets several artists (name, followers, popularity, genres and URI) in one call
+
+        Args:
+            artist_ids: list of artist IDs, URIs or URLs, any number of them
+        """
+        client = await current_auth().get_async_client()
+        if not client:
+            return "error with user authentication"
+
+        try:
+            return views.respond(await several(client, "artist", artist_ids, views.artist), render_artists)
+        except Exception as e:
+            return f"Error getting artists: {e}"
+
+    @mcp.tool()
+    async def get_tracks(track_ids: List[str]) -> Union[str, Tracks]:
+        """
+        Gets several tracks (name, artists, album, popularity and URI) in one call
+
+        Args:
+            track_ids: list of track IDs, URIs or URLs, any number of them
+        """
+        client = await current_auth().get_async_client()
+        if not client:
+            return "error with user authentication"
+
+        try:
+            return views.respond(await several(client, "track", track_ids, views.top_track), render_tracks)
+        except Exception as e:
+            return f"Error getting tracks: {e}"
         
 
             
@@ -0,0 +1,91 @@
+from mcp.server.fastmcp import FastMCP
+from ..sessions import current_auth
+from .. import views
+from typing import List, Literal, TypedDict, Union
+
+
+class PlaylistRef(TypedDict):
+    name: str
+    id: str
+
+
+class LibraryTrack(TypedDict):
+    name: str
+    artists: List[str]
+    album: str
+    uri: str
+    playlists: List[PlaylistRef]
+
+
+class LibraryArtist(TypedDict):
+    name: str
+    uri: str
+    tracks: int
+    playlists: List[PlaylistRef]
+
+
+class LibraryResults(TypedDict):
+    query: str
+    tracks: List[LibraryTrack]
+    artists: List[LibraryArtist]
+    playlists: List[PlaylistRef]
+
+
+def playlist_names(playlists: List[PlaylistRef], limit: int = 5) -> str:
+    names = ", ".join(f"{p["name"]} ('{p["id"]}')" for p in playlists[:limit])
+    if len(playlists) > limit:
+        names += f" and {len(playlists) - limit} more"
+    return names
+
+
+def render_library(data: LibraryResults) -> str:
+    parts = [f"Results for '{data["query"]}' in your library:\n\n"]
+    if data["artists"]:
+        parts.append("ARTISTS:\n")
+        for i, artist in enumerate(data["artists"], 1):
+            parts.append(f"{i}. {artist["name"]}, {artist["tracks"]} tracks, URI: '{artist["uri"]}'\n"
+                         f"In: {playlist_names(artist["playlists"])}\n")
+        parts.append("\n")
+    if data["tracks"]:
+        parts.append("TRACKS:\n")
+        for i, track in enumerate(data["tracks"], 1):
+            parts.append(f"{i}. Track: {track["name"]}, Artists: {", ".join(track["artists"])}, Album: {track["album"]}, "
+                         f"URI: '{track["uri"]}'\nIn: {playlist_names(track["playlists"])}\n")
+        parts.append("\n")
+    if data["playlists"]:
+        parts.append("PLAYLISTS:\n")
+        parts.extend(f"{i}. {p["name"]}, ID: '{p["id"]}'\n" for i, p in enumerate(data["playlists"], 1))
+    return "".join(parts)
+
+
+def add_library_tools(mcp: FastMCP):
+
+    @mcp.tool()
+    async def search_library(query: str, search_type: Literal["track", "artist", "playlist", "all"] = "all", limit: int = 20) -> Union[str, LibraryResults]:
+        """
+        Search the user's own library (all their playlists and liked songs) for tracks, artists or playlists,
+        and see which playlists contain them. e.g. "which of my playlists have Radiohead".
+        The first call downloads the library, later ones answer from memory.
+
+        Args:
+            query: words to look for in track, artist, album or playlist names (word beginnings match too)
+            search_type: What to search for - track, artist, playlist or all (default = all)
+            limit: maximum number of results per type (default = 20)
+        """
+        auth = current_auth()
+        client = await auth.get_async_client()
+        if not client:
+            return "error with user authentication"
+
+        try:
+            found = await auth.library_index.search(client, query, auth.store)
+            data = {"query": query}
+            for result_type in ("track", "artist", "playlist"):
+                wanted = search_type in ("all", result_type)
+                data[f"{result_type}s"] = found[f"{result_type}s"][:limit] if wanted else []
+
+            if not (data["tracks"] or data["artists"] or data["playlists"]):
+                return f"Nothing in your library matches '{query}'"
+            return views.respond(data, render_library)
+        except Exception as e:
+            return f"Error searching library: {e}"
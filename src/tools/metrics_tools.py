@@ -0,0 +1,42 @@
+from collections import Counter
+from typing import Iterable, List
+from mcp.server.fastmcp import FastMCP
+from ..auth import spotify_auth
+from ..metrics import registry
+from ..sessions import session_pool
+from ..store import opened_store
+
+
+def gauges(name: str, stats: dict) -> List[str]:
+    return [f"# TYPE {name} gauge\n"] + [f'{name}{{stat="{stat}"}} {value}\n' for stat, value in stats.items()]
+
+
+def totals(stats: Iterable[dict]) -> dict:
+    combined = Counter()
+    for entry in stats:
+        combined.update(entry)
+    return dict(combined)
+
+
+def add_metrics_tools(mcp: FastMCP):
+
+    @mcp.resource("metrics://spotify", mime_type="text/plain")
+    def server_metrics() -> str:
+        """
+        Per tool latency histograms, upstream call counts, retries, 429s, cache hits and
+        payload bytes in prometheus text format.
+        """
+        # the stdio account and every pooled http session, caches and players summed up
+        auths = [spotify_auth] + session_pool.auths()
+        caches = [auth.cache.memory for auth in auths if auth.cache is not None]
+        parts = [registry.prometheus()]
+
+        if caches:
+            # the catalog store is shared, counted once
+            store = opened_store()
+            parts += gauges("spotify_cache", {**totals(cache.stats() for cache in caches),
+                                              **(store.stats() if store is not None else {})})
+        parts += gauges("spotify_scheduler", spotify_auth.scheduler.stats())
+        parts += gauges("spotify_player", totals(auth.player.stats() for auth in auths))
+        parts += gauges("spotify_http_sessions", session_pool.stats())
+        return "".join(parts)
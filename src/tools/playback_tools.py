@@ -1,36 +1,101 @@
-from mcp.server.fastmcp import FastMCP
-from ..auth import spotify_auth
-from typing import List
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.server.lowlevel.server import request_ctx
+from ..bulk import progress_reporter, queue_items
+from ..catalog import context_uris
+from ..macros import PlaybackMacro, PlaybackStep, StepResult
+from ..player_state import STATE_METHODS, resource_uri
+from ..sessions import current_auth
+from .. import views
+from typing import List, Literal, Optional, TypedDict, Union
+
+
+class QueuedItem(TypedDict):
+    uri: str
+    status: Literal["queued", "failed", "skipped"]
+    error: Optional[str]
+
+
+class QueueLoad(TypedDict):
+    queued: int
+    total: int
+    items: List[QueuedItem]
+
+
+def render_playback(playback: views.Playback) -> str:
+    parts = []
+    if playback["device_active"]:
+        parts.append(f"Current active device ID: '{playback["device_id"]}'\n")
+    elif playback["device_id"]:
+        parts.append("No active device")
+    track = playback["item"]
+    if track:
+        parts.append(f"Current playback item: {track["name"]}, Artists: {", ".join(track["artists"])}.\n")
+    else:
+        parts.append("No item in playback currently")
+    return "".join(parts)
+
+
+def render_queue(queue: views.Queue) -> str:
+    parts = ["Current queue: \n\n"]
+    track = queue["now_playing"]
+    if track:
+        parts.append(f"Now playing: {track["name"]}, Artists: {", ".join(track["artists"])}, URI: '{track["uri"]}'.\n\n")
+    if queue["queue"]:
+        parts.append("UP NEXT: \n")
+        for i, track in enumerate(queue["queue"], 1):
+            parts.append(f"{i}. Track: {track["name"]}, Artists: {", ".join(track["artists"])}, URI: '{track["uri"]}'.\n")
+    else:
+        parts.append("Queue is empty")
+    return "".join(parts)
+
+
+def render_devices(devices: List[views.Device]) -> str:
+    parts = ["DEVICES:\n\n"]
+    for i, device in enumerate(devices, 1):
+        parts.append(f"{i}. Device name: {device["name"]}, Type: {device["type"]}\n"
+                     f"Device ID: '{device["id"]}'\n"
+                     f"is the device active: {device["is_active"]}, device volume: {device["volume_percent"]}\n---\n")
+    return "".join(parts)
+
+
+def render_queue_load(load: QueueLoad) -> str:
+    parts = [f"Added {load["queued"]} of {load["total"]} items to the queue, in order"]
+    problems = [(i, item) for i, item in enumerate(load["items"], 1) if item["status"] != "queued"]
+    parts.append(":\n" if problems else ".")
+    for i, item in problems:
+        parts.append(f"{i}. '{item["uri"]}' {item["status"]}: {item["error"]}\n")
+    return "".join(parts)
+
+
+def render_steps(results: List[StepResult]) -> str:
+    parts = [f"Ran {len(results)} playback steps:\n"]
+    for result in results:
+        outcome = result["detail"] if result["status"] == "ok" else f"{result["status"].upper()}, {result["detail"]}"
+        parts.append(f"{result["step"]}. {result["action"]}: {outcome}\n")
+    return "".join(parts)
+
 
 def add_playback_tools(mcp: FastMCP):
 
     @mcp.tool()
-    async def get_current_playback() -> str:
+    async def get_current_playback() -> Union[str, views.Playback]:
         """
         Get current users active device ID and currently playing song.
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "Error with user authentication"
         
         try:
-            playback = client.current_playback()
-            result = ""
-            if playback.get("device"):
-                if playback["device"]["is_active"]:
-                    device_id = playback["device"]["id"]
-                    result += f"Current active device ID: '{device_id}'\n"
-                else:
-                    result += "No active device"
-
-            if playback.get("item"):
-                track = playback["item"]
-                artists = ", ".join([artist["name"] for artist in track["artists"]])
-                result += f"Current playback item: {track["name"]}, Artists: {artists}.\n"
-            else:
-                result += "No item in playback currently"
-            
-            return result
+            playback = await auth.player.get(client, "playback")
+            device = playback.get("device")
+            data = {
+                "device_id": device["id"] if device else None,
+                "device_active": bool(device and device["is_active"]),
+                "item": views.track(playback["item"]) if playback.get("item") else None,
+            }
+            return views.respond(data, render_playback)
         except Exception as e:
             return f"Error in fetching current playback: {e}"
                 
@@ -42,12 +107,14 @@ def add_playback_tools(mcp: FastMCP):
         Args:
             device_id: target device id for playback (default: None), if set to None, it will pause playback on the currently active device
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            response = client.pause_playback(device_id)
+            response = await client.pause_playback(device_id)
+            auth.player.invalidate("playback")
             return "Paused the playback on device"
         except Exception as e:
             return f"Error with pausing playback: {e}"
@@ -60,12 +127,14 @@ def add_playback_tools(mcp: FastMCP):
         Args:
             device_id: target device id for playback (default: None), if set to None, it will pause playback on the currently active device
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            response = client.next_track(device_id)
+            response = await client.next_track(device_id)
+            auth.player.invalidate("playback", "queue")
             return "Skipped to next track"
         except Exception as e:
             return f"Error with skipping to next track: {e}"
@@ -78,42 +147,35 @@ def add_playback_tools(mcp: FastMCP):
         Args:
             device_id: target device id for playback (default: None), if set to None, it will pause playback on the currently active device
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            response = client.previous_track(device_id)
+            response = await client.previous_track(device_id)
+            auth.player.invalidate("playback", "queue")
             return "Moved to previous track"
         except Exception as e:
             return f"Error with moving to previous track: {e}"
         
     @mcp.tool()
-    async def get_queue() -> str:
+    async def get_queue() -> Union[str, views.Queue]:
         """
         Gets the current user's queue
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            queue = client.queue()
-            result = "Current queue: \n\n"
-            if queue.get("currently_playing"):
-                track = queue["currently_playing"]
-                artists = ", ".join([artist["name"] for artist in track["artists"]])
-                result += f"Now playing: {track["name"]}, Artists: {artists}, URI: '{track["uri"]}'.\n\n"
-
-            if queue.get("queue"):
-                result += "UP NEXT: \n"
-                for i, track in enumerate(queue["queue"][:50], 1):
-                    artists = ", ".join([artist["name"] for artist in track["artists"]])
-                    result += f"{i}. Track: {track["name"]}, Artists: {artists}, URI: '{track["uri"]}'.\n"
-            else:
-                result += "Queue is empty"
-
-            return result
+            queue = await auth.player.get(client, "queue")
+            data = {
+                "now_playing": views.track(queue["currently_playing"]) if queue.get("currently_playing") else None,
+                "queue": [views.track(track) for track in (queue.get("queue") or [])[:50]],
+            }
+            return views.respond(data, render_queue)
         except Exception as e:
             return f"Error with getting queue: {e}"
         
@@ -129,7 +191,8 @@ def add_playback_tools(mcp: FastMCP):
             uris: list of spotify track URIs to play (optional)
             offset: indicates from where in the context playback should start (optional)
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "error with user authentication"
         
@@ -144,7 +207,8 @@ def add_playback_tools(mcp: FastMCP):
             if offset:
                 kwargs['offset'] = offset
             
-            response = client.start_playback(**kwargs)
+            response = await client.start_playback(**kwargs)
+            auth.player.invalidate("playback", "queue")
 
             if context_uri:
                 return f"started playback from context: {context_uri}"
@@ -164,12 +228,14 @@ def add_playback_tools(mcp: FastMCP):
         Args:
             device_id: target device id for playback (default: None), if set to None, it will pause playback on the currently active device
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            response = client.start_playback(device_id=device_id)
+            response = await client.start_playback(device_id=device_id)
+            auth.player.invalidate("playback")
             return "Resumed playback"
         except Exception as e:
             return f"Error with resuming playback: {e}"
@@ -183,37 +249,74 @@ def add_playback_tools(mcp: FastMCP):
             uri: song uri, id, or url
             device_id: target device id for playback (default: None), if set to None, it will pause playback on the currently active device
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            response = client.add_to_queue(uri=uri, device_id=device_id)
+            response = await client.add_to_queue(uri=uri, device_id=device_id)
+            auth.player.invalidate("queue")
             return "Song added to queue"
         except Exception as e:
             return f"Error in adding song to queue: {e}"
         
     @mcp.tool()
-    async def get_user_devices() -> str:
+    async def add_many_to_queue(uris: List[str] = None, context_uri: str = None, device_id: str = None,
+                                limit: int = 50, ctx: Context = None) -> Union[str, QueueLoad]:
+        """
+        Add many songs to the queue of the user in one call, in the given order: a list of songs,
+        or every track of an album or playlist (an artist queues their top tracks).
+
+        Args:
+            uris: list of song uris, ids, or urls (optional)
+            context_uri: album, playlist or artist URI or URL whose tracks are queued after the uris (optional)
+            device_id: target device id for playback (default: None), if set to None, it will add to the queue of the currently active device
+            limit: maximum number of tracks taken from context_uri (default = 50)
+        """
+        auth = current_auth()
+        client = await auth.get_async_client()
+        if not client:
+            return "error with user authentication"
+        if not uris and not context_uri:
+            return "Give the uris or the context_uri to queue"
+
+        async def batches():
+            if uris:
+                yield uris
+            if context_uri:
+                async for batch in context_uris(client, context_uri, auth.store, limit or None):
+                    yield batch
+
+        try:
+            outcomes = await queue_items(client, batches(), device_id, progress_reporter(ctx))
+            data = {
+                "queued": sum(outcome["status"] == "queued" for outcome in outcomes),
+                "total": len(outcomes),
+                "items": outcomes,
+            }
+            return views.respond(data, render_queue_load)
+        except Exception as e:
+            return f"Error in adding songs to queue: {e}"
+        finally:
+            auth.player.invalidate("queue")
+
+    @mcp.tool()
+    async def get_user_devices() -> Union[str, List[views.Device]]:
         """
         Get information about user's all available devices (device name, device ID, device volume, etc)
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            devices = client.devices()
+            devices = await auth.player.get(client, "devices")
             if not devices.get("devices"):
                 return "No devices available"
             
-            result = "DEVICES:\n\n"
-            for i, device in enumerate(devices["devices"], 1):
-                result += f"{i}. Device name: {device["name"]}, Type: {device["type"]}\n"
-                result += f"Device ID: '{device["id"]}'\n"
-                result += f"is the device active: {device["is_active"]}, device volume: {device["volume_percent"]}\n---\n"
-
-            return result
+            return views.respond([views.device(device) for device in devices["devices"]], render_devices)
         except Exception as e:
             return f"Error: {e}"
         
@@ -226,12 +329,14 @@ def add_playback_tools(mcp: FastMCP):
             device_id: the device ID you want to transfer playback to
             force_play: true: after transfer, play. false: keep current state. (default = true)
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            response = client.transfer_playback(device_id=device_id, force_play=force_play)
+            response = await client.transfer_playback(device_id=device_id, force_play=force_play)
+            auth.player.invalidate("playback", "devices")
             return "Successfully transfered the playback to the desired device"
         except Exception as e:
             return f"Error transfering playback to device: {e}"
@@ -246,14 +351,99 @@ def add_playback_tools(mcp: FastMCP):
             volume_percent: volume between 0 and 100
             device_id: target device id for setting/changing volume (default = None)
         """
-        client = spotify_auth.get_client()
+        auth = current_auth()
+        client = await auth.get_async_client()
         if not client:
             return "error with user authentication"
         
         try: 
-            response = client.volume(volume_percent=volume_percent, device_id=device_id)
+            response = await client.volume(volume_percent=volume_percent, device_id=device_id)
+            auth.player.invalidate("playback", "devices")
             return "Successfully changed/set volume in the given target device"
         except Exception as e:
             return f"Error setting/changing device volume: {e}"
-    
-        
\ No newline at end of file
+
+    @mcp.tool()
+    async def run_playback_steps(steps: List[PlaybackStep]) -> Union[str, List[StepResult]]:
+        """
+        Run several playback steps in one call instead of one tool call each, e.g. "play X on the
+        kitchen speaker at 40%" is [{"action": "play", "query": "X", "device": "kitchen"},
+        {"action": "volume", "volume_percent": 40, "device": "kitchen"}].
+        Searches and device lookups happen at the same time, steps run in the given order
+        where it matters and together where it doesnt. Returns the outcome of every step.
+
+        Args:
+            steps: ordered list of steps, each with an action and its arguments:
+                action: play, resume, pause, next, previous, queue, transfer, volume, shuffle or repeat
+                query: what to play or queue, the first search result is used (play/queue)
+                search_type: track, album, artist or playlist to search for (default = track)
+                uri: spotify URI, URL or track id to play or queue instead of a query
+                device: device name or ID the step targets (default: the active device)
+                volume_percent: volume between 0 and 100 (volume)
+                force_play: start playing after a transfer (default = true)
+                shuffle: true or false (shuffle, default = true)
+                repeat: track, context or off (repeat, default = context)
+        """
+        auth = current_auth()
+        client = await auth.get_async_client()
+        if not client:
+            return "error with user authentication"
+
+        try:
+            results = await PlaybackMacro(client, auth.player, steps).run()
+            return views.respond(results, render_steps)
+        except Exception as e:
+            return f"Error running playback steps: {e}"
+
+    # the same state as resources, clients subscribed to them hear about track, play/pause,
+    # device and volume changes from the player poller instead of polling themselves
+
+    @mcp.resource(resource_uri("playback"), mime_type="application/json")
+    async def playback_resource() -> dict:
+        """the raw spotify player state of the current user"""
+        auth = current_auth()
+        client = await auth.get_async_client()
+        return await auth.player.get(client, "playback") if client else None
+
+    @mcp.resource(resource_uri("queue"), mime_type="application/json")
+    async def queue_resource() -> dict:
+        """the raw spotify queue of the current user"""
+        auth = current_auth()
+        client = await auth.get_async_client()
+        return await auth.player.get(client, "queue") if client else None
+
+    @mcp.resource(resource_uri("devices"), mime_type="application/json")
+    async def devices_resource() -> dict:
+        """the raw spotify device list of the current user"""
+        auth = current_auth()
+        client = await auth.get_async_client()
+        return await auth.player.get(client, "devices") if client else None
+
+    server = mcp._mcp_server
+    kinds = {resource_uri(kind): kind for kind in STATE_METHODS}
+
+    @server.subscribe_resource()
+    async def subscribe(uri) -> None:
+        kind = kinds.get(str(uri))
+        if kind is None:
+            return
+        auth = current_auth()
+        session = request_ctx.get().session
+        player = auth.player
+
+        async def notify(changed) -> None:
+            for kind in changed:
+                for subscriber in list(player.subscribers[kind]):
+                    try:
+                        await subscriber.send_resource_updated(resource_uri(kind))
+                    except Exception:
+                        # the client went away without unsubscribing
+                        player.unsubscribe(subscriber)
+
+        player.subscribe(kind, session, auth.get_async_client, notify)
+
+    @server.unsubscribe_resource()
+    async def unsubscribe(uri) -> None:
+        kind = kinds.get(str(uri))
+        if kind is not None:
+            current_auth().player.unsubscribe(request_ctx.get().session, [kind])
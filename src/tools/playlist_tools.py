@@ -1,91 +1,155 @@
-from mcp.server.fastmcp import FastMCP
-from ..auth import spotify_auth
-from typing import List
+from mcp.server.fastmcp import Context, FastMCP
+from ..sessions import current_auth
+from ..bulk import add_items, progress_reporter, remove_items
+from ..catalog import playlist_with_items
+from ..pagination import fetch_all
+from ..playlist_sync import sync_playlist
+from .. import views
+from typing import List, Optional, TypedDict, Union
+
+
+class PlaylistPage(TypedDict):
+    total: int
+    playlists: List[views.Playlist]
+
+
+class PlaylistMatch(TypedDict):
+    name: str
+    id: str
+
+
+def render_user_playlists(data: PlaylistPage) -> str:
+    parts = [f"Found total of {data["total"]} playlists. \n\n"]
+    for playlist in data["playlists"]:
+        parts.append(f"Playlist Name: {playlist["name"]}, Total tracks in this playlist: {playlist["total_tracks"]} tracks.\n"
+                     f"ID of the playlist: '{playlist["id"]}'\n---\n")
+    return "".join(parts)
+
+
+def render_playlist_matches(playlists: List[PlaylistMatch]) -> str:
+    return "".join(f"found playlist: {playlist["name"]} with ID: `{playlist["id"]}`\n" for playlist in playlists)
+
+
+def render_playlist_tracks(data: views.PlaylistTracks) -> str:
+    parts = [f"Playlist name: {data["name"]}\n",
+             f"Playlist description: {data["description"]}\n---\n",
+             "Playlist Tracks:\n---\n"]
+    for i, track in enumerate(data["tracks"], 1):
+        parts.append(f"{i}. Track: {track["name"]}, Artists: {", ".join(track["artists"])}, Track URI: '{track["uri"]}'.\n")
+    return "".join(parts)
+
+
+def render_playlists(playlists: List[views.Playlist]) -> str:
+    return "".join(f"{i}. Playlist Name: {playlist["name"]}, Playlist Description: {playlist["description"]}, Playlist ID: '{playlist["id"]}'.\n"
+                   for i, playlist in enumerate(playlists, 1))
+
+
+class PlaylistSync(TypedDict):
+    snapshot_id: str
+    unchanged: bool
+    removed: int
+    moved: int
+    added: int
+    requests: int
+    kept: int
+    replaced: bool
+    error: Optional[str]
+
+
+def render_playlist_sync(data: PlaylistSync, dry_run: bool = False) -> str:
+    if data["unchanged"]:
+        return f"Playlist already matches, nothing to change. Playlist snapshot id: {data["snapshot_id"]}"
+    changes = f"{data["removed"]} removed, {data["moved"]} moved and {data["added"]} added in {data["requests"]} requests"
+    if data["kept"]:
+        changes += f", {data["kept"]} unavailable or local items kept at the end"
+    if data["replaced"]:
+        changes += " (rewritten as a whole, cheaper than moving tracks one by one)"
+    if dry_run:
+        return f"Syncing would change the playlist with {changes}. Playlist snapshot id: {data["snapshot_id"]}"
+    if data["error"]:
+        return (f"Error syncing playlist, {data["error"]}. Planned {changes}, "
+                f"the playlist is partly synced, run the sync again to finish. Playlist snapshot id: {data["snapshot_id"]}")
+    return f"Successfully synced playlist: {changes}. Playlist snapshot id: {data["snapshot_id"]}"
+
 
 def add_playlist_tools(mcp: FastMCP):
 
     @mcp.tool()
-    async def get_user_playlist(limit: int = 20) -> str:
+    async def get_user_playlist(limit: int = 20) -> Union[str, PlaylistPage]:
         """
         Get current user's followed and owned spotify playlist
 
         Args:
-            limit: Number of playlists to retrive (default = 20)
+            limit: Number of playlists to retrive (default = 20), use 0 to get all of them
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "Error with user authentication"
         
         try:
-            playlists = client.current_user_playlists(limit=limit)
+            playlists, total = await fetch_all(
+                lambda size, offset: client.current_user_playlists(limit=size, offset=offset),
+                page_size=50,
+                limit=limit or None
+            )
 
-            result = f"Found total of {playlists["total"]} playlists. \n\n"
-
-            for playlist in playlists["items"]:
-                result += f"Playlist Name: {playlist["name"]}, Total tracks in this playlist: {playlist["tracks"]["total"]} tracks.\n"
-                result += f"ID of the playlist: '{playlist["id"]}'\n---\n"
-            return result
+            data = {"total": total, "playlists": [views.playlist(playlist) for playlist in playlists]}
+            return views.respond(data, render_user_playlists)
         except Exception as e:
             return f"Error in fetching playists: {e}"
     
     @mcp.tool()
-    async def get_playlist_id_by_name(name: str, limit: int = 50) -> str:
+    async def get_playlist_id_by_name(name: str, limit: int = 50) -> Union[str, List[PlaylistMatch]]:
         """
-        Find the ID of the playlist given the name.
+        Find the ID of the playlist given the name, searching the user's whole library.
 
         Args:
-            name: Name of the playlist to search for
-            limit: Number of playlists limit in user's playlist to match search for (default = 50),
-                    if playlist is not found, try increasing limit to increase search size
+            name: Name of the playlist to search for (matches part of the name, small typos are tolerated)
+            limit: maximum number of matching playlists to return (default = 50)
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "Error with user authentication"
         
         try:
-            playlists = client.current_user_playlists(limit=limit)
-            
-            result = ""
-            for playlist in playlists["items"]:
-                if name.lower() in playlist["name"].lower():
-                    result += f"found playlist: {playlist["name"]} with ID: `{playlist["id"]}`\n"
+            playlists = await current_auth().playlist_index.lookup(client, name, limit)
             
-            if not result:
+            if not playlists:
                 return f"no matching playlist found matching with {name}"
-            return result
+            matches = [{"name": playlist["name"], "id": playlist["id"]} for playlist in playlists]
+            return views.respond(matches, render_playlist_matches)
         except Exception as e:
             return f"Error searching playlist: {e}"
         
     @mcp.tool()
-    async def get_playlist_tracks(playlist_id: str, limit: int = 50) -> str:
+    async def get_playlist_tracks(playlist_id: str, limit: int = 50) -> Union[str, views.PlaylistTracks]:
         """
         Get tracks from a specific playlist.
         
         Args:
             playlist_id: spotify playlist ID
-            limit: limit on number of tracks to retrive (default = 50)
+            limit: limit on number of tracks to retrive (default = 50), use 0 to get the whole playlist
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            tracks = client.playlist_tracks(playlist_id, limit=limit)
-            playlist_info = client.playlist(playlist_id)
-
-            result = f"Playlist name: {playlist_info["name"]}\n"
-            result += f"Playlist description: {playlist_info["description"]}\n---\n"
+            # name, description and the first page in one request, the stored snapshot only for the rest
+            playlist_info, tracks = await playlist_with_items(
+                client,
+                playlist_id,
+                fields="name,description",
+                store=current_auth().store,
+                limit=limit or None
+            )
 
-            result += f"Playlist Tracks:\n---\n"
-
-            for i, item in enumerate(tracks["items"], 1):
-                track = item["track"]
-                if track:
-                    artists = ", ".join([artist["name"] for artist in track["artists"]])
-                    uri = track["uri"]
-                    result += f"{i}. Track: {track["name"]}, Artists: {artists}, Track URI: '{uri}'.\n"
-
-            return result
+            data = {
+                "name": playlist_info["name"],
+                "description": playlist_info["description"],
+                "tracks": [views.track(item["track"]) for item in tracks if item["track"]],
+            }
+            return views.respond(data, render_playlist_tracks)
         except Exception as e:
             return f"Error in retriving tracks from album : {e}"
         
@@ -99,19 +163,20 @@ def add_playlist_tools(mcp: FastMCP):
             description: playlist discription (optional)
             public: whether the playlist should be public (default = True)
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            user = client.current_user()
-            playlist = client.user_playlist_create(user["id"], name=name, description=description, public=public)
+            user = await client.current_user()
+            playlist = await client.user_playlist_create(user["id"], name=name, description=description, public=public)
+            current_auth().playlist_index.add(playlist)
             return f"Created playlist with NAME: {name},  ID: {playlist["id"]}"
         except Exception as e:
             return f"Error while creating playlist: {e}"
     
     @mcp.tool()
-    async def get_current_users_playlists(limit: int = 50, offset: int = 0) -> str:
+    async def get_current_users_playlists(limit: int = 50, offset: int = 0) -> Union[str, List[views.Playlist]]:
         """
         Get the playlist's of the current user
 
@@ -119,24 +184,21 @@ def add_playlist_tools(mcp: FastMCP):
             limit: maximum number of items to return (default: 50) (Maximum value: 50)
             offset: the index of the first item to return (default: 0)
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            user = client.current_user()
-            playlists = client.user_playlists(user["id"], limit, offset) #this dosent retun owned playlist
-            result = ""
-            for i, playlist in enumerate(playlists["items"], 1):
-                result += f"{i}. Playlist Name: {playlist["name"]}, Playlist Description: {playlist["description"]}, Playlist ID: '{playlist["id"]}'.\n"
-            if not result:
+            user = await client.current_user()
+            playlists = await client.user_playlists(user["id"], limit, offset) #this dosent retun owned playlist
+            if not playlists["items"]:
                 return f"User has no playlists."
-            return result
+            return views.respond([views.playlist(playlist) for playlist in playlists["items"]], render_playlists)
         except Exception as e:
             return f"Error fetching user playlist: {e}"
 
     @mcp.tool()
-    async def get_users_owned_playlist(user_id: str, limit: int = 50, offset: int = 0) -> str:
+    async def get_users_owned_playlist(user_id: str, limit: int = 50, offset: int = 0) -> Union[str, List[views.Playlist]]:
         """
         Get the playlist's owned by an user, i.e. the playlists he can edit
 
@@ -145,27 +207,22 @@ def add_playlist_tools(mcp: FastMCP):
             limit: maximum number of items to return (default: 50) (Maximum value: 50)
             offset: the index of the first item to return (default: 0)
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            playlists = client.user_playlists(user_id, limit, offset)
-            current_user = client.current_user()
+            playlists = await client.user_playlists(user_id, limit, offset)
+            current_user = await client.current_user()
             current_user_id = current_user["id"]
 
-            owned_playlists = []
-            for p in playlists['items']:
-                if playlist['owner']['id'] == current_user_id:
-                    owned_playlists.append(p)
-            
+            owned_playlists = [views.playlist(p) for p in playlists['items'] if p['owner']['id'] == current_user_id]
             if not owned_playlists:
                 return f"User has no playlists."
+            if views.STRUCTURED_OUTPUT:
+                return owned_playlists
 
-            result = ""
-            for i, playlist in enumerate(owned_playlists["items"], 1):
-                result += f"{i}. Playlist Name: {playlist["name"]}, Playlist Description: {playlist["description"]}, Playlist ID: '{playlist["id"]}'.\n"
-
+            result = render_playlists(owned_playlists)
             total = playlists["total"]
             if offset < (total - limit):
                 result += f"Try changing offset if you dont find the desired playlist, current offset: {offset}, total playlists: {total}, current limit: {limit}"
@@ -174,45 +231,76 @@ def add_playlist_tools(mcp: FastMCP):
             return f"Error fetching user playlist: {e}"
 
     @mcp.tool()
-    async def playlist_add_items(playlist_id: str, items: List[str], position: int = None) -> str:
+    async def playlist_add_items(playlist_id: str, items: List[str], position: int = None, ctx: Context = None) -> str:
         """
-        Add tracks or episodes to a spotify playlist.
+        Add tracks or episodes to a spotify playlist. Any number of items can be passed in one call.
 
         Args:
             playlist_id: the id of the spotify playlist to add items to
             items: a list of track/episode URIs or URLs
             position: the position in the playlist you want to add the item (default = None (it will add in the end))
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            playlist = client.playlist_add_items(playlist_id, items, position)
-            return f"Successfully added items to playlist. Playlist snapshot id: {playlist["snapshot_id"]}"
+            progress = progress_reporter(ctx)
+            outcome = await add_items(client, playlist_id, items, position, progress)
+            if outcome["error"]:
+                return (f"Error adding items to playlist: {outcome["error"]}. "
+                        f"Added {outcome["done"]} of {outcome["total"]} items before failing, "
+                        f"the remaining items start at index {outcome["done"]} of the given list. "
+                        f"Playlist snapshot id: {outcome["snapshot_id"]}")
+            return f"Successfully added {outcome["done"]} items to playlist. Playlist snapshot id: {outcome["snapshot_id"]}"
         except Exception as e:
             return f"Error adding items to playlist: {e}"
         
     
     @mcp.tool()
-    async def playlist_remove_items(playlist_id: str, items: List[str], snapshot_id: str = None) -> str:
+    async def playlist_remove_items(playlist_id: str, items: List[str], snapshot_id: str = None, ctx: Context = None) -> str:
         """
-        Remove tracks or episodes from a given spotify playlist
+        Remove tracks or episodes from a given spotify playlist. Any number of items can be passed in one call.
 
         Args:
             playlist_id: id of playlist to remove items from
             items: a list of track/episode URIs or URLs
             snapshot_id: optional id of playlist snapshot (default: None)
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            playlist = client.playlist_remove_all_occurrences_of_items(playlist_id, items, snapshot_id)
-            return f"Successfully removed items from playlist. Playlist snapshot id: {playlist["snapshot_id"]}"
+            progress = progress_reporter(ctx)
+            outcome = await remove_items(client, playlist_id, items, snapshot_id, progress)
+            result = f"Successfully removed {outcome["done"]} of {outcome["total"]} items from playlist. Playlist snapshot id: {outcome["snapshot_id"]}"
+            for batch, error in outcome["failed"]:
+                result += f"\nFailed to remove {len(batch)} items ({", ".join(batch[:3])}...): {error}"
+            return result
         except Exception as e:
             return f"Error removing items from playlist: {e}"
-        
-    
-        
+
+    @mcp.tool()
+    async def sync_playlist_items(playlist_id: str, items: List[str], dry_run: bool = False) -> Union[str, PlaylistSync]:
+        """
+        Make a playlist contain exactly the given items in the given order. Only the difference is
+        changed: missing items are added at their place, extra ones removed and out of order ones
+        moved, everything else stays (with its added date). Syncing an unchanged playlist is cheap.
+        Unavailable and local tracks cant be removed through the API, they are kept at the end.
+
+        Args:
+            playlist_id: id of the playlist to sync
+            items: the complete list of track/episode URIs or URLs the playlist should hold, in order
+            dry_run: only report what would change (default = false)
+        """
+        auth = current_auth()
+        client = await auth.get_async_client()
+        if not client:
+            return "error with user authentication"
+
+        try:
+            data = await sync_playlist(client, playlist_id, items, auth.store, dry_run)
+            return views.respond(data, lambda data: render_playlist_sync(data, dry_run))
+        except Exception as e:
+            return f"Error syncing playlist: {e}"
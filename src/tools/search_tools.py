@@ -1,11 +1,59 @@
 from mcp.server.fastmcp import FastMCP
-from ..auth import spotify_auth
-from typing import Literal
+from ..sessions import current_auth
+from .. import views
+from typing import List, Literal, TypedDict, Union
+
+SEARCH_TYPES = ("track", "artist", "album", "playlist")
+
+VIEWS = {
+    "track": views.track,
+    "artist": views.artist,
+    "album": views.album,
+    "playlist": views.playlist,
+}
+
+HEADERS = {
+    "track": "TRACKS:\n",
+    "artist": "ARTISTS:\n",
+    "album": "ALBUMS:\n",
+    "playlist": "PLAYLISTS:\n"
+}
+
+
+class SearchResults(TypedDict):
+    query: str
+    tracks: List[views.Track]
+    artists: List[views.Artist]
+    albums: List[views.Album]
+    playlists: List[views.Playlist]
+
+
+def render_item(result_type: str, i: int, item: dict) -> str:
+    if result_type == "track":
+        return f"{i}. Track: {item['name']}, Artists: {', '.join(item['artists'])}, URI: '{item['uri']}'\n"
+    if result_type == "artist":
+        return f"{i}. Artist: {item['name']} ({item['followers']:,} followers), URI: '{item['uri']}'\n"
+    if result_type == "album":
+        return f"{i}. Album: {item['name']}, Artists: {', '.join(item['artists'])}, URI: '{item['uri']}'\n"
+    return f"{i}. {item['name']} by {item['owner']}, URI: '{item['uri']}', ID: '{item["id"]}'\n"
+
+
+def render_search(data: SearchResults) -> str:
+    parts = [f"Search results for '{data["query"]}':\n\n"]
+    for result_type in SEARCH_TYPES:
+        items = data[f"{result_type}s"]
+        if not items:
+            continue
+        parts.append(HEADERS[result_type])
+        parts.extend(render_item(result_type, i, item) for i, item in enumerate(items, 1))
+        parts.append("\n")
+    return "".join(parts)
+
 
 def add_search_tools(mcp: FastMCP):
 
     @mcp.tool()
-    async def search_spotify(query: str, search_type: Literal["track", "artist", "album", "playlist", "all"] = "all", limit: int = 10) -> str:
+    async def search_spotify(query: str, search_type: Literal["track", "artist", "album", "playlist", "all"] = "all", limit: int = 10) -> Union[str, SearchResults]:
         """
         Search spotify for any content type
 
@@ -15,7 +63,7 @@ def add_search_tools(mcp: FastMCP):
             limit: number of results to be shown (default = 10)
         """
 
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
@@ -25,44 +73,16 @@ def add_search_tools(mcp: FastMCP):
             else:
                 api_types = search_type
             
-            results = client.search(q=query, type=api_types, limit=limit)
-            result = f"Search results for '{query}':\n\n"
-
-            for result_type in api_types.split(','):
-                items = results[f"{result_type}s"]["items"]
-
-                if not items:
-                    continue
-
-                headers = {
-                    "track": "TRACKS:\n",
-                    "artist": "ARTISTS:\n", 
-                    "album": "ALBUMS:\n",
-                    "playlist": "PLAYLISTS:\n"
-                }
-
-                result += f"{headers[result_type]}"
-
-                for i, item in enumerate(items ,1):
-                    if result_type == "track":
-                        artists = ", ".join([artist['name'] for artist in item['artists']])
-                        result += f"{i}. Track: {item['name']}, Artists: {artists}, URI: '{item['uri']}'\n"
-                        
-                    elif result_type == "artist":
-                        followers = item['followers']['total']
-                        result += f"{i}. Artist: {item['name']} ({followers:,} followers), URI: '{item['uri']}'\n"
-                        
-                    elif result_type == "album":
-                        artists = ", ".join([artist['name'] for artist in item['artists']])
-                        result += f"{i}. Album: {item['name']}, Artists: {artists}, URI: '{item['uri']}'\n"
-                        
-                    elif result_type == "playlist":
-                        owner = item['owner']['display_name']
-                        result += f"{i}. {item['name']} by {owner}, URI: '{item['uri']}', ID: '{item["id"]}'\n"
-
-                result += "\n"
-
-            return result if result.strip() != f"Search results for '{query}':" else f"No results found for '{query}'"
-        
+            results = await client.search(q=query, type=api_types, limit=limit)
+            data = {"query": query}
+            for result_type in SEARCH_TYPES:
+                page = results.get(f"{result_type}s") or {}
+                # spotify sometimes pads the items with nulls
+                data[f"{result_type}s"] = [VIEWS[result_type](item) for item in page.get("items") or [] if item]
+
+            if not any(data[f"{result_type}s"] for result_type in SEARCH_TYPES):
+                return f"No results found for '{query}'"
+            return views.respond(data, render_search)
+
         except Exception as e:
             return f"Error while searching: {e}"
\ No newline at end of file
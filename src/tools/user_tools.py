@@ -1,6 +1,92 @@
 from mcp.server.fastmcp import FastMCP
-from ..auth import spotify_auth
-from typing import Literal
+from ..follow_graph import FollowedOverview, SortBy, explore
+from ..ranking import RankedTrack, gather_signals, rank
+from ..sessions import current_auth
+from .. import views
+from typing import List, Literal, Optional, TypedDict, Union
+
+TIME_DESCRIPTIONS = {
+    'short_term': 'last 4 weeks',
+    'medium_term': 'last 6 months',
+    'long_term': 'all time'
+}
+
+
+class TopArtists(TypedDict):
+    time_range: str
+    artists: List[views.Artist]
+
+
+class TopTracks(TypedDict):
+    time_range: str
+    tracks: List[views.TopTrack]
+
+
+class FollowedArtists(TypedDict):
+    total: int
+    artists: List[views.Artist]
+    after: Optional[str]
+
+
+def genre_text(artist: views.Artist) -> str:
+    return ", ".join(artist['genres'][:3]) if artist['genres'] else "No genres"
+
+
+def render_top_artists(data: TopArtists) -> str:
+    time_desc = TIME_DESCRIPTIONS.get(data["time_range"], data["time_range"])
+    parts = [f"your top {len(data['artists'])} artists ({time_desc}):\n\n"]
+    for i, artist in enumerate(data["artists"], 1):
+        parts.append(f"{i}. {artist['name']}\n"
+                     f"Popularity: {artist['popularity']}/100 | Followers: {artist['followers']:,}\n"
+                     f"Genres: {genre_text(artist)}\n"
+                     f"URI: `{artist['uri']}`\n---\n")
+    return "".join(parts)
+
+
+def render_top_tracks(data: TopTracks) -> str:
+    time_desc = TIME_DESCRIPTIONS.get(data["time_range"], data["time_range"])
+    parts = [f"your top {len(data['tracks'])} tracks ({time_desc}):\n\n"]
+    for i, track in enumerate(data["tracks"], 1):
+        parts.append(f"{i}. {track['name']} by {', '.join(track['artists'])}\n"
+                     f"Album: {track['album']}, Popularity: {track['popularity']}/100\n"
+                     f"URI: '{track['uri']}'\n---\n")
+    return "".join(parts)
+
+
+def render_followed_artists(data: FollowedArtists) -> str:
+    parts = [f"the artists you follow are (showing {len(data['artists'])} of {data['total']}):\n\n"]
+    for i, artist in enumerate(data["artists"], 1):
+        parts.append(f"{i}. Artist: {artist["name"]}, Followers: {artist['followers']:,}, Genres: {genre_text(artist)}\n"
+                     f"aritst URI: '{artist["uri"]}', ID: '{artist["id"]}'\n---\n")
+    if data["after"]:
+        parts.append(f"to see the next artists, user after = '{data["after"]}'\n")
+    return "".join(parts)
+
+
+def render_recommendations(tracks: List[RankedTrack]) -> str:
+    parts = [f"your top {len(tracks)} picks:\n\n"]
+    for i, track in enumerate(tracks, 1):
+        parts.append(f"{i}. {track['name']} by {', '.join(track['artists'])} (score {track['score']})\n"
+                     f"Why: {'; '.join(track['reasons'])}\n"
+                     f"URI: '{track['uri']}'\n")
+    return "".join(parts)
+
+
+def render_followed_overview(data: FollowedOverview) -> str:
+    parts = [f"you follow {data['total']:,} artists, {data['matched']:,} match:\n\n"]
+    if data["genres"]:
+        parts.append("GENRES: " + ", ".join(f"{g['genre']} ({g['count']})" for g in data["genres"]) + "\n")
+    if data["followers"]:
+        parts.append("FOLLOWERS: " + ", ".join(f"{b['bucket']}: {b['count']}" for b in data["followers"]) + "\n")
+    if data["artists"]:
+        parts.append(f"\nARTISTS (showing {len(data['artists'])}):\n")
+    for i, artist in enumerate(data["artists"], 1):
+        parts.append(f"{i}. {artist['name']}, Followers: {artist['followers']:,}, Popularity: {artist['popularity']}/100, "
+                     f"Genres: {genre_text(artist)}, URI: '{artist['uri']}'\n")
+        for track in artist["top_tracks"]:
+            parts.append(f"   - {track['name']}, URI: '{track['uri']}'\n")
+    return "".join(parts)
+
 
 def add_user_tools(mcp: FastMCP):
 
@@ -9,12 +95,12 @@ def add_user_tools(mcp: FastMCP):
         """
         Get information about the current user (name, email, country, id, uri)
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            user = client.me()
+            user = await client.me()
             result = f"Username: '{user["display_name"]}', Email: {user["email"]}, Country code: {user["country"]}\n"
             result += f"User ID: '{user["id"]}', URI: '{user["uri"]}'\n"
             return result
@@ -22,7 +108,7 @@ def add_user_tools(mcp: FastMCP):
             return f"Error fetching current user data: {e}"
         
     @mcp.tool()
-    async def get_current_users_top_artists(limit: int = 20, offset: int= 0, time_range: Literal['short_term', 'medium_term', 'long_term'] = 'medium_term') -> str:
+    async def get_current_users_top_artists(limit: int = 20, offset: int= 0, time_range: Literal['short_term', 'medium_term', 'long_term'] = 'medium_term') -> Union[str, TopArtists]:
         """
         Get the top artists of the current user for a given time period
 
@@ -31,12 +117,12 @@ def add_user_tools(mcp: FastMCP):
             offset: the index of the first artist to return
             time_range: time frame for affinities - 'short_term' (~4 weeks), 'medium_term' (~6 months), 'long_term' (several years) (default: 'medium_term')
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            top_artists = client.current_user_top_artists(
+            top_artists = await client.current_user_top_artists(
                 limit=limit,
                 offset=offset,
                 time_range=time_range
@@ -45,32 +131,14 @@ def add_user_tools(mcp: FastMCP):
             if not top_artists['items']:
                 return f"no top artists found for time range: {time_range}"
             
-            time_descriptions = {
-                'short_term': 'last 4 weeks',
-                'medium_term': 'last 6 months', 
-                'long_term': 'all time'
-            }
-            time_desc = time_descriptions.get(time_range, time_range)
-            
-            result = f"your top {len(top_artists['items'])} artists ({time_desc}):\n\n"
-            
-            for i, artist in enumerate(top_artists['items'], 1):
-                followers = artist['followers']['total']
-                popularity = artist.get('popularity', 0)
-                genres = ", ".join(artist['genres'][:3]) if artist['genres'] else "No genres"
-                
-                result += f"{i}. {artist['name']}\n"
-                result += f"Popularity: {popularity}/100 | Followers: {followers:,}\n"
-                result += f"Genres: {genres}\n"
-                result += f"URI: `{artist['uri']}`\n---\n"
-            
-            return result
+            data = {"time_range": time_range, "artists": [views.artist(artist) for artist in top_artists['items']]}
+            return views.respond(data, render_top_artists)
             
         except Exception as e:
             return f"Error getting top artists: {e}"
         
     @mcp.tool()
-    async def get_current_users_top_tracks(limit: int = 20, offset: int = 0, time_range: Literal['short_term', 'medium_term', 'long_term'] = 'medium_term') -> str:
+    async def get_current_users_top_tracks(limit: int = 20, offset: int = 0, time_range: Literal['short_term', 'medium_term', 'long_term'] = 'medium_term') -> Union[str, TopTracks]:
         """
         Get the top artists of the current user for a given time period
 
@@ -79,12 +147,12 @@ def add_user_tools(mcp: FastMCP):
             offset: the index of the first artist to return
             time_range: time frame for affinities - 'short_term' (~4 weeks), 'medium_term' (~6 months), 'long_term' (several years) (default: 'medium_term')
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            top_tracks = client.current_user_top_tracks(
+            top_tracks = await client.current_user_top_tracks(
                 limit=limit,
                 offset=offset,
                 time_range=time_range
@@ -93,64 +161,97 @@ def add_user_tools(mcp: FastMCP):
             if not top_tracks['items']:
                 return f"No top tracks found for time range '{time_range}'"
             
-            time_descriptions = {
-                'short_term': 'last 4 weeks',
-                'medium_term': 'last 6 months', 
-                'long_term': 'all time'
-            }
-            time_desc = time_descriptions.get(time_range, time_range)
-            
-            result = f"your top {len(top_tracks['items'])} tracks ({time_desc}):\n\n"
-            
-            for i, track in enumerate(top_tracks['items'], 1):
-                artists = ", ".join([artist['name'] for artist in track['artists']])
-                album = track['album']['name']
-                popularity = track.get('popularity', 0)
-                
-                result += f"{i}. {track['name']} by {artists}\n"
-                result += f"Album: {album}, Popularity: {popularity}/100\n"
-                result += f"URI: '{track['uri']}'\n---\n"
-            
-            return result  
+            data = {"time_range": time_range, "tracks": [views.top_track(track) for track in top_tracks['items']]}
+            return views.respond(data, render_top_tracks)
         except Exception as e:
             return f"Error getting top tracks: {e}"
         
     @mcp.tool()
-    async def get_current_users_followed_artists(limit: int = 20, after: str = None) -> str:
+    async def get_current_users_followed_artists(limit: int = 20, after: str = None) -> Union[str, FollowedArtists]:
         """
-        Get the artists followed by the current user
+        Get the artists followed by the current user, one page at a time
+        (explore_followed_artists gets all of them at once, with genre counts and filters)
 
         Args:
             limit: number of artists to return (default = 20, max = 50)
             after: the last artist ID retrieved from the previous request (for pagination) (default = None) (kinda like offset)
         """
-        client = spotify_auth.get_client()
+        client = await current_auth().get_async_client()
         if not client:
             return "error with user authentication"
         
         try:
-            followed_artists = client.current_user_followed_artists(limit=limit, after=after)
+            followed_artists = await client.current_user_followed_artists(limit=limit, after=after)
 
             if not followed_artists:
                 return "You are not following any artists "
             
-            artists = followed_artists["artists"]["items"]
-            total = followed_artists["artists"]["total"]
-
-            result= f"the artists you follow are (showing {len(artists)} of {total}):\n\n"
-            for i, artist in enumerate(artists, 1):
-                followers = artist['followers']['total']
-                genres = ", ".join(artist['genres'][:3]) if artist['genres'] else "No genres"
-                result += f"{i}. Artist: {artist["name"]}, Followers: {followers:,}, Genres: {genres}\n"
-                result += f"aritst URI: '{artist["uri"]}', ID: '{artist["id"]}'\n---\n"
-
-            if followed_artists["artists"]["next"]:
-                result += f"to see the next artists, user after = '{followed_artists["artists"]["cursors"]["next"]}'\n"
-            
-            return result
+            page = followed_artists["artists"]
+            data = {
+                "total": page["total"],
+                "artists": [views.artist(artist) for artist in page["items"]],
+                "after": page["cursors"]["after"] if page["next"] else None,
+            }
+            return views.respond(data, render_followed_artists)
         except Exception as e:
             return f"Error getting users followed artists: {e}"
 
+    @mcp.tool()
+    async def get_recommendations(limit: int = 20, mode: Literal['favorites', 'mix', 'discover'] = 'mix', max_per_artist: int = 2) -> Union[str, List[RankedTrack]]:
+        """
+        Get a ranked list of tracks for the current user, scored from their top tracks and artists
+        of all time ranges, the artists they follow and their favourite genres. Use this instead of
+        combining the top artists/tracks lists yourself.
+
+        Args:
+            limit: number of tracks to return (default = 20)
+            mode: 'favorites' (what they play most), 'mix' (favorites and related tracks) or 'discover' (tracks they dont play a lot yet) (default: 'mix')
+            max_per_artist: at most this many tracks by the same artist (default = 2)
+        """
+        client = await current_auth().get_async_client()
+        if not client:
+            return "error with user authentication"
+
+        try:
+            signals = await gather_signals(client)
+            tracks = rank(signals, mode, limit, max_per_artist)
+            if not tracks:
+                return "Not enough listening history to recommend anything yet"
+            return views.respond(tracks, render_recommendations)
+        except Exception as e:
+            return f"Error getting recommendations: {e}"
 
-    
-    
+    @mcp.tool()
+    async def explore_followed_artists(genre: str = None, name: str = None, min_followers: int = 0, max_followers: int = None,
+                                       min_popularity: int = 0, sort: SortBy = 'followers', limit: int = 50,
+                                       top_tracks: int = 0) -> Union[str, FollowedOverview]:
+        """
+        Get every artist the current user follows in one call: genre counts, follower counts and
+        the artists matching the filters. Later calls within 10 minutes reuse the same crawl.
+
+        Args:
+            genre: only artists with a genre containing this, e.g. 'jazz' (optional)
+            name: only artists whose name contains this (optional)
+            min_followers: only artists with at least this many followers (default = 0)
+            max_followers: only artists with at most this many followers (optional)
+            min_popularity: only artists with at least this popularity, 0-100 (default = 0)
+            sort: order of the listed artists - 'followers', 'popularity' or 'name' (default: 'followers')
+            limit: number of matching artists to list (default = 50), 0 for only the counts
+            top_tracks: how many top tracks to include per listed artist, at most 10 (default = 0)
+        """
+        auth = current_auth()
+        client = await auth.get_async_client()
+        if not client:
+            return "error with user authentication"
+
+        try:
+            data = await explore(
+                client, auth.follow_graph, sort, limit, min(max(top_tracks, 0), 10),
+                genre=genre, name=name, min_followers=min_followers, max_followers=max_followers,
+                min_popularity=min_popularity
+            )
+            if not data["total"]:
+                return "You are not following any artists"
+            return views.respond(data, render_followed_overview)
+        except Exception as e:
+            return f"Error exploring followed artists: {e}"
@@ -0,0 +1,135 @@
+import os
+import sys
+import threading
+import time
+from .client import MAX_CONCURRENCY
+from . import metrics
+from .metrics import on_response
+
+# connections kept open to api.spotify.com, one per request that may run at the same time
+POOL_SIZE = int(os.getenv("SPOTIFY_HTTP_POOL_SIZE", str(MAX_CONCURRENCY)))
+CONNECT_TIMEOUT = float(os.getenv("SPOTIFY_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("SPOTIFY_READ_TIMEOUT", "10"))
+# multiplex every request over one connection, needs the optional `h2` package
+HTTP2 = os.getenv("SPOTIFY_HTTP2", "").lower() in ("1", "true", "yes")
+
+RETRY_STATUSES = (500, 502, 503, 504)
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.3
+# the only requests resent on a 5xx here, writes may have been applied and are left to the caller (see bulk)
+STATUS_RETRY_METHODS = frozenset(["GET"])
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def timeouts():
+    """(connect, read) timeout pair, spotipy hands it to the session as is"""
+    return (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+
+def create_session():
+    """
+    requests session for spotipy: a keep-alive pool sized to the concurrency limit,
+    retrying failed connects and 5xx answers to reads but never 429 (the scheduler owns those)
+    """
+    import requests
+    from urllib3.util.retry import Retry
+
+    class CountedRetry(Retry):
+        """resends happen below the response hook, count them for the tool's metrics"""
+
+        def increment(self, *args, **kwargs):
+            retry = super().increment(*args, **kwargs)
+            metrics.record_transport_retry()
+            return retry
+
+    retry = CountedRetry(
+        total=MAX_RETRIES,
+        connect=None,
+        read=False,
+        allowed_methods=STATUS_RETRY_METHODS,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        # hand the last 5xx to spotipy as it is, not as the RetryError it reports as a 429
+        raise_on_status=False,
+        # 429s are handled by our scheduler, dont let urllib3 sleep on them inside a worker thread
+        respect_retry_after_header=False,
+    )
+    # pool_block: wait for a free connection instead of opening (and then dropping) extra ones
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=2, pool_maxsize=POOL_SIZE, pool_block=True, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # count the bytes of every response for the metrics
+    session.hooks["response"].append(on_response)
+    return session
+
+
+def create_http2_session():
+    import httpx
+    import requests
+
+    class HttpxSession(requests.Session):
+        """
+        requests.Session look-alike backed by an httpx HTTP/2 client, so spotipy can use it
+        unchanged. Responses are handed back as requests.Response objects.
+        """
+
+        def __init__(self):
+            super().__init__()
+            limits = httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+            self.client = httpx.Client(
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                # retries here only cover failed connects, 5xx are retried in request()
+                transport=httpx.HTTPTransport(http2=True, limits=limits, retries=MAX_RETRIES),
+            )
+
+        def request(self, method, url, params=None, data=None, headers=None, timeout=None, **kwargs):
+            if isinstance(timeout, tuple):
+                timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+            # requests leaves out params set to None, spotipy relies on that
+            params = {key: value for key, value in (params or {}).items() if value is not None}
+            for attempt in range(MAX_RETRIES + 1):
+                raw = self.client.request(method, url, params=params, content=data, headers=headers,
+                                          timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+                if raw.status_code not in RETRY_STATUSES or method.upper() not in STATUS_RETRY_METHODS \
+                        or attempt == MAX_RETRIES:
+                    break
+                metrics.record_transport_retry()
+                time.sleep(BACKOFF_FACTOR * 2 ** attempt)
+
+            response = requests.Response()
+            response.status_code = raw.status_code
+            response.reason = raw.reason_phrase
+            response.url = str(raw.url)
+            response.headers = requests.structures.CaseInsensitiveDict(raw.headers)
+            response.encoding = raw.encoding
+            response._content = raw.content
+            on_response(response)
+            return response
+
+        def close(self):
+            self.client.close()
+            super().close()
+
+    return HttpxSession()
+
+
+def shared_session():
+    """the one pooled session every spotify client in the process goes through"""
+    global _session
+    with _session_lock:
+        if _session is None and HTTP2:
+            try:
+                _session = create_http2_session()
+            except ImportError as e:
+                print(f"HTTP/2 disabled, falling back to HTTP/1.1 keep-alive pool: {e}", file=sys.stderr)
+        if _session is None:
+            _session = create_session()
+        # spotipy closes its session when a client is garbage collected, the shared one outlives clients
+        _session.close = lambda: None
+        return _session
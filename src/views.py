@@ -0,0 +1,143 @@
+import os
+from typing import Any, Callable, List, Optional, TypedDict
+
+# "structured" makes tools return the compact typed dicts below as MCP structured content,
+# "text" (the default) renders them to the human readable strings
+STRUCTURED_OUTPUT = os.getenv("SPOTIFY_OUTPUT_MODE", "text").lower() == "structured"
+
+
+class Track(TypedDict):
+    name: str
+    artists: List[str]
+    uri: str
+
+
+class AlbumTrack(Track):
+    id: str
+
+
+class TopTrack(Track):
+    album: str
+    popularity: int
+
+
+class Artist(TypedDict):
+    name: str
+    uri: str
+    id: str
+    followers: int
+    popularity: int
+    genres: List[str]
+
+
+class Album(TypedDict):
+    name: str
+    artists: List[str]
+    uri: str
+    id: str
+    album_type: str
+    release_date: str
+    total_tracks: int
+
+
+class AlbumDetails(Album):
+    tracks: List[AlbumTrack]
+
+
+class Playlist(TypedDict):
+    name: str
+    id: str
+    uri: str
+    description: str
+    owner: str
+    total_tracks: int
+
+
+class PlaylistTracks(TypedDict):
+    name: str
+    description: str
+    tracks: List[Track]
+
+
+class Device(TypedDict):
+    id: str
+    name: str
+    type: str
+    is_active: bool
+    volume_percent: Optional[int]
+
+
+class Playback(TypedDict):
+    device_id: Optional[str]
+    device_active: bool
+    item: Optional[Track]
+
+
+class Queue(TypedDict):
+    now_playing: Optional[Track]
+    queue: List[Track]
+
+
+def names(obj: dict) -> List[str]:
+    return [artist["name"] for artist in obj.get("artists") or []]
+
+
+def track(item: dict) -> Track:
+    return {"name": item["name"], "artists": names(item), "uri": item["uri"]}
+
+
+def album_track(item: dict) -> AlbumTrack:
+    return {**track(item), "id": item["id"]}
+
+
+def top_track(item: dict) -> TopTrack:
+    return {**track(item), "album": item["album"]["name"], "popularity": item.get("popularity", 0)}
+
+
+def artist(item: dict) -> Artist:
+    return {
+        "name": item["name"],
+        "uri": item["uri"],
+        "id": item["id"],
+        "followers": (item.get("followers") or {}).get("total", 0),
+        "popularity": item.get("popularity", 0),
+        "genres": item.get("genres") or [],
+    }
+
+
+def album(item: dict) -> Album:
+    return {
+        "name": item["name"],
+        "artists": names(item),
+        "uri": item["uri"],
+        "id": item["id"],
+        "album_type": item.get("album_type", ""),
+        "release_date": item.get("release_date", "Unknown"),
+        "total_tracks": item.get("total_tracks", 0),
+    }
+
+
+def playlist(item: dict) -> Playlist:
+    return {
+        "name": item["name"],
+        "id": item["id"],
+        "uri": item.get("uri", ""),
+        "description": item.get("description") or "",
+        "owner": (item.get("owner") or {}).get("display_name") or "",
+        "total_tracks": (item.get("tracks") or {}).get("total", 0),
+    }
+
+
+def device(item: dict) -> Device:
+    return {
+        "id": item["id"],
+        "name": item["name"],
+        "type": item["type"],
+        "is_active": item["is_active"],
+        "volume_percent": item.get("volume_percent"),
+    }
+
+
+def respond(data: Any, render: Callable[[Any], str]) -> Any:
+    """hands back the structured data as is in structured mode, its rendered text otherwise"""
+    return data if STRUCTURED_OUTPUT else render(data)
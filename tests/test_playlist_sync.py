@@ -0,0 +1,136 @@
+import asyncio
+import random
+import unittest
+from unittest import mock
+from src import playlist_sync
+from src.playlist_sync import SyncPlan, replace_requests, sync_playlist
+
+
+def apply(current, plan):
+    """what the playlist holds after spotify applied the plan's requests in the order sync_playlist sends them"""
+    tracks = list(current)
+    for _, position in sorted(plan.removes, key=lambda remove: -remove[1]):
+        del tracks[position]
+    for start, length, before in plan.moves:
+        moved = tracks[start:start + length]
+        del tracks[start:start + length]
+        if before > start:
+            before -= length
+        tracks[before:before] = moved
+    for position, uris in plan.adds:
+        tracks[position:position] = uris
+    return tracks
+
+
+def random_lists(rng, size):
+    pool = [f"spotify:track:{i}" for i in range(max(1, size * 2 // 3))]
+    current = [rng.choice(pool) for _ in range(rng.randint(0, size))]
+    desired = [rng.choice(pool) for _ in range(rng.randint(0, size))]
+    if current and rng.random() < 0.5:
+        # mostly the same tracks shuffled around, the case reorders are for
+        desired = rng.sample(current, len(current))
+    return current, desired
+
+
+class FakePlaylist:
+    """the playlist write endpoints of a client, on one in-memory track list"""
+
+    def __init__(self, tracks):
+        self.tracks = list(tracks)
+        self.requests = 0
+
+    def _done(self):
+        self.requests += 1
+        return {"snapshot_id": f"snapshot{self.requests}"}
+
+    async def playlist(self, playlist_id, fields=None):
+        return {"snapshot_id": "snapshot0"}
+
+    async def playlist_remove_specific_occurrences_of_items(self, playlist_id, items, snapshot_id=None):
+        drop = {position for item in items for position in item["positions"]}
+        self.tracks = [uri for i, uri in enumerate(self.tracks) if i not in drop]
+        return self._done()
+
+    async def playlist_reorder_items(self, playlist_id, range_start, insert_before, range_length=1, snapshot_id=None):
+        moved = self.tracks[range_start:range_start + range_length]
+        del self.tracks[range_start:range_start + range_length]
+        if insert_before > range_start:
+            insert_before -= range_length
+        self.tracks[insert_before:insert_before] = moved
+        return self._done()
+
+    async def playlist_add_items(self, playlist_id, items, position=None):
+        assert len(items) <= 100
+        at = len(self.tracks) if position is None else position
+        self.tracks[at:at] = items
+        return self._done()
+
+    async def playlist_replace_items(self, playlist_id, items):
+        assert len(items) <= 100
+        self.tracks = list(items)
+        return self._done()
+
+
+class SyncPlanTest(unittest.TestCase):
+
+    def test_random_plans_reach_the_desired_list(self):
+        rng = random.Random(7)
+        for _ in range(2000):
+            current, desired = random_lists(rng, rng.choice((5, 20, 250)))
+            plan = SyncPlan(current, desired)
+            self.assertFalse(plan.replace)
+            self.assertEqual(apply(current, plan), desired)
+
+    def test_capped_plans_never_cost_more_than_a_rewrite(self):
+        rng = random.Random(11)
+        for _ in range(500):
+            current, desired = random_lists(rng, rng.choice((20, 250, 600)))
+            budget = replace_requests(len(desired))
+            plan = SyncPlan(current, desired, budget)
+            self.assertLessEqual(plan.requests, budget)
+            if not plan.replace:
+                self.assertEqual(apply(current, plan), desired)
+
+    def test_reversed_playlist_is_rewritten(self):
+        current = [f"spotify:track:{i}" for i in range(1000)]
+        plan = SyncPlan(current, current[::-1], replace_requests(1000))
+        self.assertTrue(plan.replace)
+        self.assertEqual(plan.requests, 10)
+
+
+class SyncPlaylistTest(unittest.TestCase):
+
+    def sync(self, current, desired):
+        client = FakePlaylist(current)
+        items = [{"track": {"uri": uri}} for uri in current]
+        with mock.patch.object(playlist_sync, "playlist_items", mock.AsyncMock(return_value=items)):
+            result = asyncio.run(sync_playlist(client, "playlist", desired))
+        return client, result
+
+    def test_small_change_is_patched(self):
+        current = [f"spotify:track:{i}" for i in range(300)]
+        desired = current[:100] + current[101:] + ["spotify:track:new"]
+        client, result = self.sync(current, desired)
+        self.assertEqual(client.tracks, desired)
+        self.assertFalse(result["replaced"])
+        self.assertEqual(client.requests, 2)
+
+    def test_shuffle_is_replaced(self):
+        current = [f"spotify:track:{i}" for i in range(450)]
+        desired = random.Random(3).sample(current, len(current))
+        client, result = self.sync(current, desired)
+        self.assertEqual(client.tracks, desired)
+        self.assertTrue(result["replaced"])
+        self.assertEqual(client.requests, result["requests"])
+        self.assertEqual(client.requests, 5)
+
+    def test_local_tracks_are_never_replaced_away(self):
+        current = [f"spotify:track:{i}" for i in range(150)] + ["spotify:local:a:b:c:1"]
+        desired = current[:150][::-1]
+        client, result = self.sync(current, desired)
+        self.assertFalse(result["replaced"])
+        self.assertEqual(client.tracks, desired + ["spotify:local:a:b:c:1"])
+
+
+if __name__ == "__main__":
+    unittest.main()